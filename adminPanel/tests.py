@@ -1,3 +1,80 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+from django.utils import timezone
+
+from content.ai_ledger import AILedger, ai_call_context
+from content.models import AICallLog, QuizAttempt
+from content.testing import AppTestCase, make_course, make_student
+from . import views
+
+
+class AdminReportTestCase(AppTestCase):
+    """A logged-in staff member, self.staff"""
+
+    def setUp(self):
+        super().setUp()
+        self.staff = make_student('00000001', is_staff=True)
+        self.client.force_login(self.staff)
+
+
+class AIUsageReportTests(AdminReportTestCase):
+    def test_totals_include_calls_not_yet_written(self):
+        student = make_student()
+        AICallLog.objects.create(model_name='gemini-2.5-flash', endpoint='generate_course', student=student,
+                                 prompt_tokens=1_000_000, output_tokens=1_000_000, latency_ms=300)
+        AICallLog.objects.create(model_name='gemini-2.5-pro', endpoint='generate_course', student=student,
+                                 prompt_tokens=1_000_000, latency_ms=100, success=False)
+        old = AICallLog.objects.create(model_name='gemini-2.5-pro', endpoint='regenerate_topic', output_tokens=10_000)
+        AICallLog.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        ledger = self.patch(views, 'ai_ledger', new=AILedger())
+        with ai_call_context('quiz_feedback', student.pk):
+            ledger.record('gemini-2.5-flash', output_tokens=400_000, cache_hit=True)
+
+        report = self.client.get('/admin/ai-usage/', {'days': 7}).json()
+
+        self.assertEqual((report['total_calls'], report['total_cost_usd']), (3, 5.05))
+        endpoints = {row['endpoint']: row for row in report['endpoints']}
+        self.assertEqual(set(endpoints), {'generate_course', 'quiz_feedback'})
+        self.assertEqual(
+            {key: endpoints['generate_course'][key] for key in ('calls', 'failures', 'cost_usd', 'avg_latency_ms')},
+            {'calls': 2, 'failures': 1, 'cost_usd': 4.05, 'avg_latency_ms': 200}
+        )
+        self.assertEqual(endpoints['quiz_feedback']['cache_hits'], 1)
+        self.assertEqual([(row['student_id'], row['calls']) for row in report['students']], [(student.pk, 3)])
+        self.assertEqual(ledger.pending(), 0)
+
+    def test_students_are_turned_away(self):
+        self.client.force_login(make_student())
+
+        self.assertEqual(self.client.get('/admin/ai-usage/').status_code, 302)
+
+
+class QuizActivityTests(AdminReportTestCase):
+    def test_attempts_are_counted_per_day_with_empty_days_filled(self):
+        student, other = make_student(), make_student('87654321')
+        course, topics = make_course(student, topics=1, questions=0)
+        today = timezone.localdate()
+
+        def attempt(student, days_ago, score):
+            created_at = timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), time(12)))
+            QuizAttempt.objects.create(student=student, topic=topics[0], score=score, passed=score >= 50,
+                                       created_at=created_at)
+
+        attempt(student, 0, 80)
+        attempt(student, 0, 40)
+        attempt(other, 0, 90)
+        attempt(student, 2, 60)
+        attempt(student, 7, 100)
+
+        report = self.client.get('/admin/quiz-activity/', {'days': 7}).json()
+
+        self.assertEqual(len(report['labels']), 7)
+        self.assertEqual(report['labels'][-1], today.strftime('%Y-%m-%d'))
+        self.assertEqual(report['attempts'], [0, 0, 0, 0, 1, 0, 3])
+        self.assertEqual(report['students'], [0, 0, 0, 0, 1, 0, 2])
+        self.assertEqual((report['avg_score'][-1], report['pass_rate'][-1]), (70.0, 66.7))
+        self.assertEqual(report['avg_score'][:4], [None] * 4)
+
+    def test_days_are_clamped(self):
+        self.assertEqual(len(self.client.get('/admin/quiz-activity/', {'days': 1000}).json()['labels']), 365)
+        self.assertEqual(len(self.client.get('/admin/quiz-activity/', {'days': 0}).json()['labels']), 1)
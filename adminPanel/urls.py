@@ -12,6 +12,9 @@ urlpatterns = [
     path('admin/quiz-performance/', views.quiz_performance, name='quiz_performance'),
     path('admin/top-performers/', views.top_performers, name='top_performers'),
     path('admin/student-quizzes/<int:student_id>/', views.student_quizzes, name='student_quizzes'),
+    path('admin/quiz-activity/', views.quiz_activity_over_time, name='quiz_activity_over_time'),
     path('admin/student-progress/<int:student_id>/', views.student_progress_details, name='student_progress_details'),
+    path('admin/ai-metrics/', views.ai_metrics, name='ai_metrics'),
+    path('admin/ai-usage/', views.ai_usage_report, name='ai_usage_report'),
 
 ]
\ No newline at end of file
@@ -2,16 +2,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Count, Avg, Sum, Q, Max
-from django.db.models.functions import Greatest, Coalesce
+from django.db.models.functions import Greatest, Coalesce, TruncDate
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_protect
 from django.contrib.auth import get_user_model
-from content.models import Course, Module, Lesson, GeneratedCourse, GeneratedTopic, GeneratedTopicCompletion
+from content.models import Course, Module, Lesson, GeneratedCourse, GeneratedTopic, GeneratedTopicCompletion, AICallLog, QuizAttempt
 from progress.models import CourseProgress, ModuleProgress, UserProgress
+from content.gemini_client import gemini_client
+from content.ai_ledger import ai_ledger
 import json
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
@@ -76,21 +78,24 @@ def admin_dashboard(request):
     active_change = active_now - active_yesterday
     
     # Student activity data for the chart (last 7 days)
-    activity_data = []
-    date_labels = []
+    days = [timezone.localdate() - timedelta(days=i) for i in range(6, -1, -1)]
+    date_labels = [day.strftime('%Y-%m-%d') for day in days]
     
-    for i in range(6, -1, -1):
-        date = timezone.now() - timedelta(days=i)
-        date_labels.append(date.strftime('%Y-%m-%d'))
-        
-        # Count active students on this day (students with any activity)
-        active_count = User.objects.filter(
-            Q(progress__last_accessed__date=date) |
-            Q(generatedtopiccompletion__completed_at__date=date) |
-            Q(generatedcourse__created_at__date=date)
-        ).distinct().count()
-        
-        activity_data.append(int(active_count))  # Ensure integer values
+    # Students with any activity per day, from one range scan per activity table
+    window_start = timezone.make_aware(datetime.combine(days[0], time.min))
+    active_by_day = {day: set() for day in days}
+    for model, student_field, time_field in (
+        (UserProgress, 'student_id', 'last_accessed'),
+        (QuizAttempt, 'student_id', 'created_at'),
+        (GeneratedCourse, 'user_id', 'created_at'),
+    ):
+        rows = model.objects.filter(**{f'{time_field}__gte': window_start}).annotate(
+            day=TruncDate(time_field)
+        ).values_list('day', student_field).distinct()
+        for day, student_id in rows:
+            if day in active_by_day:
+                active_by_day[day].add(student_id)
+    activity_data = [len(active_by_day[day]) for day in days]
     
     # Module annotations
     modules = Module.objects.annotate(
@@ -451,20 +456,65 @@ def admin_login_view(request):
 
 @staff_member_required
 def student_quizzes(request, student_id):
-    completions = GeneratedTopicCompletion.objects.filter(student_id=student_id).select_related('topic', 'topic__quiz').order_by('-completed_at')
+    # Every attempt, newest first, from the (student, created_at) index
+    attempts = QuizAttempt.objects.filter(student_id=student_id).select_related('topic').order_by('-created_at')
     quizzes_data = []
-    for comp in completions:
-        quiz = getattr(comp.topic, 'quiz', None)
-        if quiz:
-            quizzes_data.append({
-                'title': quiz.topic.title,
-                'score': comp.score or 0,
-                'completed': True,
-                'date_attempted': comp.completed_at.strftime("%Y-%m-%d %H:%M")
-            })
+    for attempt in attempts:
+        quizzes_data.append({
+            'title': attempt.topic.title,
+            'score': attempt.score or 0,
+            'completed': attempt.passed,
+            'attempt': attempt.attempt_number,
+            'date_attempted': attempt.created_at.strftime("%Y-%m-%d %H:%M")
+        })
     return JsonResponse({'quizzes': quizzes_data})
 
 
+@staff_member_required
+def quiz_activity_over_time(request):
+    """Daily quiz attempts, distinct students, average score and pass rate over the last N days"""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+        today = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(today - timedelta(days=days - 1), time.min))
+
+        # One range scan on the created_at index, grouped by day in the database
+        rows = QuizAttempt.objects.filter(created_at__gte=start).annotate(
+            day=TruncDate('created_at')
+        ).values('day').annotate(
+            attempts=Count('id'),
+            students=Count('student', distinct=True),
+            avg_score=Avg('score'),
+            passed=Count('id', filter=Q(passed=True)),
+        ).order_by('day')
+        by_day = {row['day']: row for row in rows}
+
+        labels, attempts, students, avg_scores, pass_rates = [], [], [], [], []
+        for offset in range(days - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            row = by_day.get(day)
+            labels.append(day.strftime('%Y-%m-%d'))
+            attempts.append(row['attempts'] if row else 0)
+            students.append(row['students'] if row else 0)
+            avg_scores.append(round(row['avg_score'], 1) if row else None)
+            pass_rates.append(round(row['passed'] / row['attempts'] * 100, 1) if row else None)
+
+        return JsonResponse({
+            'success': True,
+            'labels': labels,
+            'attempts': attempts,
+            'students': students,
+            'avg_score': avg_scores,
+            'pass_rate': pass_rates,
+        })
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Failed to fetch quiz activity: {str(e)}'
+        }, status=500)
+
+
 # Add to views.py
 @staff_member_required
 def student_progress_details(request, student_id):
@@ -546,4 +596,85 @@ def student_progress_details(request, student_id):
         return JsonResponse({
             'success': False,
             'error': f'Failed to fetch student progress: {str(e)}'
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@staff_member_required
+def ai_metrics(request):
+    """Circuit breaker and rate limiter state for each Gemini model, and the fair-share scheduler"""
+    return JsonResponse({
+        'success': True,
+        'models': gemini_client.metrics(),
+        'scheduler': gemini_client.scheduler.snapshot()
+    })
+
+
+def _ai_call_cost(model_name, prompt_tokens, output_tokens):
+    input_price, output_price = getattr(settings, 'GEMINI_PRICING', {}).get(model_name, (0, 0))
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def _ai_usage_by(calls, field):
+    """Aggregate ledger rows per value of field; cost is priced per model before summing"""
+    rows = calls.values(field, 'model_name').annotate(
+        calls=Count('id'),
+        failures=Count('id', filter=Q(success=False)),
+        cache_hits=Count('id', filter=Q(cache_hit=True)),
+        prompt_tokens=Coalesce(Sum('prompt_tokens'), 0),
+        output_tokens=Coalesce(Sum('output_tokens'), 0),
+        total_latency_ms=Coalesce(Sum('latency_ms'), 0),
+        max_latency_ms=Coalesce(Max('latency_ms'), 0),
+    )
+
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row[field], {
+            field: row[field], 'calls': 0, 'failures': 0, 'cache_hits': 0,
+            'prompt_tokens': 0, 'output_tokens': 0, 'total_latency_ms': 0,
+            'max_latency_ms': 0, 'cost_usd': 0.0, 'models': [],
+        })
+        for key in ('calls', 'failures', 'cache_hits', 'prompt_tokens', 'output_tokens', 'total_latency_ms'):
+            group[key] += row[key]
+        group['max_latency_ms'] = max(group['max_latency_ms'], row['max_latency_ms'])
+        group['cost_usd'] += _ai_call_cost(row['model_name'], row['prompt_tokens'], row['output_tokens'])
+        group['models'].append(row['model_name'])
+
+    report = []
+    for group in groups.values():
+        total_latency_ms = group.pop('total_latency_ms')
+        group['avg_latency_ms'] = round(total_latency_ms / group['calls']) if group['calls'] else 0
+        group['cost_usd'] = round(group['cost_usd'], 4)
+        report.append(group)
+    report.sort(key=lambda group: group['cost_usd'], reverse=True)
+    return report
+
+
+@staff_member_required
+def ai_usage_report(request):
+    """Token use, cost and latency of AI calls per endpoint and per student over the last N days"""
+    try:
+        days = max(1, min(int(request.GET.get('days', 7)), 90))
+    except ValueError:
+        days = 7
+
+    # Include calls this process has not written yet
+    ai_ledger.flush()
+    calls = AICallLog.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+    endpoints = _ai_usage_by(calls, 'endpoint')
+    students = _ai_usage_by(calls.filter(student__isnull=False), 'student_id')[:20]
+    names = {
+        user.pk: f"{user.first_name} {user.last_name}"
+        for user in User.objects.filter(pk__in=[row['student_id'] for row in students])
+    }
+    for row in students:
+        row['name'] = names.get(row['student_id'], '')
+
+    return JsonResponse({
+        'success': True,
+        'days': days,
+        'total_cost_usd': round(sum(row['cost_usd'] for row in endpoints), 4),
+        'total_calls': sum(row['calls'] for row in endpoints),
+        'endpoints': endpoints,
+        'students': students,
+    })
@@ -0,0 +1,143 @@
+# content/adaptive_quiz.py
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from engine.mastery import skill_for_topic
+from .caching import get_item_pool_version
+from .models import GeneratedQuestion
+from .question_bank import MIN_ACTIVE_QUESTIONS
+
+# Ability scale the posterior and the item-information tables are evaluated on
+THETA_GRID = np.linspace(-4, 4, 161)
+# Standard normal prior over ability
+PRIOR = np.exp(-THETA_GRID ** 2 / 2)
+# Share of the pool a student must be expected to answer correctly to pass, as in the fixed quiz
+PASS_MARK = 0.5
+# Answers before an uncalibrated question's share correct is used as its difficulty
+MIN_ATTEMPTS_FOR_DIFFICULTY = 10
+POOL_CACHE_TIMEOUT = 60 * 60
+
+
+def min_questions():
+    return getattr(settings, 'ADAPTIVE_QUIZ_MIN_QUESTIONS', 3)
+
+
+def max_questions():
+    return getattr(settings, 'ADAPTIVE_QUIZ_MAX_QUESTIONS', 8)
+
+
+def confidence():
+    return getattr(settings, 'ADAPTIVE_QUIZ_CONFIDENCE', 1.645)
+
+
+def session_key(topic_id):
+    return f'adaptive_quiz_{topic_id}'
+
+
+class ItemPool:
+    """
+    The questions practising one skill with their 2PL parameters, and for every point
+    of THETA_GRID the items ranked by Fisher information there. Picking the next question
+    is a binary search on the grid plus a walk past the few items already asked.
+    """
+
+    def __init__(self, question_ids, discrimination, difficulty, width):
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        self.position = {question_id: i for i, question_id in enumerate(self.question_ids.tolist())}
+        a = np.asarray(discrimination, dtype=np.float64)
+        b = np.asarray(difficulty, dtype=np.float64)
+        # P(correct) and information for every (grid point, item)
+        self.p_table = 1 / (1 + np.exp(-a * (THETA_GRID[:, None] - b)))
+        information = a * a * self.p_table * (1 - self.p_table)
+        # No more than `width` items are ever asked, so deeper ranks are never reached
+        self.ranking = np.argsort(-information, axis=1, kind='stable')[:, :width].astype(np.int32)
+        # Ability at which the expected share correct over the pool equals the pass mark
+        self.cut_theta = float(np.interp(PASS_MARK, self.p_table.mean(axis=1), THETA_GRID))
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def next_question(self, theta, asked):
+        row = min(int(np.searchsorted(THETA_GRID, theta)), len(THETA_GRID) - 1)
+        for item in self.ranking[row].tolist():
+            question_id = int(self.question_ids[item])
+            if question_id not in asked:
+                return question_id
+        return None
+
+    def estimate(self, responses):
+        """Expected a-posteriori ability and its standard error from [(question id, correct), ...]"""
+        posterior = PRIOR.copy()
+        for question_id, correct in responses:
+            p = self.p_table[:, self.position[question_id]]
+            posterior *= p if correct else 1 - p
+        posterior /= posterior.sum()
+        theta = float(posterior @ THETA_GRID)
+        se = float(np.sqrt(posterior @ (THETA_GRID - theta) ** 2))
+        return theta, se
+
+    def expected_score(self, theta):
+        """Percentage of the pool a student of this ability is expected to answer correctly"""
+        row = min(int(np.searchsorted(THETA_GRID, theta)), len(THETA_GRID) - 1)
+        return int(round(self.p_table[row].mean() * 100))
+
+
+def _item_parameters(question):
+    stats = getattr(question, 'stats', None)
+    if stats is None:
+        return 1.0, 0.0
+    if stats.irt_difficulty is not None:
+        return stats.irt_discrimination or 1.0, stats.irt_difficulty
+    if stats.attempts >= MIN_ATTEMPTS_FOR_DIFFICULTY:
+        # Logit of the share answered wrong, kept away from the edges of the grid
+        p = min(max(stats.p_correct, 0.05), 0.95)
+        return 1.0, float(np.log((1 - p) / p))
+    return 1.0, 0.0
+
+
+def build_item_pool(skill):
+    """Questions of the topic and of every simplified version of it, minus flagged ones"""
+    questions = list(GeneratedQuestion.objects.filter(
+        Q(quiz__topic_id=skill) | Q(quiz__topic__original_topic_id=skill)
+    ).select_related('stats').order_by('id'))
+    active = [q for q in questions if not (hasattr(q, 'stats') and q.stats.flagged)]
+    if len(active) >= min(MIN_ACTIVE_QUESTIONS, len(questions)):
+        questions = active
+    if not questions:
+        return None
+    a, b = zip(*(_item_parameters(question) for question in questions))
+    return ItemPool([question.id for question in questions], a, b, width=max_questions())
+
+
+def get_item_pool(topic):
+    skill = skill_for_topic(topic)
+    key = f'adaptive_pool_{skill}_{get_item_pool_version()}_{get_item_pool_version(skill)}'
+    pool = cache.get(key)
+    if pool is None:
+        pool = build_item_pool(skill)
+        if pool is not None:
+            cache.set(key, pool, POOL_CACHE_TIMEOUT)
+    return pool
+
+
+def assess(pool, responses):
+    """
+    Where an adaptive quiz stands after the given responses. Stops as soon as the ability
+    estimate clears the pass mark by `confidence()` standard errors either way, or when the
+    question budget or the pool runs out. Returns (theta, se, 'pass'/'fail'/None, next question id).
+    """
+    theta, se = pool.estimate(responses)
+    asked = {question_id for question_id, _ in responses}
+    if len(responses) >= min_questions():
+        if theta - confidence() * se > pool.cut_theta:
+            return theta, se, 'pass', None
+        if theta + confidence() * se < pool.cut_theta:
+            return theta, se, 'fail', None
+    next_question_id = None
+    if len(responses) < max_questions():
+        next_question_id = pool.next_question(theta, asked)
+    if next_question_id is None:
+        return theta, se, 'pass' if theta >= pool.cut_theta else 'fail', None
+    return theta, se, None, next_question_id
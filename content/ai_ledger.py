@@ -0,0 +1,140 @@
+# content/ai_ledger.py
+import atexit
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# (endpoint, student_id) of the request or job that is making AI calls
+_call_context = contextvars.ContextVar('ai_call_context', default=('unknown', None))
+
+
+@contextmanager
+def ai_call_context(endpoint, student_id=None):
+    """Attribute AI calls made inside this block, e.g. from a management command"""
+    token = _call_context.set((endpoint, student_id))
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_call_context():
+    return _call_context.get()
+
+
+def usage_from_response(response):
+    """(prompt, output, cached) token counts from a Gemini response, zeros when missing"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0, 0
+    return tuple(
+        int(getattr(usage, field, 0) or 0)
+        for field in ('prompt_token_count', 'candidates_token_count', 'cached_content_token_count')
+    )
+
+
+class AILedger:
+    """Buffers AICallLog rows in memory and writes them with one bulk insert per batch"""
+
+    def __init__(self, batch_size=20, flush_interval=10, max_buffer=1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, model_name, prompt_tokens=0, output_tokens=0, cached_tokens=0,
+               latency_ms=0, cache_hit=False, success=True):
+        from content.models import AICallLog
+
+        endpoint, student_id = current_call_context()
+        entry = AICallLog(
+            model_name=model_name,
+            endpoint=endpoint,
+            student_id=student_id,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            cached_tokens=cached_tokens,
+            latency_ms=latency_ms,
+            cache_hit=cache_hit or cached_tokens > 0,
+            success=success,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._buffer.append(entry)
+            overflowing = len(self._buffer) >= self.max_buffer
+        if overflowing:
+            self.flush()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = len(self._buffer) >= self.batch_size or (
+                self._buffer and time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        from content.models import AICallLog
+
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not entries:
+            return 0
+        try:
+            # All batches or none, so a retry never writes a row twice
+            with transaction.atomic():
+                AICallLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            # Accounting must never break a student request; keep the rows for the next flush, up to max_buffer
+            with self._lock:
+                self._buffer = (entries + self._buffer)[-self.max_buffer:]
+            logger.exception(f"Could not write {len(entries)} AI ledger entries; will retry")
+            return 0
+        return len(entries)
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+
+class AIUsageContextMiddleware:
+    """Tags AI calls with the view and student of the request, and flushes the ledger after it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        token = getattr(request, '_ai_call_context_token', None)
+        if token is not None:
+            try:
+                _call_context.reset(token)
+            except ValueError:
+                # View ran in another context (async handler); nothing to restore here
+                pass
+        ai_ledger.flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        endpoint = (match.url_name if match and match.url_name else view_func.__name__)
+        student_id = request.user.pk if request.user.is_authenticated else None
+        request._ai_call_context_token = _call_context.set((endpoint, student_id))
+
+
+ai_ledger = AILedger(
+    batch_size=getattr(settings, 'AI_LEDGER_BATCH_SIZE', 20),
+    flush_interval=getattr(settings, 'AI_LEDGER_FLUSH_INTERVAL', 10),
+)
+atexit.register(ai_ledger.flush)
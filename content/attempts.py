@@ -0,0 +1,152 @@
+# content/attempts.py
+import struct
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GeneratedTopicCompletion, QuizAttempt
+
+# One answer: question id, then the option index in the low 7 bits and correctness in the high bit
+_ANSWER = struct.Struct('<IB')
+_NO_OPTION = 0x7F
+_CORRECT = 0x80
+
+# Seconds after which a submission with no stored response is assumed to have failed mid-request
+SUBMISSION_RESULT_GRACE = 60
+
+
+def encode_answers(answers):
+    """Pack [(question id, option key or None, correct), ...] into 5 bytes per answer"""
+    packed = bytearray()
+    for question_id, option_key, correct in answers:
+        option = ord(option_key.upper()) - ord('A') if isinstance(option_key, str) and len(option_key) == 1 else _NO_OPTION
+        if not 0 <= option < _NO_OPTION:
+            option = _NO_OPTION
+        packed += _ANSWER.pack(question_id, option | (_CORRECT if correct else 0))
+    return bytes(packed)
+
+
+def decode_answers(packed):
+    """The inverse of encode_answers"""
+    answers = []
+    for question_id, flags in _ANSWER.iter_unpack(bytes(packed or b'')):
+        option = flags & _NO_OPTION
+        answers.append((question_id, None if option == _NO_OPTION else chr(ord('A') + option), bool(flags & _CORRECT)))
+    return answers
+
+
+class DuplicateSubmission(Exception):
+    """The student already submitted an attempt with this idempotency key"""
+
+
+def _locked_completion(student, topic):
+    """The student's completion row for the topic, locked until the transaction ends; created if missing"""
+    completion = GeneratedTopicCompletion.objects.select_for_update().filter(student=student, topic=topic).first()
+    if completion is None:
+        try:
+            with transaction.atomic():
+                completion = GeneratedTopicCompletion.objects.create(student=student, topic=topic, attempt_count=0)
+        except IntegrityError:
+            # Created by a concurrent submission; wait for its lock
+            completion = GeneratedTopicCompletion.objects.select_for_update().get(student=student, topic=topic)
+    return completion
+
+
+def record_attempt(student, topic, answers, score, passed, wrong_answers, duration_ms=None, adaptive=False,
+                   idempotency_key=None):
+    """
+    Append one quiz submission and fold it into the student's completion summary,
+    which keeps the latest score and wrong answers and counts the attempts.
+    Raises DuplicateSubmission, without writing anything, if the key was used before.
+    Returns (attempt, completion).
+    """
+    if idempotency_key and QuizAttempt.objects.filter(student=student, idempotency_key=idempotency_key).exists():
+        raise DuplicateSubmission(idempotency_key)
+
+    with transaction.atomic():
+        completion = _locked_completion(student, topic)
+        GeneratedTopicCompletion.objects.filter(pk=completion.pk).update(
+            score=score, passed=passed, wrong_answers=wrong_answers, attempt_count=F('attempt_count') + 1
+        )
+        completion.refresh_from_db()
+        try:
+            with transaction.atomic():
+                attempt = QuizAttempt.objects.create(
+                    student=student,
+                    topic=topic,
+                    attempt_number=completion.attempt_count,
+                    answers=encode_answers(answers),
+                    score=score,
+                    passed=passed,
+                    adaptive=adaptive,
+                    duration_ms=duration_ms,
+                    idempotency_key=idempotency_key or None,
+                )
+        except IntegrityError:
+            # A concurrent request with the same key won; undo the summary update too
+            raise DuplicateSubmission(idempotency_key)
+    return attempt, completion
+
+
+def store_submission_result(attempt, result):
+    """Keep the response of a submission so a retry of it gets the same answer"""
+    QuizAttempt.objects.filter(pk=attempt.pk).update(result=result)
+
+
+def get_submission_result(student_id, idempotency_key):
+    """The stored response of an earlier submission with this key, or None"""
+    if not idempotency_key:
+        return None
+    return QuizAttempt.objects.filter(
+        student_id=student_id, idempotency_key=idempotency_key
+    ).values_list('result', flat=True).first()
+
+
+def submission_result(attempt, now=None):
+    """
+    What a retried submission is answered with: the stored response, or None while the
+    request that recorded the attempt is still working on it. A request that died before
+    storing its response is given up on after SUBMISSION_RESULT_GRACE seconds, and the
+    attempt itself is summarized instead.
+    """
+    if attempt.result is not None:
+        return attempt.result
+    now = now or timezone.now()
+    if (now - attempt.created_at).total_seconds() < SUBMISSION_RESULT_GRACE:
+        return None
+    return {
+        'success': True,
+        'duplicate': True,
+        'finished': True,
+        'passed': attempt.passed,
+        'score': attempt.score,
+        'course_id': attempt.topic.chapter.course_id,
+        'feedback_id': attempt.pk,
+        'remedial_resources': [],
+        'regenerated_topic_id': None,
+    }
+
+
+def completion_attempt(completion, question_ids):
+    """
+    An unsaved QuizAttempt standing in for the latest submission behind a completion that
+    predates attempt history; its answers are rebuilt from the stored wrong answers.
+    """
+    wrong = {
+        entry.get('question_id'): entry.get('selected')
+        for entry in completion.wrong_answers or [] if isinstance(entry, dict)
+    }
+    answers = [
+        (question_id, wrong[question_id], False) if question_id in wrong else (question_id, None, True)
+        for question_id in question_ids
+    ]
+    return QuizAttempt(
+        student_id=completion.student_id,
+        topic_id=completion.topic_id,
+        attempt_number=completion.attempt_count,
+        answers=encode_answers(answers),
+        score=completion.score or 0,
+        passed=completion.passed,
+        created_at=completion.completed_at,
+    )
@@ -0,0 +1,42 @@
+# content/caching.py
+import hashlib
+import time
+
+from django.core.cache import cache
+
+FRAGMENT_CACHE_TIMEOUT = 600  # 10 minutes
+
+
+def fragment_version(*parts):
+    """
+    Key a template fragment on the data the view already loaded for it, so any change,
+    made by this process or another, shows on the next render without a shared counter
+    """
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+ITEM_POOL_VERSION_KEY = 'item_pool_version'
+
+
+def _item_pool_version_key(skill):
+    return f'{ITEM_POOL_VERSION_KEY}_{skill}' if skill is not None else ITEM_POOL_VERSION_KEY
+
+
+def get_item_pool_version(skill=None):
+    """Version in the cache keys of a skill's adaptive quiz item pool; without a skill, of every pool"""
+    key = _item_pool_version_key(skill)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_item_pool_version(skill=None):
+    """A skill's questions or flags changed; without a skill (calibration) every pool is rebuilt on next use"""
+    key = _item_pool_version_key(skill)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
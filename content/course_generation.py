@@ -0,0 +1,165 @@
+# content/course_generation.py
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .gemini_client import gemini_client, backoff_delay, AIUnavailableError, RateLimitedError, PRIORITY_BULK
+from .lesson_schema import extract_json, validate_lesson, LessonSchemaError
+from .prompts import COURSE_LESSON_PROMPT, SYLLABUS_PROMPT
+
+logger = logging.getLogger(__name__)
+
+COURSE_MODEL = 'gemini-2.5-flash'
+JSON_OUTPUT = {"response_mime_type": "application/json"}
+
+
+class LessonGenerationError(Exception):
+    """A lesson stayed invalid after all of its own retries"""
+
+
+def course_calls(lesson_count):
+    """Model calls one course costs: the outline plus one per lesson"""
+    return lesson_count + 1
+
+
+def has_rate_limit_room(lesson_count):
+    """Whether the model's shared rate limit can admit a whole course now, so no lesson has to wait for it"""
+    needed = min(course_calls(lesson_count), gemini_client.rate_limit(COURSE_MODEL))
+    return gemini_client.available_requests(COURSE_MODEL) >= needed
+
+
+def course_concurrency(lesson_count):
+    """Lessons generated at once: COURSE_GENERATION_CONCURRENCY, else every call slot bulk work may use"""
+    workers = getattr(settings, 'COURSE_GENERATION_CONCURRENCY', None) or gemini_client.scheduler.slot_limit(PRIORITY_BULK)
+    return max(1, min(workers, lesson_count))
+
+
+def build_syllabus_prompt(base_title, level, lesson_titles):
+    return SYLLABUS_PROMPT.render(
+        course=f'"{base_title}" for {level} level students',
+        lessons=[f"{number}. {json.dumps(title)}" for number, title in enumerate(lesson_titles, 1)],
+    )
+
+
+def build_lesson_prompt(base_title, level, lesson_title, lesson_number, syllabus):
+    outline = syllabus.get(lesson_title, {})
+    return COURSE_LESSON_PROMPT.render(
+        course=f'"{base_title}" for {level} level C++ students',
+        lesson=(
+            f'{lesson_number}. "{lesson_title}"\n'
+            f"Summary: {outline.get('summary') or 'Not provided'}\n"
+            f"Key concepts: {', '.join(outline.get('key_concepts', [])) or 'Not provided'}"
+        ),
+        outline=[
+            f"{number}. {title}: {syllabus.get(title, {}).get('summary', '')}"
+            for number, title in enumerate(syllabus, 1)
+        ],
+    )
+
+
+def generate_syllabus(base_title, level, lesson_titles):
+    """
+    One short call that outlines every lesson so the per-lesson calls stay consistent.
+    Returns {title: {'summary', 'key_concepts'}} in lesson order; a bad outline is not fatal.
+    """
+    syllabus = {title: {} for title in lesson_titles}
+    try:
+        response_text = gemini_client.generate(
+            COURSE_MODEL, build_syllabus_prompt(base_title, level, lesson_titles),
+            generation_config=JSON_OUTPUT, priority=PRIORITY_BULK
+        )
+        outline = extract_json(response_text)
+    except AIUnavailableError:
+        raise
+    except Exception as e:
+        logger.warning(f"Ignoring unusable syllabus for '{base_title}': {e}")
+        return syllabus
+
+    for entry in outline.get('lessons', []):
+        if isinstance(entry, dict) and entry.get('title') in syllabus:
+            concepts = entry.get('key_concepts')
+            syllabus[entry['title']] = {
+                'summary': str(entry.get('summary') or ''),
+                'key_concepts': [str(c) for c in concepts] if isinstance(concepts, list) else [],
+            }
+    return syllabus
+
+
+def generate_lesson(base_title, level, lesson_title, lesson_number, syllabus, max_attempts=3, rate_limit_deadline=None):
+    """
+    Generate and validate a single lesson, retrying only this lesson when it is unusable.
+    RateLimitedError is waited out until rate_limit_deadline (a time.monotonic() value),
+    by default COURSE_GENERATION_RATE_LIMIT_WAIT seconds from now.
+    """
+    prompt = build_lesson_prompt(base_title, level, lesson_title, lesson_number, syllabus)
+    if rate_limit_deadline is None:
+        rate_limit_deadline = time.monotonic() + getattr(settings, 'COURSE_GENERATION_RATE_LIMIT_WAIT', 10)
+    attempt = 0
+    last_error = None
+
+    while attempt < max_attempts:
+        try:
+            response_text = gemini_client.generate(COURSE_MODEL, prompt, generation_config=JSON_OUTPUT, priority=PRIORITY_BULK)
+        except RateLimitedError:
+            # Sibling lessons share the rate limit; wait for a token rather than failing the course
+            if time.monotonic() >= rate_limit_deadline:
+                raise
+            time.sleep(backoff_delay(attempt, base=2.0, cap=10.0))
+            continue
+        except AIUnavailableError:
+            raise
+        except Exception as e:
+            response_text = None
+            last_error = e
+
+        attempt += 1
+        try:
+            if response_text is None:
+                raise LessonSchemaError(f"model call failed: {last_error}")
+            lesson = validate_lesson(extract_json(response_text), default_title=lesson_title)
+        except LessonSchemaError as e:
+            last_error = e
+            logger.warning(f"Lesson '{lesson_title}' invalid on attempt {attempt}: {e}")
+            if attempt < max_attempts:
+                time.sleep(backoff_delay(attempt - 1))
+            continue
+
+        lesson['title'] = lesson_title
+        return lesson
+
+    raise LessonGenerationError(f"'{lesson_title}': {last_error}")
+
+
+def generate_course_lessons(base_title, level, lesson_titles, max_workers=None):
+    """
+    Outline the course, then generate every lesson independently with bounded concurrency.
+    Returns validated lessons in the requested order. AIUnavailableError and
+    LessonGenerationError propagate to the caller. The lessons share one rate limit wait,
+    so a course blocks its caller for at most COURSE_GENERATION_RATE_LIMIT_WAIT seconds on it.
+    """
+    if max_workers is None:
+        max_workers = course_concurrency(len(lesson_titles))
+
+    syllabus = generate_syllabus(base_title, level, lesson_titles)
+    rate_limit_deadline = time.monotonic() + getattr(settings, 'COURSE_GENERATION_RATE_LIMIT_WAIT', 10)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(lesson_titles)))) as executor:
+        futures = [
+            # Each lesson runs in a copy of the caller's context so the ledger attributes it
+            executor.submit(
+                contextvars.copy_context().run, generate_lesson, base_title, level, title, number, syllabus,
+                rate_limit_deadline=rate_limit_deadline,
+            )
+            for number, title in enumerate(lesson_titles, 1)
+        ]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            # One lesson failed for good: don't start the ones still queued
+            for future in futures:
+                future.cancel()
+            raise
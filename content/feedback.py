@@ -0,0 +1,78 @@
+# content/feedback.py
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .gemini_client import gemini_client, PRIORITY_INTERACTIVE
+from .models import QuizFeedback
+from .prompts import QUIZ_FEEDBACK_PROMPT, wrong_answer_lines
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+
+def latency_budget():
+    """Seconds the quiz page waits for the AI's feedback before showing the template's"""
+    return getattr(settings, 'AI_FEEDBACK_LATENCY_BUDGET', 10)
+
+
+def template_feedback(topic_title, score, passed, remedial_resources):
+    """Deterministic feedback, shown when the AI's is late or unavailable"""
+    if passed:
+        return f"Great job! You scored {score}% and passed this quiz on {topic_title}. You've demonstrated a good understanding of the material."
+    if remedial_resources:
+        resource_list = ", ".join([r['title'] for r in remedial_resources])
+        return f"You scored {score}% on {topic_title}. Review the material and try again. Recommended resources: {resource_list}"
+    return f"You scored {score}% on {topic_title}. Review the material and try again. Focus on understanding the concepts you missed."
+
+
+def generate_ai_feedback(topic_title, score, passed, wrong_answers):
+    """Generate personalized AI feedback from the wrong answers recorded with the attempt"""
+    prompt = QUIZ_FEEDBACK_PROMPT.render(
+        quiz=f'Topic: "{topic_title}"\nScore: {score}%, {"passed" if passed else "did not pass"}',
+        wrong_answers=wrong_answer_lines(wrong_answers),
+    )
+    return gemini_client.generate('gemini-2.5-flash', prompt, priority=PRIORITY_INTERACTIVE)
+
+
+def request_quiz_feedback(attempt, topic_title, wrong_answers, remedial_resources, background=True):
+    """
+    Store the template feedback for an attempt and have the AI write the personalized
+    version once the submission has committed. Returns the QuizFeedback row.
+    """
+    feedback = QuizFeedback.objects.create(
+        attempt=attempt,
+        text=template_feedback(topic_title, attempt.score, attempt.passed, remedial_resources),
+    )
+    args = (attempt.pk, topic_title, attempt.score, attempt.passed, wrong_answers)
+    if background:
+        transaction.on_commit(lambda: run_in_background(build_quiz_feedback, *args))
+    else:
+        build_quiz_feedback(*args)
+        feedback.refresh_from_db()
+    return feedback
+
+
+def build_quiz_feedback(attempt_id, topic_title, score, passed, wrong_answers):
+    """Ask the AI for an attempt's feedback; the template text stays if that fails"""
+    try:
+        text = generate_ai_feedback(topic_title, score, passed, wrong_answers)
+    except Exception as e:
+        logger.error(f"AI feedback generation failed: {str(e)}")
+        text = None
+    if not text:
+        QuizFeedback.objects.filter(pk=attempt_id, status='pending').update(status='failed', updated_at=timezone.now())
+        return None
+    QuizFeedback.objects.filter(pk=attempt_id).update(status='ready', source='ai', text=text, updated_at=timezone.now())
+    return text
+
+
+def feedback_payload(feedback, now=None):
+    """What the polling quiz page gets: the AI's text, the template's after the latency budget, or 'wait'"""
+    now = now or timezone.now()
+    if feedback.status == 'pending' and (now - feedback.created_at).total_seconds() < latency_budget():
+        return {'status': 'pending', 'final': False}
+    status = 'timeout' if feedback.status == 'pending' else feedback.status
+    return {'status': status, 'final': True, 'source': feedback.source, 'feedback': feedback.text}
@@ -0,0 +1,428 @@
+# content/gemini_client.py
+import logging
+import random
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from django.conf import settings
+
+from .ai_ledger import ai_ledger, usage_from_response, current_call_context
+
+logger = logging.getLogger(__name__)
+
+# Configure Gemini AI
+genai.configure(api_key=settings.GEMINI_API_KEY)
+
+
+class AIUnavailableError(Exception):
+    """Raised when a call is refused locally instead of being sent to Gemini"""
+
+
+class CircuitOpenError(AIUnavailableError):
+    pass
+
+
+class RateLimitedError(AIUnavailableError):
+    pass
+
+
+class QuotaExceededError(AIUnavailableError):
+    """The student has used up their share of AI calls for now"""
+
+
+class SchedulerBusyError(AIUnavailableError):
+    """No call slot became free within the wait allowed for this priority"""
+
+
+# Failures that say the service itself is unhealthy and count towards opening the circuit.
+# Anything else (a blocked or malformed reply, a rejected request) concerns that one call.
+SERVICE_ERRORS = (google_exceptions.ServerError, google_exceptions.RetryError, OSError)
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Stops calling a model after consecutive failures until a cool-down has passed"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.total_successes = 0
+        self.total_failures = 0
+        self.rejected_calls = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected_calls += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                # Let a single probe through to test whether the model has recovered
+                if self.probe_in_flight:
+                    self.rejected_calls += 1
+                    return False
+                self.probe_in_flight = True
+            return True
+
+    def release(self):
+        """Give back a half-open probe slot that was granted but never used"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            self.total_successes += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = 0
+            if self.state == self.OPEN:
+                retry_in = max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'total_successes': self.total_successes,
+                'total_failures': self.total_failures,
+                'rejected_calls': self.rejected_calls,
+                'retry_in_seconds': round(retry_in, 1),
+            }
+
+
+class TokenBucket:
+    """Requests-per-minute limiter whose refill rate backs off when the provider reports quota errors"""
+
+    def __init__(self, requests_per_minute, min_requests_per_minute=1):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min_requests_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = float(requests_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.granted = 0
+        self.denied = 0
+        self.throttle_events = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                self.granted += 1
+                return True
+            self.denied += 1
+            return False
+
+    def refund(self, tokens=1):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def throttle(self):
+        """Quota exceeded upstream: halve the refill rate"""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.throttle_events += 1
+
+    def recover(self):
+        """Successful call: creep the refill rate back towards the configured maximum"""
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def snapshot(self):
+        with self._lock:
+            self._refill()
+            return {
+                'available_requests': round(self.tokens, 2),
+                'requests_per_minute': round(self.rate * 60, 2),
+                'max_requests_per_minute': round(self.max_rate * 60, 2),
+                'granted': self.granted,
+                'denied': self.denied,
+                'throttle_events': self.throttle_events,
+            }
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STANDARD = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_STANDARD: 'standard', PRIORITY_BULK: 'bulk'}
+
+
+class FairShareScheduler:
+    """
+    Admits AI calls across all models: a token bucket per student, a global cap on
+    concurrent calls, and priority classes. Interactive calls may use every slot and are
+    served before waiting lower-priority work; other classes leave reserved slots free.
+    """
+
+    def __init__(self, max_concurrent=4, reserved_interactive=1, student_requests_per_minute=20,
+                 wait_timeouts=None, max_tracked_students=5000):
+        self.max_concurrent = max_concurrent
+        self.reserved_interactive = min(reserved_interactive, max_concurrent - 1)
+        self.student_requests_per_minute = student_requests_per_minute
+        self.wait_timeouts = wait_timeouts or {PRIORITY_INTERACTIVE: 10, PRIORITY_STANDARD: 20, PRIORITY_BULK: 120}
+        self.max_tracked_students = max_tracked_students
+        self.active = 0
+        self.waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.rejected_quota = 0
+        self.rejected_busy = 0
+        self._student_buckets = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._slots = threading.Condition()
+
+    def _student_bucket(self, student_id):
+        with self._buckets_lock:
+            bucket = self._student_buckets.pop(student_id, None)
+            if bucket is None:
+                bucket = TokenBucket(self.student_requests_per_minute)
+            self._student_buckets[student_id] = bucket
+            if len(self._student_buckets) > self.max_tracked_students:
+                self._student_buckets.popitem(last=False)
+            return bucket
+
+    def remaining_quota(self, student_id):
+        return int(self._student_bucket(student_id).snapshot()['available_requests'])
+
+    def refund(self, student_id):
+        """Give back a charge for a call that was refused locally and never sent"""
+        if student_id is not None:
+            self._student_bucket(student_id).refund()
+
+    def slot_limit(self, priority):
+        """Most calls of this priority that may run at once"""
+        return self.max_concurrent if priority == PRIORITY_INTERACTIVE else self.max_concurrent - self.reserved_interactive
+
+    def _can_start(self, priority):
+        limit = self.slot_limit(priority)
+        higher_waiting = any(self.waiting[p] for p in PRIORITY_NAMES if p < priority)
+        return self.active < limit and not higher_waiting
+
+    def charge(self, student_id):
+        """Take one call from the student's budget, raising QuotaExceededError when it is spent"""
+        if student_id is not None and not self._student_bucket(student_id).try_acquire():
+            with self._slots:
+                self.rejected_quota += 1
+            raise QuotaExceededError(f"AI quota used up for student {student_id}")
+
+    @contextmanager
+    def slot(self, student_id, priority=PRIORITY_STANDARD, charge=True):
+        """
+        Hold one concurrent call slot, raising AIUnavailableError subclasses when refused.
+        charge=False takes no quota, for further attempts of a call that was already charged.
+        A call refused for want of a slot gets its charge back.
+        """
+        if charge:
+            self.charge(student_id)
+
+        deadline = time.monotonic() + self.wait_timeouts.get(priority, 20)
+        with self._slots:
+            self.waiting[priority] += 1
+            try:
+                while not self._can_start(priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_busy += 1
+                        if charge:
+                            self.refund(student_id)
+                        raise SchedulerBusyError(f"No AI call slot free for {PRIORITY_NAMES[priority]} work")
+                    self._slots.wait(remaining)
+            finally:
+                self.waiting[priority] -= 1
+                # Lower-priority waiters may have been held back by this one
+                self._slots.notify_all()
+            self.active += 1
+            self.admitted[priority] += 1
+
+        try:
+            yield
+        finally:
+            with self._slots:
+                self.active -= 1
+                self._slots.notify_all()
+
+    def snapshot(self):
+        with self._slots:
+            snapshot = {
+                'active_calls': self.active,
+                'max_concurrent': self.max_concurrent,
+                'waiting': {PRIORITY_NAMES[p]: count for p, count in self.waiting.items()},
+                'admitted': {PRIORITY_NAMES[p]: count for p, count in self.admitted.items()},
+                'rejected_quota': self.rejected_quota,
+                'rejected_busy': self.rejected_busy,
+            }
+        with self._buckets_lock:
+            snapshot['tracked_students'] = len(self._student_buckets)
+        return snapshot
+
+
+class GeminiClient:
+    """Single entry point for Gemini calls with a per-model circuit breaker and rate limiter"""
+
+    def __init__(self):
+        self.breakers = {}
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self.scheduler = FairShareScheduler(
+            max_concurrent=getattr(settings, 'AI_MAX_CONCURRENT_CALLS', 4),
+            reserved_interactive=getattr(settings, 'AI_INTERACTIVE_RESERVED_SLOTS', 1),
+            student_requests_per_minute=getattr(settings, 'AI_STUDENT_REQUESTS_PER_MINUTE', 20),
+        )
+
+    def _get_breaker(self, model_name):
+        with self._lock:
+            if model_name not in self.breakers:
+                self.breakers[model_name] = CircuitBreaker(
+                    failure_threshold=getattr(settings, 'GEMINI_BREAKER_FAILURE_THRESHOLD', 3),
+                    reset_timeout=getattr(settings, 'GEMINI_BREAKER_RESET_TIMEOUT', 60),
+                )
+            return self.breakers[model_name]
+
+    def _get_bucket(self, model_name):
+        with self._lock:
+            if model_name not in self.buckets:
+                rate_limits = getattr(settings, 'GEMINI_RATE_LIMITS', {})
+                self.buckets[model_name] = TokenBucket(rate_limits.get(model_name, 10))
+            return self.buckets[model_name]
+
+    def rate_limit(self, model_name):
+        """Most calls the model's rate limit admits in a burst"""
+        return int(self._get_bucket(model_name).capacity)
+
+    def available_requests(self, model_name):
+        """Calls the model's rate limit would admit right now"""
+        return int(self._get_bucket(model_name).snapshot()['available_requests'])
+
+    def is_available(self, model_name):
+        return self._get_breaker(model_name).snapshot()['state'] != CircuitBreaker.OPEN
+
+    def generate(self, model_name, prompt, generation_config=None, max_retries=1, priority=PRIORITY_STANDARD):
+        """Call the model and return the response text.
+
+        Raises AIUnavailableError without waiting when the breaker is open, the
+        rate limit or the student's quota is spent, so callers can serve their
+        fallback immediately. Waits up to the priority's timeout for a call slot.
+        The student's quota is charged once per call, and given back when the call is
+        refused before anything was sent. The slot is held only while an attempt runs,
+        never during the backoff between attempts.
+        """
+        _, student_id = current_call_context()
+        self.scheduler.charge(student_id)
+        breaker = self._get_breaker(model_name)
+        bucket = self._get_bucket(model_name)
+        last_error = None
+
+        for attempt in range(max_retries):
+            try:
+                with self.scheduler.slot(student_id, priority, charge=False):
+                    text, last_error = self._attempt(model_name, prompt, generation_config, breaker, bucket)
+            except AIUnavailableError:
+                # Refused locally; only the first attempt's refusal means nothing was sent at all
+                if attempt == 0:
+                    self.scheduler.refund(student_id)
+                raise
+            if last_error is None:
+                return text
+
+            logger.warning(f"{model_name} call failed (attempt {attempt+1}/{max_retries}): {last_error}")
+            if attempt < max_retries - 1:
+                time.sleep(backoff_delay(attempt))
+
+        raise last_error
+
+    def _attempt(self, model_name, prompt, generation_config, breaker, bucket):
+        """One model call; returns (text, None) or (None, error), raising when refused locally"""
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"{model_name} circuit is open")
+        if not bucket.try_acquire():
+            breaker.release()
+            raise RateLimitedError(f"{model_name} rate limit reached")
+
+        started = time.monotonic()
+        try:
+            model = genai.GenerativeModel(model_name, generation_config=generation_config)
+            response = model.generate_content(prompt)
+            text = response.text
+        except google_exceptions.ResourceExhausted as e:
+            bucket.throttle()
+            breaker.record_failure()
+            error = e
+        except SERVICE_ERRORS as e:
+            breaker.record_failure()
+            error = e
+        except Exception as e:
+            # The service answered, e.g. with a safety-blocked reply: not a reason to stop calling it
+            breaker.release()
+            error = e
+        else:
+            breaker.record_success()
+            bucket.recover()
+            prompt_tokens, output_tokens, cached_tokens = usage_from_response(response)
+            ai_ledger.record(
+                model_name,
+                prompt_tokens=prompt_tokens,
+                output_tokens=output_tokens,
+                cached_tokens=cached_tokens,
+                latency_ms=int((time.monotonic() - started) * 1000),
+            )
+            return text, None
+
+        ai_ledger.record(model_name, latency_ms=int((time.monotonic() - started) * 1000), success=False)
+        return None, error
+
+    def metrics(self):
+        with self._lock:
+            model_names = sorted(set(self.breakers) | set(self.buckets))
+        return {
+            model_name: {
+                'circuit': self._get_breaker(model_name).snapshot(),
+                'rate_limit': self._get_bucket(model_name).snapshot(),
+            }
+            for model_name in model_names
+        }
+
+# Initialize the shared Gemini client
+gemini_client = GeminiClient()
@@ -0,0 +1,130 @@
+# content/lesson_schema.py
+import json
+import re
+
+QUESTIONS_PER_QUIZ = 4
+OPTION_KEYS = ['A', 'B', 'C', 'D']
+
+CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class LessonSchemaError(ValueError):
+    """The model output can't be turned into a usable lesson"""
+
+
+def extract_json(response_text):
+    """
+    Parse JSON from a model response, tolerating code fences, leading chatter and
+    trailing commas. Raises LessonSchemaError when nothing parseable is found.
+    """
+    text = CODE_FENCE.sub('', (response_text or '').strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        raise LessonSchemaError("Could not extract JSON from response")
+
+    candidate = text[start:end + 1]
+    for attempt in (candidate, TRAILING_COMMA.sub(r'\1', candidate)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    raise LessonSchemaError("Response contains malformed JSON")
+
+
+def repair_question(question_data):
+    """
+    Normalize one quiz question to 4 answers keyed A-D with exactly one correct answer.
+    Both 'is_correct' on each answer and 'correct_answer_key' are filled in, since the
+    prompts in this app ask for one or the other.
+    """
+    if not isinstance(question_data, dict):
+        raise LessonSchemaError("Question is not an object")
+
+    question_text = str(question_data.get('question_text') or '').strip()
+    if not question_text:
+        raise LessonSchemaError("Question has no text")
+
+    answers = [
+        answer for answer in question_data.get('answers') or []
+        if isinstance(answer, dict) and str(answer.get('answer_text') or '').strip()
+    ]
+    if len(answers) < len(OPTION_KEYS):
+        raise LessonSchemaError(f"Question has only {len(answers)} answers")
+
+    correct_key = str(question_data.get('correct_answer_key') or '').strip().upper()
+    flagged = [i for i, answer in enumerate(answers) if answer.get('is_correct') is True]
+    keyed = [i for i, answer in enumerate(answers) if str(answer.get('option_key') or '').strip().upper() == correct_key]
+
+    if len(flagged) == 1:
+        correct_index = flagged[0]
+    elif len(keyed) == 1 and (not flagged or keyed[0] in flagged):
+        correct_index = keyed[0]
+    else:
+        raise LessonSchemaError("Question has no single correct answer")
+
+    # Keep the correct answer when trimming extra options
+    if correct_index >= len(OPTION_KEYS):
+        answers = answers[:len(OPTION_KEYS) - 1] + [answers[correct_index]]
+        correct_index = len(OPTION_KEYS) - 1
+    answers = answers[:len(OPTION_KEYS)]
+
+    repaired_answers = []
+    for a_idx, answer in enumerate(answers):
+        repaired_answers.append({
+            'answer_text': str(answer['answer_text']).strip(),
+            'option_key': OPTION_KEYS[a_idx],
+            'is_correct': a_idx == correct_index,
+        })
+
+    return {
+        'question_text': question_text,
+        'answers': repaired_answers,
+        'correct_answer_key': OPTION_KEYS[correct_index],
+    }
+
+
+def validate_lesson(lesson_data, default_title=None):
+    """
+    Return a repaired copy of a lesson with title, content and a 4-question quiz.
+    Unusable questions are dropped; the lesson is rejected only if fewer than 4 remain.
+    """
+    if not isinstance(lesson_data, dict):
+        raise LessonSchemaError("Lesson is not an object")
+
+    title = str(lesson_data.get('title') or default_title or '').strip()
+    content = lesson_data.get('content')
+    if not title:
+        raise LessonSchemaError("Lesson has no title")
+    if not isinstance(content, str) or not content.strip():
+        raise LessonSchemaError(f"'{title}' has no content")
+
+    quiz = lesson_data.get('quiz')
+    questions = quiz.get('questions') if isinstance(quiz, dict) else None
+    if not isinstance(questions, list):
+        raise LessonSchemaError(f"'{title}' is missing its quiz")
+
+    repaired_questions = []
+    for question_data in questions:
+        try:
+            repaired_questions.append(repair_question(question_data))
+        except LessonSchemaError:
+            continue
+        if len(repaired_questions) == QUESTIONS_PER_QUIZ:
+            break
+
+    if len(repaired_questions) < QUESTIONS_PER_QUIZ:
+        raise LessonSchemaError(f"'{title}' has only {len(repaired_questions)} usable questions")
+
+    lesson = dict(lesson_data)
+    lesson.update({
+        'title': title,
+        'content': content,
+        'quiz': {'questions': repaired_questions},
+    })
+    return lesson
@@ -0,0 +1,34 @@
+# content/management/commands/backfill_quiz_attempts.py
+# Creates a QuizAttempt for every completion recorded before attempt history was kept
+
+from django.core.management.base import BaseCommand
+from content.attempts import completion_attempt
+from content.models import GeneratedQuestion, GeneratedTopicCompletion, QuizAttempt
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the latest attempt behind each GeneratedTopicCompletion that has no QuizAttempt rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        questions_by_topic = {}
+        for question_id, topic_id in GeneratedQuestion.objects.order_by('order', 'id').values_list('id', 'quiz__topic_id'):
+            questions_by_topic.setdefault(topic_id, []).append(question_id)
+        recorded = set(QuizAttempt.objects.values_list('student_id', 'topic_id').distinct())
+
+        created = 0
+        batch = []
+        for completion in GeneratedTopicCompletion.objects.order_by('id').iterator(chunk_size=batch_size):
+            if (completion.student_id, completion.topic_id) in recorded:
+                continue
+            batch.append(completion_attempt(completion, questions_by_topic.get(completion.topic_id, [])))
+            if len(batch) >= batch_size:
+                QuizAttempt.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        QuizAttempt.objects.bulk_create(batch)
+        created += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} quiz attempts from existing completions'))
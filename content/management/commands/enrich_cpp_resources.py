@@ -0,0 +1,81 @@
+# content/management/commands/enrich_cpp_resources.py
+# Grows the CppLearningResource catalog offline so quiz failures never wait on the AI
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from content.ai_ledger import ai_call_context, ai_ledger
+from content.models import CppLearningResource, GeneratedTopic
+from content.views import generate_ai_cpp_resources
+
+RESOURCE_TYPE_MAP = {
+    'video': 'video',
+    'article': 'article',
+    'tutorial': 'tutorial',
+    'exercise': 'exercise',
+    'exercises': 'exercise',
+    'documentation': 'documentation',
+}
+
+CATEGORY_KEYWORDS = [
+    ('memory', ['pointer', 'memory', 'new', 'delete', 'reference', 'smart']),
+    ('oop', ['class', 'object', 'inheritance', 'polymorphism', 'encapsulation', 'oop']),
+    ('stl', ['template', 'stl', 'vector', 'container', 'algorithm', 'map']),
+    ('advanced', ['thread', 'concurrency', 'metaprogramming', 'performance', 'pattern']),
+]
+
+
+def guess_topic_category(topic_title):
+    title = topic_title.lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in title for keyword in keywords):
+            return category
+    return 'syntax'
+
+
+class Command(BaseCommand):
+    help = 'Ask the AI for resources on the most failed topics and add them to the resource catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topic', action='append', dest='topics', help='Topic title to enrich (repeatable)')
+        parser.add_argument('--limit', type=int, default=20, help='Maximum number of failed topics to enrich')
+
+    def handle(self, *args, **options):
+        topic_titles = options['topics']
+        if not topic_titles:
+            # Topics students fail most often are the ones worth enriching
+            failed_topics = GeneratedTopic.objects.annotate(
+                failures=Count('generatedtopiccompletion', filter=Q(generatedtopiccompletion__passed=False))
+            ).filter(failures__gt=0).order_by('-failures')
+            topic_titles = []
+            for title in failed_topics.values_list('title', flat=True):
+                if title not in topic_titles:
+                    topic_titles.append(title)
+                if len(topic_titles) >= options['limit']:
+                    break
+
+        created_count = 0
+        for topic_title in topic_titles:
+            with ai_call_context('enrich_cpp_resources'):
+                resources = generate_ai_cpp_resources(topic_title, 0)
+            if not resources:
+                self.stdout.write(self.style.WARNING(f"No resources returned for '{topic_title}'"))
+                continue
+
+            for resource_data in resources:
+                resource, created = CppLearningResource.objects.get_or_create(
+                    url=resource_data['url'],
+                    defaults={
+                        'title': resource_data['title'][:200],
+                        'resource_type': RESOURCE_TYPE_MAP.get(resource_data['type'].lower(), 'article'),
+                        'topic_category': guess_topic_category(topic_title),
+                        'difficulty': 'basic',
+                        'description': f"{topic_title}: {resource_data['description']}",
+                        'source': resource_data['source'][:100],
+                    }
+                )
+                if created:
+                    created_count += 1
+                    self.stdout.write(self.style.SUCCESS(f"Created resource: {resource.title}"))
+
+        ai_ledger.flush()
+        self.stdout.write(self.style.SUCCESS(f"Added {created_count} resources to the catalog"))
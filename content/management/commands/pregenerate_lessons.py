@@ -0,0 +1,67 @@
+# content/management/commands/pregenerate_lessons.py
+# Pre-generates simplified and reinforcement lessons so failing students get them instantly
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from content.ai_ledger import ai_call_context, ai_ledger
+from content.gemini_client import AIUnavailableError
+from content.pregeneration import (
+    find_high_failure_titles, pregenerate_simplified_topics, courses_needing_reinforcement
+)
+from content.tasks import request_reinforcement_topic
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate simplified lessons for frequently failed topics and pending reinforcement lessons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=3, help='Lessons requested per model call')
+        parser.add_argument('--min-attempts', type=int, default=3, help='Attempts needed before a topic is considered')
+        parser.add_argument('--min-failure-rate', type=float, default=0.4, help='Failure rate that triggers pre-generation')
+        parser.add_argument('--limit', type=int, default=30, help='Maximum topic titles per run')
+        parser.add_argument('--worker', action='store_true', help='Keep running and work only during off-peak hours')
+        parser.add_argument('--interval', type=int, default=900, help='Seconds between worker passes')
+
+    def handle(self, *args, **options):
+        if not options['worker']:
+            self.run_pass(options)
+            return
+
+        start_hour, end_hour = getattr(settings, 'PREGENERATION_OFF_PEAK_HOURS', (1, 6))
+        self.stdout.write(f"Worker started, active between {start_hour}:00 and {end_hour}:00")
+        while True:
+            hour = timezone.localtime().hour
+            if start_hour <= hour < end_hour:
+                self.run_pass(options)
+            time.sleep(options['interval'])
+
+    def run_pass(self, options):
+        with ai_call_context('pregenerate_lessons'):
+            self.generate(options)
+        ai_ledger.flush()
+
+    def generate(self, options):
+        titles = find_high_failure_titles(
+            min_attempts=options['min_attempts'],
+            min_failure_rate=options['min_failure_rate'],
+            limit=options['limit']
+        )
+        self.stdout.write(f"Found {len(titles)} frequently failed topics")
+
+        try:
+            stored = pregenerate_simplified_topics(titles, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Stored simplified lessons on {stored} topics"))
+
+            created = 0
+            for course in courses_needing_reinforcement()[:options['limit']]:
+                # Goes through the job row so a page load can't build the same lesson concurrently
+                job = request_reinforcement_topic(course, course.user, background=False)
+                if job.status == 'ready':
+                    created += 1
+            self.stdout.write(self.style.SUCCESS(f"Created {created} reinforcement lessons"))
+        except AIUnavailableError as e:
+            # Leave the rest for the next pass rather than hammering a failing model
+            self.stdout.write(self.style.WARNING(f"Stopping early, AI unavailable: {e}"))
@@ -0,0 +1,22 @@
+# content/management/commands/recalibrate_questions.py
+# Refits IRT item parameters on stored quiz responses and refreshes the question flags
+
+from django.core.management.base import BaseCommand
+from content.models import QuestionStats
+from content.question_bank import recalibrate
+
+
+class Command(BaseCommand):
+    help = 'Fit item difficulty/discrimination on quiz attempt history and flag poor questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--1pl', action='store_true', dest='one_parameter',
+                            help='Fit difficulty only (Rasch model)')
+
+    def handle(self, *args, **options):
+        items = recalibrate(two_parameter=not options['one_parameter'])
+        if not items:
+            self.stdout.write('No quiz responses to calibrate on')
+            return
+        flagged = QuestionStats.objects.filter(flagged=True).count()
+        self.stdout.write(self.style.SUCCESS(f'Calibrated {items} questions, {flagged} flagged'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_titles(apps, schema_editor):
+    """Give duplicate (user, title) courses a numbered suffix so the constraint can be added"""
+    GeneratedCourse = apps.get_model('content', 'GeneratedCourse')
+    duplicates = GeneratedCourse.objects.values('user', 'title').annotate(
+        count=Count('id')
+    ).filter(count__gt=1)
+
+    for duplicate in duplicates:
+        taken = set(
+            GeneratedCourse.objects.filter(user_id=duplicate['user']).values_list('title', flat=True)
+        )
+        courses = GeneratedCourse.objects.filter(
+            user_id=duplicate['user'],
+            title=duplicate['title']
+        ).order_by('created_at', 'id')
+
+        counter = 1
+        for course in courses[1:]:
+            while f"{duplicate['title']} ({counter})" in taken:
+                counter += 1
+            course.title = f"{duplicate['title']} ({counter})"
+            course.save(update_fields=['title'])
+            taken.add(course.title)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0021_generatedtopic_is_generated_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_titles, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='generatedcourse',
+            constraint=models.UniqueConstraint(fields=('user', 'title'), name='unique_generated_course_title_per_user'),
+        ),
+    ]
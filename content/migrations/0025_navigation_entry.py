@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0024_aicalllog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NavigationEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence_key', models.CharField(max_length=64)),
+                ('item_kind', models.CharField(choices=[('lesson', 'Lesson'), ('topic', 'Generated topic')], max_length=10)),
+                ('item_id', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('prev_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('next_id', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['sequence_key', 'position'],
+                'unique_together': {('sequence_key', 'item_kind', 'item_id')},
+            },
+        ),
+    ]
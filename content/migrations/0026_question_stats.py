@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0025_navigation_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='content.generatedquestion')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('timed_attempts', models.PositiveIntegerField(default=0)),
+                ('total_time_ms', models.BigIntegerField(default=0)),
+                ('rest_score_sum', models.FloatField(default=0.0)),
+                ('rest_score_sq_sum', models.FloatField(default=0.0)),
+                ('correct_rest_score_sum', models.FloatField(default=0.0)),
+                ('irt_difficulty', models.FloatField(blank=True, null=True)),
+                ('irt_discrimination', models.FloatField(blank=True, null=True)),
+                ('calibrated_at', models.DateTimeField(blank=True, null=True)),
+                ('flagged', models.BooleanField(db_index=True, default=False)),
+                ('flag_reason', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
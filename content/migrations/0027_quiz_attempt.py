@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0026_question_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_number', models.PositiveIntegerField(default=1)),
+                ('answers', models.BinaryField(default=bytes)),
+                ('score', models.FloatField()),
+                ('passed', models.BooleanField(default=False)),
+                ('adaptive', models.BooleanField(default=False)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to='content.generatedtopic')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['student', 'created_at'], name='content_qui_student_10c56b_idx'), models.Index(fields=['topic', 'created_at'], name='content_qui_topic_i_39c65f_idx')],
+            },
+        ),
+    ]
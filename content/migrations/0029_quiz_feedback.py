@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0028_quiz_attempt_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizFeedback',
+            fields=[
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feedback', serialize=False, to='content.quizattempt')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('source', models.CharField(choices=[('template', 'Template'), ('ai', 'AI')], default='template', max_length=10)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0029_quiz_feedback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedtopic',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0030_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import re
 from django.db import models
 from django.utils import timezone
 from users.models import Student
@@ -45,6 +46,8 @@ class Lesson(models.Model):
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_LEVELS, default='beginner')
     order = models.PositiveIntegerField(default=0)
     estimated_time = models.PositiveIntegerField(default=10, help_text="Minutes required")
+    # Lets the similarity index pick up edits made while it was not loaded
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['order']
@@ -70,12 +73,34 @@ class GeneratedCourse(models.Model):
     level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='beginner')
     
     class Meta:
-        # Remove the unique constraint that was causing issues
-        constraints = []
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'title'], name='unique_generated_course_title_per_user'),
+        ]
     
     def __str__(self):
         return self.title
 
+    @classmethod
+    def next_available_title(cls, user, title):
+        """Return title, or the first free "title (n)" variant, using a single prefix query"""
+        taken = set(
+            cls.objects.filter(user=user, title__startswith=title).values_list('title', flat=True)
+        )
+        if title not in taken:
+            return title
+
+        suffix_pattern = re.compile(rf'^{re.escape(title)} \((\d+)\)$')
+        used_counters = set()
+        for existing in taken:
+            match = suffix_pattern.match(existing)
+            if match:
+                used_counters.add(int(match.group(1)))
+
+        counter = 1
+        while counter in used_counters:
+            counter += 1
+        return f"{title} ({counter})"
+
 class GeneratedChapter(models.Model):
     course = models.ForeignKey(GeneratedCourse, on_delete=models.CASCADE, related_name='chapters')
     title = models.CharField(max_length=200)
@@ -114,6 +139,8 @@ class GeneratedTopic(models.Model):
         blank=True,
         related_name='reinforcement_topics'
     )
+    # Lets the similarity index pick up edits made while it was not loaded
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['order']
@@ -202,4 +229,180 @@ class CppLearningResource(models.Model):
     source = models.CharField(max_length=100)
     
     def __str__(self):
-        return f"{self.title} ({self.source})"
\ No newline at end of file
+        return f"{self.title} ({self.source})"
+
+class ReinforcementJob(models.Model):
+    """Lock row for building one student's reinforcement lesson outside the request cycle"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    course = models.ForeignKey(GeneratedCourse, on_delete=models.CASCADE, related_name='reinforcement_jobs')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reinforcement_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    topic = models.ForeignKey(GeneratedTopic, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('course', 'student')
+
+    def __str__(self):
+        return f"Reinforcement for {self.student.username} on {self.course.title} ({self.status})"
+
+
+class AICallLog(models.Model):
+    """Append-only record of one model call, written in batches by content.ai_ledger"""
+    model_name = models.CharField(max_length=50)
+    endpoint = models.CharField(max_length=100, db_index=True)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_calls')
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cached_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    cache_hit = models.BooleanField(default=False)
+    success = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.endpoint} {self.model_name} ({self.prompt_tokens}+{self.output_tokens} tokens)"
+
+
+class NavigationEntry(models.Model):
+    """
+    One item of a flattened course sequence with its neighbours, maintained by content.navigation.
+    sequence_key is 'generated:<course id>' or 'path:<course id>:<student id>' (a student's lesson order).
+    """
+    ITEM_KINDS = [
+        ('lesson', 'Lesson'),
+        ('topic', 'Generated topic'),
+    ]
+
+    sequence_key = models.CharField(max_length=64)
+    item_kind = models.CharField(max_length=10, choices=ITEM_KINDS)
+    item_id = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+    prev_id = models.PositiveIntegerField(null=True, blank=True)
+    next_id = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('sequence_key', 'item_kind', 'item_id')
+        ordering = ['sequence_key', 'position']
+
+    def __str__(self):
+        return f"{self.sequence_key} #{self.position}: {self.item_kind} {self.item_id}"
+
+
+class QuestionStats(models.Model):
+    """
+    Running statistics of one generated question, updated on every quiz submission
+    and recalibrated periodically by content.question_bank.
+    """
+    question = models.OneToOneField(GeneratedQuestion, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    timed_attempts = models.PositiveIntegerField(default=0)
+    total_time_ms = models.BigIntegerField(default=0)
+    # Sums over attempts of the rest score (share of the other questions answered correctly),
+    # enough to compute the point-biserial discrimination index without storing attempts
+    rest_score_sum = models.FloatField(default=0.0)
+    rest_score_sq_sum = models.FloatField(default=0.0)
+    correct_rest_score_sum = models.FloatField(default=0.0)
+    # 2PL item response theory parameters from the last recalibration
+    irt_difficulty = models.FloatField(null=True, blank=True)
+    irt_discrimination = models.FloatField(null=True, blank=True)
+    calibrated_at = models.DateTimeField(null=True, blank=True)
+    flagged = models.BooleanField(default=False, db_index=True)
+    flag_reason = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def p_correct(self):
+        return self.correct / self.attempts if self.attempts else None
+
+    @property
+    def average_time_ms(self):
+        return self.total_time_ms / self.timed_attempts if self.timed_attempts else None
+
+    @property
+    def discrimination_index(self):
+        """Point-biserial correlation between answering this question and the rest score"""
+        n = self.attempts
+        if n < 2 or self.correct in (0, n):
+            return None
+        mean_rest = self.rest_score_sum / n
+        variance = self.rest_score_sq_sum / n - mean_rest ** 2
+        if variance <= 1e-12:
+            return None
+        p = self.correct / n
+        mean_rest_correct = self.correct_rest_score_sum / self.correct
+        return (mean_rest_correct - mean_rest) / variance ** 0.5 * (p / (1 - p)) ** 0.5
+
+    def __str__(self):
+        return f"Stats for question {self.question_id} ({self.correct}/{self.attempts})"
+
+
+class QuizAttempt(models.Model):
+    """
+    Append-only record of one quiz submission, written by content.attempts.
+    GeneratedTopicCompletion is the maintained summary of a student's attempts at a topic.
+    """
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_attempts')
+    topic = models.ForeignKey(GeneratedTopic, on_delete=models.CASCADE, related_name='quiz_attempts')
+    attempt_number = models.PositiveIntegerField(default=1)
+    # Packed (question id, option, correct) triples, see content.attempts.encode_answers
+    answers = models.BinaryField(default=bytes)
+    score = models.FloatField()
+    passed = models.BooleanField(default=False)
+    adaptive = models.BooleanField(default=False)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    # Sent by the quiz page with each submission; a retried or double-clicked submit reuses it
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    # The response sent for the submission, given again to a retry of it
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['student', 'created_at']),
+            models.Index(fields=['topic', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'idempotency_key'], name='unique_quiz_submission'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} attempt {self.attempt_number} at {self.topic_id}: {self.score}"
+
+
+class QuizFeedback(models.Model):
+    """
+    Feedback on one quiz attempt, generated by the AI outside the request cycle.
+    text holds the template feedback until the AI's version is ready.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    SOURCE_CHOICES = [
+        ('template', 'Template'),
+        ('ai', 'AI'),
+    ]
+
+    attempt = models.OneToOneField(QuizAttempt, on_delete=models.CASCADE, primary_key=True, related_name='feedback')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='template')
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Feedback on attempt {self.attempt_id} ({self.status}, {self.source})"
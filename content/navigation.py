@@ -0,0 +1,86 @@
+# content/navigation.py
+from django.db import transaction
+
+from .models import GeneratedTopic, Lesson, NavigationEntry
+
+
+def generated_course_key(course_id):
+    return f'generated:{course_id}'
+
+
+def path_key(course_id, student_id):
+    return f'path:{course_id}:{student_id}'
+
+
+def store_sequence(sequence_key, item_kind, item_ids):
+    """Replace a sequence with the given order; returns {item_id: NavigationEntry}"""
+    entries = [
+        NavigationEntry(
+            sequence_key=sequence_key,
+            item_kind=item_kind,
+            item_id=item_id,
+            position=position,
+            prev_id=item_ids[position - 1] if position > 0 else None,
+            next_id=item_ids[position + 1] if position + 1 < len(item_ids) else None,
+        )
+        for position, item_id in enumerate(item_ids)
+    ]
+    with transaction.atomic():
+        NavigationEntry.objects.filter(sequence_key=sequence_key).delete()
+        # A concurrent rebuild may have written the same rows
+        NavigationEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return {entry.item_id: entry for entry in entries}
+
+
+def build_generated_course_sequence(course_id):
+    topic_ids = list(GeneratedTopic.objects.filter(chapter__course_id=course_id).order_by(
+        'order', 'id'
+    ).values_list('id', flat=True))
+    return store_sequence(generated_course_key(course_id), 'topic', topic_ids)
+
+
+def build_path_sequence(course_id, student_id, module_ids):
+    """Lessons in the order of a personalized module path; modules missing from it follow in course order"""
+    rank = {module_id: i for i, module_id in enumerate(module_ids)}
+    lessons = Lesson.objects.filter(module__course_id=course_id).order_by(
+        'module__order', 'module_id', 'order', 'id'
+    ).values_list('id', 'module_id')
+    # sorted is stable, so course order holds within each module and among unranked modules
+    ordered = sorted(lessons, key=lambda lesson: rank.get(lesson[1], len(rank)))
+    return store_sequence(path_key(course_id, student_id), 'lesson', [lesson_id for lesson_id, _ in ordered])
+
+
+def neighbours(sequence_key, item_kind, item_id, build):
+    """
+    (prev_id, next_id) for an item, in one indexed lookup.
+    A sequence that was invalidated is rebuilt by calling build() once.
+    """
+    entry = NavigationEntry.objects.filter(
+        sequence_key=sequence_key, item_kind=item_kind, item_id=item_id
+    ).only('prev_id', 'next_id').first()
+    if entry is None:
+        entry = build().get(item_id)
+    if entry is None:
+        return None, None
+    return entry.prev_id, entry.next_id
+
+
+def topic_neighbours(course_id, topic_id):
+    """Previous and next GeneratedTopic ids around a topic of a generated course"""
+    return neighbours(
+        generated_course_key(course_id), 'topic', topic_id,
+        lambda: build_generated_course_sequence(course_id)
+    )
+
+
+def invalidate_course(course_id):
+    """Drop every personalized path over a course; rebuilt on next lookup"""
+    NavigationEntry.objects.filter(sequence_key__startswith=f'path:{course_id}:').delete()
+
+
+def invalidate_generated_course(course_id):
+    NavigationEntry.objects.filter(sequence_key=generated_course_key(course_id)).delete()
+
+
+def invalidate_student_paths(student_id):
+    NavigationEntry.objects.filter(sequence_key__startswith='path:', sequence_key__endswith=f':{student_id}').delete()
@@ -0,0 +1,149 @@
+# content/pregeneration.py
+import json
+import logging
+
+from django.db.models import Count, F, Q
+
+from .gemini_client import gemini_client, PRIORITY_BULK
+from .lesson_schema import extract_json, validate_lesson, LessonSchemaError
+from .prompts import SIMPLIFIED_BATCH_PROMPT
+from .models import GeneratedCourse, GeneratedTopic, GeneratedTopicCompletion
+
+logger = logging.getLogger(__name__)
+
+
+def find_high_failure_titles(min_attempts=3, min_failure_rate=0.4, limit=50):
+    """Lesson titles that students fail most often, across every generated course"""
+    stats = GeneratedTopicCompletion.objects.filter(
+        topic__is_regenerated=False,
+        topic__is_reinforcement=False
+    ).values('topic__title').annotate(
+        attempts=Count('id'),
+        failures=Count('id', filter=Q(passed=False))
+    ).filter(attempts__gte=min_attempts)
+
+    rated = []
+    for row in stats:
+        failure_rate = row['failures'] / row['attempts']
+        if failure_rate >= min_failure_rate:
+            rated.append((failure_rate, row['topic__title']))
+    rated.sort(reverse=True)
+    return [title for _, title in rated[:limit]]
+
+
+def topics_missing_simplified_content(titles):
+    """Original topics with these titles that have no simplified variant yet and are not passed"""
+    return GeneratedTopic.objects.filter(
+        title__in=titles,
+        is_regenerated=False,
+        is_reinforcement=False,
+        regenerated_versions__isnull=True
+    ).filter(
+        Q(alternative_content__isnull=True) | Q(alternative_content='')
+    ).exclude(
+        generatedtopiccompletion__passed=True
+    )
+
+
+def load_pregenerated_simplified_topic(topic):
+    """Return the simplified lesson stored offline for this topic, or None"""
+    if not topic.alternative_content:
+        return None
+    try:
+        return validate_lesson(extract_json(topic.alternative_content))
+    except LessonSchemaError:
+        return None
+
+
+def load_shared_simplified_topic(topic):
+    """
+    A simplified lesson another student already received for a topic with the same title,
+    used when the AI can't be called right now. Returns lesson data or None.
+    """
+    candidates = GeneratedTopic.objects.filter(
+        is_regenerated=True,
+        original_topic__title=topic.title,
+        quiz__isnull=False
+    ).prefetch_related('quiz__questions__answers', 'quiz__questions__stats').order_by('-id')[:3]
+
+    for candidate in candidates:
+        # Don't hand out a quiz whose items the question bank has flagged as broken
+        if any(hasattr(q, 'stats') and q.stats.flagged for q in candidate.quiz.questions.all()):
+            continue
+        questions = []
+        for question in candidate.quiz.questions.all():
+            questions.append({
+                'question_text': question.question_text,
+                'answers': [
+                    {'answer_text': a.answer_text, 'option_key': a.option_key, 'is_correct': a.is_correct}
+                    for a in question.answers.all()
+                ],
+            })
+        try:
+            return validate_lesson({'title': candidate.title, 'content': candidate.content, 'quiz': {'questions': questions}})
+        except LessonSchemaError:
+            continue
+    return None
+
+
+def generate_simplified_batch(titles):
+    """Ask for simplified versions of several lessons in one model request"""
+    prompt = SIMPLIFIED_BATCH_PROMPT.render(lessons=[f"- {json.dumps(title)}" for title in titles])
+
+    response_text = gemini_client.generate(
+        'gemini-2.5-flash', prompt, generation_config={"response_mime_type": "application/json"}, priority=PRIORITY_BULK
+    )
+    batch_data = extract_json(response_text)
+
+    lessons = {}
+    for lesson in batch_data.get('lessons', []):
+        original_title = lesson.get('original_title') if isinstance(lesson, dict) else None
+        if original_title not in titles:
+            logger.warning(f"Discarding pre-generated lesson for unknown title '{original_title}'")
+            continue
+        try:
+            lessons[original_title] = validate_lesson(lesson, default_title=f"Simplified: {original_title}")
+        except LessonSchemaError as e:
+            logger.warning(f"Discarding pre-generated lesson for '{original_title}': {e}")
+    return lessons
+
+
+def pregenerate_simplified_topics(titles, batch_size=3):
+    """Generate one simplified lesson per title and store it on every matching topic"""
+    stored = 0
+    for start in range(0, len(titles), batch_size):
+        batch_titles = titles[start:start + batch_size]
+        lessons = generate_simplified_batch(batch_titles)
+
+        for title, lesson in lessons.items():
+            # Lessons with the same title share one generated variant
+            stored += topics_missing_simplified_content([title]).update(
+                alternative_content=json.dumps(lesson)
+            )
+    return stored
+
+
+def courses_needing_reinforcement():
+    """Courses whose owner attempted every lesson, failed at least one, and has no review lesson yet"""
+    lesson_filter = Q(chapters__topics__is_regenerated=False, chapters__topics__is_reinforcement=False)
+    own_completion = Q(chapters__topics__generatedtopiccompletion__student=F('user'))
+
+    return GeneratedCourse.objects.annotate(
+        total_topics=Count('chapters__topics', filter=lesson_filter, distinct=True),
+        attempted_topics=Count(
+            'chapters__topics__generatedtopiccompletion',
+            filter=lesson_filter & own_completion,
+            distinct=True
+        ),
+        failed_topics=Count(
+            'chapters__topics__generatedtopiccompletion',
+            filter=lesson_filter & own_completion & Q(chapters__topics__generatedtopiccompletion__score__lt=50),
+            distinct=True
+        )
+    ).filter(
+        total_topics__gt=0,
+        attempted_topics=F('total_topics'),
+        failed_topics__gt=0
+    ).exclude(
+        chapters__topics__is_reinforcement=True
+    ).select_related('user')
@@ -0,0 +1,309 @@
+# content/prompts.py
+import logging
+import textwrap
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token in English prose and code; close enough to budget with
+CHARS_PER_TOKEN = 4
+TRUNCATED = "... [truncated]"
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def token_budget():
+    """Most tokens a rendered prompt may use before its variable sections are trimmed"""
+    return getattr(settings, 'AI_PROMPT_TOKEN_BUDGET', 6000)
+
+
+def compile_block(text):
+    """Dedent a static instruction block once, at import, so every render sends the same bytes"""
+    return textwrap.dedent(text).strip()
+
+
+class PromptTemplate:
+    """
+    A prompt made of a static prefix, compiled once, followed by named variable sections.
+    Keeping everything that varies after the prefix lets the provider reuse its cached
+    context for the prefix across calls. A section value is a string or a list of lines;
+    when the prompt is over budget the sections in `trim` lose their last lines (or, for
+    strings, their tail; a string too short to shorten is dropped) in that order until it fits.
+    """
+
+    def __init__(self, name, *blocks, sections=(), trim=()):
+        self.name = name
+        self.prefix = "\n\n".join(compile_block(block) for block in blocks)
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.sections = sections
+        self.trim = trim
+
+    def render(self, budget=None, **values):
+        budget = token_budget() if budget is None else budget
+        parts = {}
+        for key, heading in self.sections:
+            value = values.get(key)
+            if isinstance(value, (list, tuple)):
+                value = list(value)
+            elif value is not None:
+                value = str(value).strip()
+            if value:
+                parts[key] = value
+
+        over = len(self._join(parts)) - budget * CHARS_PER_TOKEN
+        trimmed = []
+        for key in self.trim:
+            if over <= 0:
+                break
+            value = parts.get(key)
+            if not value:
+                continue
+            if isinstance(value, list):
+                # The omission note takes a line of its own, so measure what each cut really saves
+                full = len("\n".join(value))
+                kept, shortened = len(value), value
+                while kept > 0 and over > full - len("\n".join(shortened)):
+                    kept -= 1
+                    shortened = value[:kept] + [f"({len(value) - kept} more omitted)"]
+                parts[key] = shortened
+            elif len(value) > len(TRUNCATED):
+                keep = max(len(value) - over - len(TRUNCATED), 0)
+                parts[key] = value[:keep] + TRUNCATED
+            else:
+                # The truncation note would be no shorter than the value itself
+                del parts[key]
+            trimmed.append(key)
+            over = len(self._join(parts)) - budget * CHARS_PER_TOKEN
+
+        prompt = self._join(parts)
+        tokens = estimate_tokens(prompt)
+        if trimmed:
+            logger.info(f"Prompt '{self.name}' trimmed {', '.join(trimmed)} to fit {budget} tokens")
+        if tokens > budget:
+            logger.warning(f"Prompt '{self.name}' is ~{tokens} tokens, over its {budget} token budget")
+        logger.info(f"Prompt '{self.name}': {len(prompt)} chars, ~{tokens} tokens ({self.prefix_tokens} static)")
+        return prompt
+
+    def _join(self, parts):
+        body = [
+            f"{heading}:\n" + ("\n".join(parts[key]) if isinstance(parts[key], list) else parts[key])
+            for key, heading in self.sections if key in parts
+        ]
+        return "\n\n".join([self.prefix] + body)
+
+
+# Shared by every prompt that writes a lesson, so they all start with the same bytes
+LESSON_RULES = """
+    You write C++ lessons for an adaptive learning system. Every lesson ends with a quiz,
+    which is ESSENTIAL for student progression.
+
+    NON-NEGOTIABLE REQUIREMENTS FOR EVERY LESSON:
+    1. The lesson MUST have a quiz with exactly 4 questions
+    2. Each question MUST have exactly 4 answer options (A, B, C, D)
+    3. Only one correct answer per question
+    4. Questions must test actual understanding of the lesson content
+    5. Answer options must be plausible but only one is correct
+
+    CRITICAL: You MUST return valid JSON without any syntax errors, extra characters, or formatting issues.
+    Ensure that all strings are properly escaped and there are no trailing commas in objects or arrays.
+
+    A lesson is this JSON object:
+    {
+        "title": "Lesson title",
+        "content": "Lesson content",
+        "quiz": {
+            "questions": [
+                {
+                    "question_text": "Question that tests understanding",
+                    "answers": [
+                        {"answer_text": "Plausible but incorrect option", "option_key": "A", "is_correct": false},
+                        {"answer_text": "Correct answer", "option_key": "B", "is_correct": true},
+                        {"answer_text": "Plausible but incorrect option", "option_key": "C", "is_correct": false},
+                        {"answer_text": "Clearly wrong option", "option_key": "D", "is_correct": false}
+                    ]
+                }
+            ]
+        }
+    }
+"""
+
+SYLLABUS_PROMPT = PromptTemplate(
+    'syllabus',
+    """
+    You are planning a C++ course. The course and its lessons, in exact order, are given below.
+
+    For every lesson, write a one-sentence summary and list the key concepts it must cover,
+    so that lessons written separately do not repeat or contradict each other.
+
+    Respond with JSON in this format:
+    {
+        "lessons": [
+            {
+                "title": "Exact lesson title from the list below",
+                "summary": "One sentence on what the lesson teaches",
+                "key_concepts": ["...", "..."]
+            }
+        ]
+    }
+    """,
+    sections=[('course', "COURSE"), ('lessons', "LESSONS")],
+)
+
+COURSE_LESSON_PROMPT = PromptTemplate(
+    'course_lesson',
+    LESSON_RULES,
+    """
+    TASK: Write ONE comprehensive lesson of the course described below, respond with the lesson object.
+    - The title must be the exact lesson title given under LESSON
+    - Content must be comprehensive (1000+ words) with clear explanations of concepts, practical code
+      examples, real-world applications, best practices, common pitfalls to avoid and memory diagrams
+      where appropriate
+    - Other lessons are written separately; do not repeat the material of the COURSE OUTLINE
+    - Include 4 questions: one on understanding, one on practical application,
+      one on syntax or code structure and one on underlying principles
+
+    TONE AND STYLE:
+    - Professional but accessible for students of the course's level
+    - Practical with real code examples
+    - Focus on understanding rather than memorization
+    - Include both theoretical concepts and practical applications
+    """,
+    sections=[('course', "COURSE"), ('lesson', "LESSON"), ('outline', "COURSE OUTLINE")],
+    trim=['outline'],
+)
+
+REINFORCEMENT_PROMPT = PromptTemplate(
+    'reinforcement',
+    LESSON_RULES,
+    """
+    TASK: Write a reinforcement lesson for the course below, respond with the lesson object.
+    Title it "Course Reinforcement: " followed by the course title. The lesson must:
+    1. Review all key concepts from the course
+    2. Focus especially on the areas where the student struggled, listed weakest first
+    3. Provide additional examples and explanations for difficult concepts
+    4. Include practice questions to reinforce learning
+    5. Use simple language and clear explanations
+    """,
+    sections=[('course', "COURSE"), ('weak_areas', "STUDENT STRUGGLED WITH")],
+    trim=['weak_areas'],
+)
+
+SIMPLER_TOPIC_PROMPT = PromptTemplate(
+    'simpler_topic',
+    LESSON_RULES,
+    """
+    TASK: Write a simpler version of the topic below for a student who failed its quiz,
+    respond with the lesson object. Title it "Simplified: " followed by the topic title. The new version:
+    1. Is at the target level given under STUDENT
+    2. Uses simpler language and more concrete examples
+    3. Focuses on the specific concepts the student struggled with
+    4. Includes as many more examples than the original as given under STUDENT
+    5. Breaks down complex concepts into smaller, more digestible parts
+    6. Uses analogies and real-world examples where appropriate
+    7. INCLUDES A QUIZ WITH EXACTLY 4 QUESTIONS - THIS IS REQUIRED
+
+    FAILURE TO INCLUDE A PROPER QUIZ WILL MAKE THE LESSON USELESS.
+    """,
+    sections=[('topic', "TOPIC"), ('student', "STUDENT"), ('wrong_answers', "STUDENT STRUGGLED WITH")],
+    trim=['wrong_answers'],
+)
+
+SIMPLIFIED_BATCH_PROMPT = PromptTemplate(
+    'simplified_batch',
+    LESSON_RULES,
+    """
+    TASK: Write simpler versions of each C++ lesson listed below for students who failed the original quiz.
+    Use simple language, concrete examples and analogies, and break complex concepts into small,
+    digestible parts. Title each one "Simplified: " followed by the original title.
+
+    Respond with JSON in this format, one lesson object per listed lesson:
+    {
+        "lessons": [
+            {"original_title": "Exact lesson title from the list below", "title": "...", "content": "...", "quiz": {...}}
+        ]
+    }
+    """,
+    sections=[('lessons', "LESSONS")],
+)
+
+CPP_RESOURCES_PROMPT = PromptTemplate(
+    'cpp_resources',
+    """
+    A student took a C++ quiz; the topic, their score and the questions they missed are given below.
+    They need 4 high-quality learning resources to improve their understanding.
+
+    CRITICAL REQUIREMENTS:
+    1. Each resource MUST be from a reputable, well-known platform
+    2. URLs MUST be valid, accessible, and directly link to the specific content
+    3. Resources must be specifically about C++ (not general programming)
+    4. Focus on resources that address the specific concepts they struggled with
+    5. Ensure URLs use https:// protocol and are fully qualified
+    6. Ensure there is strictly nothing like page not found
+
+    Please ensure that these resources exist
+    Trusted sources to recommend from:
+    - freeCodeCamp (https://www.freecodecamp.org/)
+    - W3Schools (https://www.w3schools.com/)
+    - GeeksforGeeks (https://www.geeksforgeeks.org/)
+    - Microsoft C++ Docs (https://docs.microsoft.com/en-us/cpp/)
+    - The Cherno YouTube channel (https://www.youtube.com/c/TheCherno)
+
+    For each resource, provide:
+    - title: Specific, descriptive title
+    - url: Full, valid URL to the exact resource
+    - type: video, article, tutorial, exercises, or documentation
+    - source: Name of the platform (e.g., "freeCodeCamp")
+    - description: Brief explanation of how this resource addresses their specific needs
+
+    Return the response as a JSON array of objects.
+
+    Example of valid response:
+    [
+        {
+            "title": "C++ Pointers Explained",
+            "url": "https://www.youtube.com/watch?v=DTxHyVn0ODg",
+            "type": "video",
+            "source": "freeCodeCamp",
+            "description": "Comprehensive video explaining pointers with visual examples"
+        }
+    ]
+
+    DO NOT include resources from unknown or unreliable sources.
+    DO NOT include URLs that are not fully qualified with http:// or https://.
+    """,
+    sections=[('quiz', "QUIZ"), ('wrong_answers', "THE STUDENT STRUGGLED WITH")],
+    trim=['wrong_answers'],
+)
+
+QUIZ_FEEDBACK_PROMPT = PromptTemplate(
+    'quiz_feedback',
+    """
+    Analyze the student's quiz performance given below and provide personalized feedback.
+
+    Provide feedback that:
+    1. Tell the user whether they did well or need improvement
+    2. Highlights what they did well (if anything)
+    3. Explains key areas for improvement based on their wrong answers
+    4. Ends with motivational closing
+
+    Keep the response under 200 words.
+    """,
+    sections=[('quiz', "QUIZ"), ('wrong_answers', "AREAS NEEDING IMPROVEMENT")],
+    trim=['wrong_answers'],
+)
+
+
+def wrong_answer_lines(wrong_answers):
+    """One numbered entry per missed question, for a trimmable prompt section"""
+    lines = []
+    for i, wrong in enumerate(wrong_answers or [], 1):
+        question_text = wrong.get('question', wrong.get('question_text', 'Unknown question'))
+        # Quiz submissions store 'selected'/'correct_text'; older callers passed 'user_answer'/'correct_answer'
+        answer = wrong.get('selected') or wrong.get('user_answer') or 'No answer'
+        correct = (wrong.get('correct_text') or wrong.get('correct_answer')
+                   or wrong.get('correct_answer_text') or wrong.get('correct') or 'Unknown answer')
+        lines.append(f"{i}. {question_text}\n   Their answer: {answer}\n   Correct answer: {correct}")
+    return lines
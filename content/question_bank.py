@@ -0,0 +1,201 @@
+# content/question_bank.py
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .attempts import decode_answers
+from .caching import bump_item_pool_version
+from .models import GeneratedQuestion, QuestionStats, QuizAttempt
+
+# Submissions needed before a question can be flagged
+MIN_ATTEMPTS_TO_FLAG = 20
+# Per-question answer times above this are treated as the student leaving the page
+MAX_QUESTION_TIME_MS = 30 * 60 * 1000
+# A quiz never drops below this many questions because of flags
+MIN_ACTIVE_QUESTIONS = 2
+
+
+def _flag_thresholds():
+    return getattr(settings, 'QUESTION_FLAG_THRESHOLDS', {
+        'too_easy': 0.98,          # share correct above which a question tells us nothing
+        'too_hard': 0.10,          # share correct below which the key is probably wrong
+        'min_discrimination': 0.0,  # point-biserial index; negative means strong students miss it
+        'min_irt_discrimination': 0.2,
+    })
+
+
+def flag_reason(stats):
+    """Why a question should be skipped, or '' if it is fine or has too little data"""
+    if stats.attempts < MIN_ATTEMPTS_TO_FLAG:
+        return ''
+    thresholds = _flag_thresholds()
+    if stats.p_correct > thresholds['too_easy']:
+        return 'too_easy'
+    if stats.p_correct < thresholds['too_hard']:
+        return 'too_hard'
+    discrimination = stats.discrimination_index
+    if discrimination is not None and discrimination < thresholds['min_discrimination']:
+        return 'negative_discrimination'
+    if stats.irt_discrimination is not None and stats.irt_discrimination < thresholds['min_irt_discrimination']:
+        return 'low_irt_discrimination'
+    return ''
+
+
+def parse_question_times(raw):
+    """Per-question answer times posted by the quiz page; JSON object keys arrive as strings"""
+    times_ms = {}
+    if isinstance(raw, dict):
+        for question_id, elapsed in raw.items():
+            try:
+                times_ms[int(question_id)] = float(elapsed)
+            except (TypeError, ValueError):
+                continue
+    return times_ms
+
+
+def record_responses(responses, times_ms=None):
+    """
+    Fold one submission into the statistics of each answered question.
+    responses maps question id -> answered correctly; times_ms optionally maps question id -> time taken.
+    Questions deleted since they were answered (an adaptive quiz can span edits) are skipped.
+    """
+    existing = set(GeneratedQuestion.objects.filter(id__in=list(responses)).values_list('id', flat=True))
+    responses = {question_id: correct for question_id, correct in responses.items() if question_id in existing}
+    if not responses:
+        return
+    times_ms = times_ms or {}
+    total_correct = sum(responses.values())
+    others = len(responses) - 1
+
+    with transaction.atomic():
+        QuestionStats.objects.bulk_create(
+            [QuestionStats(question_id=question_id) for question_id in responses], ignore_conflicts=True
+        )
+        for question_id, correct in responses.items():
+            rest = (total_correct - correct) / others if others else 0.0
+            changes = {
+                'attempts': F('attempts') + 1,
+                'rest_score_sum': F('rest_score_sum') + rest,
+                'rest_score_sq_sum': F('rest_score_sq_sum') + rest * rest,
+                'updated_at': timezone.now(),
+            }
+            if correct:
+                changes['correct'] = F('correct') + 1
+                changes['correct_rest_score_sum'] = F('correct_rest_score_sum') + rest
+            elapsed = times_ms.get(question_id)
+            if isinstance(elapsed, (int, float)) and 0 < elapsed <= MAX_QUESTION_TIME_MS:
+                changes['timed_attempts'] = F('timed_attempts') + 1
+                changes['total_time_ms'] = F('total_time_ms') + int(elapsed)
+            # F() updates so concurrent submissions never lose counts
+            QuestionStats.objects.filter(question_id=question_id).update(**changes)
+
+        # Re-check flags of the questions that now have enough data
+        toggled = []
+        for stats in QuestionStats.objects.filter(question_id__in=list(responses), attempts__gte=MIN_ATTEMPTS_TO_FLAG):
+            reason = flag_reason(stats)
+            if stats.flagged != bool(reason) or stats.flag_reason != reason:
+                QuestionStats.objects.filter(pk=stats.pk).update(flagged=bool(reason), flag_reason=reason)
+                if stats.flagged != bool(reason):
+                    toggled.append(stats.question_id)
+        for skill in question_skills(toggled):
+            bump_item_pool_version(skill)
+
+
+def question_skills(question_ids):
+    """Skills the questions practise; a simplified topic's questions count for its original"""
+    if not question_ids:
+        return set()
+    rows = GeneratedQuestion.objects.filter(id__in=question_ids).values_list('quiz__topic__original_topic_id', 'quiz__topic_id')
+    return {original_topic_id or topic_id for original_topic_id, topic_id in rows}
+
+
+def active_questions(quiz):
+    """The quiz's questions minus flagged ones, unless that would leave too few to grade"""
+    questions = list(quiz.questions.select_related('stats').prefetch_related('answers'))
+    active = [q for q in questions if not (hasattr(q, 'stats') and q.stats.flagged)]
+    return active if len(active) >= min(MIN_ACTIVE_QUESTIONS, len(questions)) else questions
+
+
+def response_matrix():
+    """
+    Observed (student, question, correct) triples from every stored quiz attempt.
+    Returns (student index, question ids, question index, correct) arrays.
+    """
+    students, items, outcomes = [], [], []
+    student_index, item_index = {}, {}
+    for student_id, answers in QuizAttempt.objects.order_by().values_list('student_id', 'answers').iterator():
+        for question_id, _, correct in decode_answers(answers):
+            students.append(student_index.setdefault(student_id, len(student_index)))
+            items.append(item_index.setdefault(question_id, len(item_index)))
+            outcomes.append(correct)
+
+    # Questions deleted since the attempt was stored have no stats row to calibrate
+    existing = set(GeneratedQuestion.objects.filter(id__in=list(item_index)).values_list('id', flat=True))
+    keep = np.array([question_id in existing for question_id in sorted(item_index, key=item_index.get)], dtype=bool)
+    students = np.array(students, dtype=np.int64)
+    items = np.array(items, dtype=np.int64)
+    outcomes = np.array(outcomes, dtype=float)
+    observed = keep[items] if len(items) else np.zeros(0, dtype=bool)
+    remap = np.cumsum(keep) - 1
+    question_ids = np.array(sorted(item_index, key=item_index.get), dtype=np.int64)[keep]
+    return students[observed], question_ids, remap[items[observed]], outcomes[observed]
+
+
+def fit_irt(students, items, outcomes, n_students, n_items, two_parameter=True, iterations=50):
+    """
+    Joint maximum a-posteriori fit of P(correct) = sigmoid(a_i * (theta_s - b_i)) with one
+    diagonal Newton step per iteration over all observations at once. With two_parameter=False
+    every a_i stays 1 (Rasch / 1PL). Normal priors keep students and items with few responses
+    near the population. Returns (theta, a, b).
+    """
+    theta = np.zeros(n_students)
+    log_a = np.zeros(n_items)
+    b = np.zeros(n_items)
+    for _ in range(iterations):
+        a = np.exp(log_a)[items]
+        logits = a * (theta[students] - b[items])
+        p = 1 / (1 + np.exp(-logits))
+        residual = outcomes - p
+        weight = p * (1 - p)
+
+        step = np.bincount(students, residual * a, n_students) - theta
+        information = np.bincount(students, weight * a * a, n_students) + 1
+        theta += np.clip(step / information, -1, 1)
+
+        step = -np.bincount(items, residual * a, n_items) - b / 4
+        information = np.bincount(items, weight * a * a, n_items) + 1 / 4
+        b += np.clip(step / information, -1, 1)
+
+        if two_parameter:
+            step = np.bincount(items, residual * logits, n_items) - log_a / 0.25
+            information = np.bincount(items, weight * logits * logits, n_items) + 1 / 0.25
+            log_a += np.clip(step / information, -0.5, 0.5)
+    return theta, np.exp(log_a), b
+
+
+def recalibrate(two_parameter=True):
+    """Refit item parameters on all stored responses and refresh the flags; returns the number of items"""
+    students, question_ids, items, outcomes = response_matrix()
+    if not len(question_ids):
+        return 0
+    _, a, b = fit_irt(students, items, outcomes, int(students.max()) + 1, len(question_ids), two_parameter=two_parameter)
+
+    now = timezone.now()
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=int(question_id)) for question_id in question_ids], ignore_conflicts=True
+    )
+    stats = QuestionStats.objects.in_bulk([int(question_id) for question_id in question_ids])
+    for i, question_id in enumerate(question_ids.tolist()):
+        item = stats[question_id]
+        item.irt_difficulty = float(b[i])
+        item.irt_discrimination = float(a[i])
+        item.calibrated_at = now
+        item.flag_reason = flag_reason(item)
+        item.flagged = bool(item.flag_reason)
+    QuestionStats.objects.bulk_update(
+        stats.values(), ['irt_difficulty', 'irt_discrimination', 'calibrated_at', 'flagged', 'flag_reason'], batch_size=500
+    )
+    bump_item_pool_version()
+    return len(question_ids)
@@ -0,0 +1,218 @@
+# content/resource_index.py
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Hand-picked resources keyed by the topic keyword they cover
+CURATED_CPP_RESOURCES = {
+    'pointer': [
+        {
+            'title': 'Pointers in C++',
+            'url': 'https://www.learncpp.com/cpp-tutorial/pointers/',
+            'type': 'tutorial',
+            'source': 'LearnCpp',
+            'description': 'Comprehensive tutorial on C++ pointers with examples'
+        },
+        {
+            'title': 'C++ Pointers Explained',
+            'url': 'https://www.youtube.com/watch?v=DTxHyVn0ODg',
+            'type': 'video',
+            'source': 'freeCodeCamp',
+            'description': 'Visual explanation of pointers in C++'
+        }
+    ],
+    'class': [
+        {
+            'title': 'C++ Classes and Objects',
+            'url': 'https://www.w3schools.com/cpp/cpp_classes.asp',
+            'type': 'tutorial',
+            'source': 'W3Schools',
+            'description': 'Interactive tutorial on classes and objects'
+        },
+        {
+            'title': 'C++ OOP Tutorial',
+            'url': 'https://www.youtube.com/watch?v=wN0x9eZLix4',
+            'type': 'video',
+            'source': 'freeCodeCamp',
+            'description': 'Complete OOP tutorial for beginners'
+        }
+    ],
+    'inheritance': [
+        {
+            'title': 'Inheritance in C++',
+            'url': 'https://www.learncpp.com/cpp-tutorial/basic-inheritance-in-c/',
+            'type': 'tutorial',
+            'source': 'LearnCpp',
+            'description': 'Detailed guide to inheritance concepts'
+        }
+    ],
+    'template': [
+        {
+            'title': 'C++ Templates',
+            'url': 'https://www.geeksforgeeks.org/templates-cpp/',
+            'type': 'tutorial',
+            'source': 'GeeksforGeeks',
+            'description': 'Comprehensive template tutorial with examples'
+        }
+    ],
+    'vector': [
+        {
+            'title': 'C++ Vector Tutorial',
+            'url': 'https://www.cplusplus.com/reference/vector/vector/',
+            'type': 'documentation',
+            'source': 'cplusplus.com',
+            'description': 'Official vector documentation with examples'
+        }
+    ]
+}
+
+# Served when nothing in the catalog matches the topic
+GENERAL_CPP_RESOURCES = [
+    {
+        'title': 'C++ Tutorial for Beginners',
+        'url': 'https://www.learncpp.com/',
+        'type': 'tutorial',
+        'source': 'LearnCpp',
+        'description': 'Complete C++ tutorial from basics to advanced'
+    },
+    {
+        'title': 'C++ Programming Course',
+        'url': 'https://www.youtube.com/watch?v=vLnPwxZdW4Y',
+        'type': 'video',
+        'source': 'freeCodeCamp',
+        'description': 'Full C++ programming course for beginners'
+    },
+    {
+        'title': 'C++ Reference',
+        'url': 'https://en.cppreference.com/w/',
+        'type': 'documentation',
+        'source': 'cppreference',
+        'description': 'Comprehensive C++ language reference'
+    }
+]
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9+#]+')
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'c', 'c++', 'cpp', 'does', 'for', 'from',
+    'how', 'in', 'is', 'it', 'of', 'on', 'or', 'the', 'this', 'to', 'what', 'when', 'which',
+    'with', 'you', 'your', 'introduction', 'basic', 'basics', 'tutorial', 'guide', 'learn',
+}
+
+
+def tokenize(text):
+    """Lower-case word tokens with stop words and trailing plural 's' removed"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        if token in STOP_WORDS or len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class ResourceIndex:
+    """Inverted TF-IDF index over learning resources, ranked with a sparse dot product"""
+    TITLE_WEIGHT = 2
+
+    def __init__(self, resources):
+        self.resources = []
+        self.difficulties = []
+        self.postings = defaultdict(list)  # term -> [(resource index, weight)]
+
+        seen_urls = set()
+        documents = []
+        for resource in resources:
+            if resource['url'] in seen_urls:
+                continue
+            seen_urls.add(resource['url'])
+
+            terms = Counter(tokenize(resource.get('keywords', '')))
+            for term in tokenize(resource['title']):
+                terms[term] += self.TITLE_WEIGHT
+            terms.update(tokenize(resource.get('description', '')))
+
+            self.resources.append({
+                'title': resource['title'],
+                'url': resource['url'],
+                'type': resource['type'],
+                'source': resource['source'],
+                'description': resource.get('description', ''),
+            })
+            self.difficulties.append(resource.get('difficulty'))
+            documents.append(terms)
+
+        document_count = len(documents)
+        document_frequency = Counter(term for terms in documents for term in terms)
+        for doc_index, terms in enumerate(documents):
+            weights = {
+                term: (1 + math.log(count)) * (math.log((1 + document_count) / (1 + document_frequency[term])) + 1)
+                for term, count in terms.items()
+            }
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings[term].append((doc_index, weight / norm))
+
+    def __len__(self):
+        return len(self.resources)
+
+    def search(self, text, limit=4, difficulty=None):
+        """Return the best matching resources for free text such as a topic title and missed questions"""
+        query_terms = Counter(tokenize(text))
+        scores = defaultdict(float)
+        for term, count in query_terms.items():
+            for doc_index, weight in self.postings.get(term, ()):
+                scores[doc_index] += weight * count
+
+        if difficulty:
+            for doc_index in scores:
+                if self.difficulties[doc_index] == difficulty:
+                    scores[doc_index] *= 1.2
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [dict(self.resources[doc_index]) for doc_index, _ in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _catalog_resources():
+    from content.models import CppLearningResource
+
+    resources = []
+    for resource in CppLearningResource.objects.all():
+        resources.append({
+            'title': resource.title,
+            'url': resource.url,
+            'type': resource.resource_type,
+            'source': resource.source,
+            'description': resource.description,
+            'difficulty': resource.difficulty,
+            'keywords': resource.get_topic_category_display(),
+        })
+    for keyword, resource_list in CURATED_CPP_RESOURCES.items():
+        for resource in resource_list:
+            resources.append(dict(resource, keywords=keyword))
+    return resources
+
+
+def get_resource_index():
+    """Build the index on first use and reuse it until the catalog changes"""
+    global _index
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ResourceIndex(_catalog_resources())
+            index = _index
+    return index
+
+
+def invalidate_resource_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from content.models import GeneratedChapter, GeneratedCourse, GeneratedQuestion, GeneratedQuiz, GeneratedTopic, CppLearningResource, Lesson, Module
+from content.caching import bump_item_pool_version
+from content.resource_index import invalidate_resource_index
+from content.navigation import invalidate_course, invalidate_generated_course
+
+@receiver([post_save, post_delete], sender=CppLearningResource)
+def rebuild_resource_index(sender, instance, **kwargs):
+    """Catalog changed; the remedial resource index is rebuilt on next use"""
+    invalidate_resource_index()
+
+@receiver([post_save, post_delete], sender=GeneratedTopic)
+def invalidate_topic_navigation(sender, instance, **kwargs):
+    """Topic order changed; the sequence is rebuilt on the next lookup"""
+    course_id = GeneratedChapter.objects.filter(id=instance.chapter_id).values_list('course_id', flat=True).first()
+    if course_id:
+        invalidate_generated_course(course_id)
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_lesson_navigation(sender, instance, **kwargs):
+    course_id = Module.objects.filter(id=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id:
+        invalidate_course(course_id)
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_module_navigation(sender, instance, **kwargs):
+    invalidate_course(instance.course_id)
+
+@receiver(post_delete, sender=GeneratedCourse)
+def drop_course_navigation(sender, instance, **kwargs):
+    invalidate_generated_course(instance.id)
+
+@receiver([post_save, post_delete], sender=GeneratedQuestion)
+def invalidate_item_pools(sender, instance, **kwargs):
+    """The skill's question pool changed; only its adaptive quizzes rebuild the pool, once committed"""
+    # The quiz may already be gone when a whole topic is cascade-deleted, and its pool with it
+    skill = GeneratedQuiz.objects.filter(id=instance.quiz_id).values_list(
+        'topic__original_topic_id', 'topic_id'
+    ).first()
+    if skill:
+        transaction.on_commit(lambda: bump_item_pool_version(skill[0] or skill[1]))
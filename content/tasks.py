@@ -0,0 +1,91 @@
+# content/tasks.py
+import contextvars
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ai_ledger import ai_ledger
+from .models import GeneratedTopic, ReinforcementJob
+
+logger = logging.getLogger(__name__)
+
+# A running job that has not finished in this time is assumed dead and may be claimed again
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run func on a daemon thread with its own database connection"""
+    # Keep the caller's AI ledger attribution (endpoint and student)
+    context = contextvars.copy_context()
+
+    def runner():
+        close_old_connections()
+        try:
+            context.run(func, *args, **kwargs)
+        except Exception:
+            logger.exception(f"Background task {func.__name__} failed")
+        finally:
+            ai_ledger.flush()
+            connection.close()
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    return thread
+
+
+def request_reinforcement_topic(course, student, background=True):
+    """
+    Make sure a reinforcement lesson is being built for this student and course.
+    Safe to call on every page load: the (course, student) job row acts as a lock,
+    so only the request that creates or reclaims it starts a generation.
+    """
+    job, created = ReinforcementJob.objects.get_or_create(course=course, student=student)
+
+    should_start = created and job.status == 'pending'
+    # A failed job, a running one that died, or a ready one whose topic was deleted (topic is SET_NULL)
+    if not created and (job.status in ('failed', 'running') or (job.status == 'ready' and job.topic_id is None)):
+        reclaimable = ReinforcementJob.objects.filter(pk=job.pk).filter(
+            Q(status='failed')
+            | Q(status='running', updated_at__lt=timezone.now() - STALE_JOB_TIMEOUT)
+            | Q(status='ready', topic__isnull=True)
+        )
+        # Only one concurrent caller wins the conditional update
+        should_start = reclaimable.update(status='pending', updated_at=timezone.now()) == 1
+        if should_start:
+            job.status = 'pending'
+
+    if should_start:
+        if background:
+            transaction.on_commit(lambda: run_in_background(build_reinforcement_topic, job.pk))
+        else:
+            build_reinforcement_topic(job.pk)
+            job.refresh_from_db()
+    return job
+
+
+def build_reinforcement_topic(job_id):
+    """Generate the reinforcement lesson for a pending job and record the outcome"""
+    claimed = ReinforcementJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', updated_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    # Imported here because views imports this module
+    from .views import create_reinforcement_topic
+
+    job = ReinforcementJob.objects.select_related('course', 'student').get(pk=job_id)
+    topic = GeneratedTopic.objects.filter(chapter__course=job.course, is_reinforcement=True).first()
+    if not topic:
+        topic = create_reinforcement_topic(job.course, job.student)
+
+    ReinforcementJob.objects.filter(pk=job_id).update(
+        status='ready' if topic else 'failed',
+        topic=topic,
+        updated_at=timezone.now()
+    )
+    return topic
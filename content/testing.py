@@ -0,0 +1,86 @@
+# content/testing.py
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from users.models import Student
+from .resource_index import invalidate_resource_index
+from .models import GeneratedCourse, GeneratedChapter, GeneratedTopic, GeneratedQuiz, GeneratedQuestion, GeneratedAnswer
+
+
+def make_student(student_id='12345678', **fields):
+    fields.setdefault('email', f'{student_id}@example.com')
+    fields.setdefault('first_name', 'Test')
+    fields.setdefault('last_name', 'Student')
+    return Student.objects.create_user(student_id=student_id, password='password', **fields)
+
+
+def add_quiz(topic, questions=4):
+    """A quiz of `questions` questions on the topic whose correct answer is always B"""
+    quiz = GeneratedQuiz.objects.create(topic=topic)
+    created = GeneratedQuestion.objects.bulk_create([
+        GeneratedQuestion(quiz=quiz, question_text=f'Question {q + 1}', order=q) for q in range(questions)
+    ])
+    GeneratedAnswer.objects.bulk_create([
+        GeneratedAnswer(question=question, answer_text=f'Answer {key}', option_key=key, is_correct=(key == 'B'), order=a)
+        for question in created for a, key in enumerate('ABCD')
+    ])
+    return quiz
+
+
+def make_course(user, title='C++ Basics', topics=3, questions=4):
+    """A generated course with one chapter of topics, each with a quiz unless questions is 0"""
+    course = GeneratedCourse.objects.create(user=user, title=title, description='Test course', level='beginner')
+    chapter = GeneratedChapter.objects.create(course=course, title='Main Lessons', order=1)
+    created = []
+    for i in range(topics):
+        topic = GeneratedTopic.objects.create(chapter=chapter, title=f'Topic {i + 1}', content='Content', order=i + 1)
+        if questions:
+            add_quiz(topic, questions)
+        created.append(topic)
+    return course, created
+
+
+class AppTestCase(TestCase):
+    """Starts every test with empty process-wide caches"""
+
+    def setUp(self):
+        from engine.batch_recommendations import invalidate_lesson_catalog
+        from engine.profile_cache import profile_cache
+
+        cache.clear()
+        profile_cache.clear()
+        invalidate_lesson_catalog()
+        invalidate_resource_index()
+
+    def override(self, **settings):
+        """Override settings until the end of the test"""
+        override = self.settings(**settings)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def patch(self, target, attribute, **kwargs):
+        """mock.patch.object until the end of the test"""
+        patcher = mock.patch.object(target, attribute, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def use_temporary_index(self):
+        """Keep the similarity index in a directory of its own, starting with none loaded"""
+        from engine import similarity_index
+
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.override(ENGINE_INDEX_DIR=index_dir.name)
+        self.patch(similarity_index, '_index', new=None)
+
+
+class StudentTestCase(AppTestCase):
+    """A logged-in student, self.student"""
+
+    def setUp(self):
+        super().setUp()
+        self.student = make_student()
+        self.client.force_login(self.student)
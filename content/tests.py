@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from google.api_core.exceptions import ServiceUnavailable
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import ai_ledger as ai_ledger_module
+from . import gemini_client as gemini_client_module
+from . import course_generation, tasks, views
+from . import feedback as feedback_module
+from .adaptive_quiz import ItemPool, assess
+from .ai_ledger import AILedger, AIUsageContextMiddleware, ai_call_context, current_call_context
+from .attempts import (
+    SUBMISSION_RESULT_GRACE, DuplicateSubmission, decode_answers, encode_answers, record_attempt,
+    store_submission_result,
+)
+from .caching import fragment_version, get_item_pool_version
+from .feedback import build_quiz_feedback, feedback_payload, latency_budget
+from .gemini_client import (
+    FairShareScheduler, QuotaExceededError, SchedulerBusyError, PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_STANDARD,
+)
+from .lesson_schema import LessonSchemaError, extract_json, validate_lesson
+from .models import (
+    AICallLog, CppLearningResource, GeneratedCourse, GeneratedTopic, GeneratedQuiz, GeneratedQuestion,
+    GeneratedTopicCompletion, NavigationEntry, QuizAttempt, QuizFeedback, ReinforcementJob,
+)
+from .navigation import generated_course_key, topic_neighbours
+from .pregeneration import load_pregenerated_simplified_topic, pregenerate_simplified_topics
+from .prompts import CHARS_PER_TOKEN, TRUNCATED, PromptTemplate
+from .resource_index import GENERAL_CPP_RESOURCES, ResourceIndex
+from .testing import AppTestCase, StudentTestCase, add_quiz, make_course, make_student
+
+
+def lesson_data(title='Pointers', questions=4):
+    """An AI lesson as models tend to return it: five unkeyed answers per question, the third correct"""
+    return {
+        'title': title,
+        'content': 'Lesson content',
+        'quiz': {'questions': [
+            {
+                'question_text': f'Question {q + 1}',
+                'answers': [{'answer_text': f'Answer {a + 1}', 'option_key': 'x', 'is_correct': a == 2} for a in range(5)],
+            }
+            for q in range(questions)
+        ]},
+    }
+
+
+class DashboardApiTests(StudentTestCase):
+    def test_cursor_pages_through_every_course_once(self):
+        for i in range(7):
+            make_course(self.student, title=f'Course {i}', topics=2)
+
+        page = self.client.get('/api/dashboard/?limit=3').json()
+        self.assertTrue(page['success'])
+        seen = [course['title'] for course in page['courses']]
+        self.assertEqual(seen, ['Course 6', 'Course 5', 'Course 4'])
+        while page['has_more']:
+            page = self.client.get(f"/api/dashboard/?limit=3&cursor={page['next_cursor']}").json()
+            seen += [course['title'] for course in page['courses']]
+
+        self.assertEqual(seen, [f'Course {i}' for i in range(6, -1, -1)])
+
+    def test_reports_progress(self):
+        course, topics = make_course(self.student, topics=2)
+        GeneratedTopicCompletion.objects.create(student=self.student, topic=topics[0], score=100, passed=True)
+
+        page = self.client.get('/api/dashboard/').json()
+
+        self.assertEqual(page['courses'][0]['progress_percentage'], 50)
+
+    def test_course_cards_show_lessons_added_elsewhere(self):
+        course, topics = make_course(self.student, topics=1)
+        self.assertContains(self.client.get(reverse('dashboard')), '1 Lessons')
+
+        GeneratedTopic.objects.bulk_create([GeneratedTopic(chapter=topics[0].chapter, title='Extra', content='Content', order=2)])
+
+        self.assertContains(self.client.get(reverse('dashboard')), '2 Lessons')
+
+    def test_rejects_malformed_cursor(self):
+        response = self.client.get('/api/dashboard/?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class LearningViewTests(StudentTestCase):
+    def queries_for_course(self, topic_count):
+        course, topics = make_course(self.student, title=f'{topic_count} topics', topics=topic_count)
+        for topic in topics:
+            GeneratedTopicCompletion.objects.create(student=self.student, topic=topic, score=100, passed=True)
+        url = f'/learning/?generated_course_id={course.id}&topic_id={topics[-1].id}'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_topics(self):
+        self.assertEqual(self.queries_for_course(3), self.queries_for_course(9))
+
+    def test_cached_sidebar_shows_changes_made_elsewhere(self):
+        course, topics = make_course(self.student, topics=2)
+        url = f'/learning/?generated_course_id={course.id}&topic_id={topics[0].id}'
+        self.assertNotContains(self.client.get(url), f'topic_id={topics[1].id}"')
+
+        # Written by another process: no signal reaches this one
+        GeneratedTopicCompletion.objects.bulk_create([
+            GeneratedTopicCompletion(student=self.student, topic=topics[0], score=100, passed=True)
+        ])
+
+        response = self.client.get(url)
+        self.assertContains(response, f'topic_id={topics[1].id}"')
+        self.assertContains(response, 'module-status completed', count=1)
+
+    def test_lessons_of_a_course_share_the_cached_sidebar(self):
+        course, topics = make_course(self.student, topics=2)
+        GeneratedTopicCompletion.objects.create(student=self.student, topic=topics[0], score=100, passed=True)
+        version = fragment_version([(t.id, t.title) for t in topics], [t.id for t in topics], [topics[0].id])
+        cache.set(make_template_fragment_key('learning_sidebar', [course.id, version]), '<li>Cached sidebar</li>')
+
+        response = self.client.get(f'/learning/?generated_course_id={course.id}&topic_id={topics[1].id}')
+
+        self.assertContains(response, '<li>Cached sidebar</li>')
+        self.assertContains(response, f'.module-item[data-topic-id="{topics[1].id}"]')
+
+
+class CourseTitleTests(StudentTestCase):
+    def test_next_available_title(self):
+        self.assertEqual(GeneratedCourse.next_available_title(self.student, 'Pointers'), 'Pointers')
+
+        for title in ('Pointers', 'Pointers (1)', 'Pointers (3)', 'Pointers and References'):
+            GeneratedCourse.objects.create(user=self.student, title=title, description='Test course')
+
+        self.assertEqual(GeneratedCourse.next_available_title(self.student, 'Pointers'), 'Pointers (2)')
+
+    def test_titles_are_per_user(self):
+        other = make_student('87654321')
+        GeneratedCourse.objects.create(user=other, title='Pointers', description='Test course')
+
+        self.assertEqual(GeneratedCourse.next_available_title(self.student, 'Pointers'), 'Pointers')
+
+    def test_check_course_name_suggests_free_title(self):
+        GeneratedCourse.objects.create(user=self.student, title='Pointers', description='Test course')
+
+        response = self.client.get('/api/check-course-name/?name=Pointers').json()
+
+        self.assertEqual(response, {'success': True, 'exists': True, 'suggested_name': 'Pointers (1)'})
+
+
+class GeminiClientTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch(gemini_client_module, 'ai_ledger')
+
+    def test_slot_is_released_during_backoff(self):
+        client = gemini_client_module.GeminiClient()
+        model = mock.Mock()
+        model.generate_content.side_effect = [ServiceUnavailable('unavailable'), mock.Mock(text='ok', usage_metadata=None)]
+        active_while_sleeping = []
+
+        with mock.patch.object(gemini_client_module.genai, 'GenerativeModel', return_value=model), \
+                mock.patch.object(gemini_client_module.time, 'sleep',
+                                  side_effect=lambda seconds: active_while_sleeping.append(client.scheduler.active)):
+            self.assertEqual(client.generate('test-model', 'prompt', max_retries=2), 'ok')
+
+        self.assertEqual(active_while_sleeping, [0])
+        self.assertEqual(client.scheduler.active, 0)
+
+    def test_retries_charge_the_student_once(self):
+        client = gemini_client_module.GeminiClient()
+        model = mock.Mock()
+        model.generate_content.side_effect = ServiceUnavailable('unavailable')
+
+        with mock.patch.object(gemini_client_module.genai, 'GenerativeModel', return_value=model), \
+                mock.patch.object(gemini_client_module.time, 'sleep'), \
+                ai_call_context('test', student_id='student'):
+            quota = client.scheduler.remaining_quota('student')
+            with self.assertRaises(ServiceUnavailable):
+                client.generate('test-model', 'prompt', max_retries=3)
+
+        self.assertEqual(model.generate_content.call_count, 3)
+        self.assertEqual(client.scheduler.remaining_quota('student'), quota - 1)
+
+    def test_local_refusals_do_not_use_quota(self):
+        client = gemini_client_module.GeminiClient()
+        model = mock.Mock()
+        model.generate_content.side_effect = ServiceUnavailable('unavailable')
+
+        with mock.patch.object(gemini_client_module.genai, 'GenerativeModel', return_value=model), \
+                ai_call_context('test', student_id='student'):
+            for _ in range(3):
+                with self.assertRaises(ServiceUnavailable):
+                    client.generate('test-model', 'prompt')
+            quota = client.scheduler.remaining_quota('student')
+            for _ in range(5):
+                with self.assertRaises(gemini_client_module.CircuitOpenError):
+                    client.generate('test-model', 'prompt')
+
+            self.assertEqual(client.scheduler.remaining_quota('student'), quota)
+
+            client.scheduler.wait_timeouts[gemini_client_module.PRIORITY_BULK] = 0
+            client.scheduler.active = client.scheduler.max_concurrent
+            with self.assertRaises(gemini_client_module.SchedulerBusyError):
+                client.generate('other-model', 'prompt', priority=gemini_client_module.PRIORITY_BULK)
+            client.scheduler.active = 0
+
+        self.assertEqual(client.scheduler.remaining_quota('student'), quota)
+
+    def test_blocked_replies_do_not_open_the_circuit(self):
+        client = gemini_client_module.GeminiClient()
+        response = mock.Mock(usage_metadata=None)
+        type(response).text = mock.PropertyMock(side_effect=ValueError('response was blocked'))
+        model = mock.Mock()
+        model.generate_content.return_value = response
+
+        with mock.patch.object(gemini_client_module.genai, 'GenerativeModel', return_value=model):
+            for _ in range(5):
+                with self.assertRaises(ValueError):
+                    client.generate('test-model', 'prompt')
+
+        self.assertTrue(client.is_available('test-model'))
+        self.assertEqual(model.generate_content.call_count, 5)
+
+
+class FairShareSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = FairShareScheduler(max_concurrent=3, reserved_interactive=1, student_requests_per_minute=2)
+
+    def test_reserved_slots_are_for_interactive_calls(self):
+        self.scheduler.active = 2
+
+        self.assertFalse(self.scheduler._can_start(PRIORITY_BULK))
+        self.assertFalse(self.scheduler._can_start(PRIORITY_STANDARD))
+        self.assertTrue(self.scheduler._can_start(PRIORITY_INTERACTIVE))
+        self.scheduler.active = 3
+        self.assertFalse(self.scheduler._can_start(PRIORITY_INTERACTIVE))
+
+    def test_waiting_higher_priority_goes_first(self):
+        self.scheduler.waiting[PRIORITY_INTERACTIVE] = 1
+
+        self.assertTrue(self.scheduler._can_start(PRIORITY_INTERACTIVE))
+        self.assertFalse(self.scheduler._can_start(PRIORITY_STANDARD))
+        self.assertFalse(self.scheduler._can_start(PRIORITY_BULK))
+
+        self.scheduler.waiting[PRIORITY_INTERACTIVE] = 0
+        self.scheduler.waiting[PRIORITY_STANDARD] = 1
+        self.assertTrue(self.scheduler._can_start(PRIORITY_INTERACTIVE))
+        self.assertFalse(self.scheduler._can_start(PRIORITY_BULK))
+
+    def test_quota_is_per_student(self):
+        self.scheduler.charge('first')
+        self.scheduler.charge('first')
+
+        with self.assertRaises(QuotaExceededError):
+            self.scheduler.charge('first')
+        self.scheduler.charge('second')
+        self.scheduler.charge(None)
+        self.assertEqual(self.scheduler.rejected_quota, 1)
+
+    def test_busy_refusal_gives_the_charge_back(self):
+        self.scheduler.wait_timeouts[PRIORITY_BULK] = 0
+        self.scheduler.active = 2
+
+        with self.assertRaises(SchedulerBusyError):
+            with self.scheduler.slot('first', PRIORITY_BULK):
+                pass
+
+        self.assertEqual(self.scheduler.remaining_quota('first'), 2)
+        self.assertEqual(self.scheduler.rejected_busy, 1)
+
+    def test_slot_is_released_after_the_call(self):
+        with self.scheduler.slot('first', PRIORITY_BULK):
+            self.assertEqual(self.scheduler.active, 1)
+
+        self.assertEqual(self.scheduler.active, 0)
+        self.assertEqual(self.scheduler.admitted[PRIORITY_BULK], 1)
+
+
+class SimplifiedTopicFallbackTests(StudentTestCase):
+    def test_refused_call_reuses_another_students_lesson(self):
+        other = make_student('87654321')
+        course, topics = make_course(other, title='Pointers', topics=1)
+        shared = GeneratedTopic.objects.create(
+            chapter=topics[0].chapter, title='Simplified: Topic 1', content='Simpler content', order=2,
+            is_regenerated=True, original_topic=topics[0]
+        )
+        add_quiz(shared)
+        course, topics = make_course(self.student, title='Pointers', topics=1)
+        generate = self.patch(gemini_client_module.gemini_client, 'generate',
+                              side_effect=QuotaExceededError('quota used up'))
+        self.patch(views, 'ai_ledger')
+
+        simplified = views.regenerate_simpler_topic(topics[0], self.student, 20, [])
+
+        generate.assert_called_once()
+        self.assertEqual(simplified.original_topic, topics[0])
+        self.assertEqual((simplified.content, simplified.quiz.questions.count()), ('Simpler content', 4))
+
+    def test_refused_call_without_a_shared_lesson_gives_up(self):
+        course, topics = make_course(self.student, topics=1)
+        self.patch(gemini_client_module.gemini_client, 'generate', side_effect=QuotaExceededError('quota used up'))
+
+        self.assertIsNone(views.regenerate_simpler_topic(topics[0], self.student, 20, []))
+
+
+class PregeneratedSimplifiedTopicTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course, self.topics = make_course(self.student, topics=2)
+        self.generate = self.patch(gemini_client_module.GeminiClient, 'generate',
+                                   side_effect=AssertionError('the AI was called'))
+        self.ledger = self.patch(views, 'ai_ledger')
+
+    def store(self, topic, lesson):
+        GeneratedTopic.objects.filter(pk=topic.pk).update(alternative_content=lesson)
+        topic.refresh_from_db()
+
+    def test_stored_lesson_is_loaded_and_validated(self):
+        self.assertIsNone(load_pregenerated_simplified_topic(self.topics[0]))
+        self.store(self.topics[0], '{"title": "Simplified: Topic 1", "content": "No quiz"}')
+        self.assertIsNone(load_pregenerated_simplified_topic(self.topics[0]))
+
+        self.store(self.topics[0], json.dumps(lesson_data('Simplified: Topic 1')))
+
+        lesson = load_pregenerated_simplified_topic(self.topics[0])
+        self.assertEqual((lesson['title'], len(lesson['quiz']['questions'])), ('Simplified: Topic 1', 4))
+
+    def test_batch_is_stored_on_every_topic_with_the_title(self):
+        other_course, other_topics = make_course(make_student('87654321'), topics=1)
+        self.generate.side_effect = None
+        self.generate.return_value = json.dumps({'lessons': [
+            dict(lesson_data('Simplified: Topic 1'), original_title='Topic 1'),
+            dict(lesson_data('Simplified: Unknown'), original_title='Unknown'),
+        ]})
+
+        self.assertEqual(pregenerate_simplified_topics(['Topic 1']), 2)
+
+        self.generate.assert_called_once()
+        self.assertEqual(load_pregenerated_simplified_topic(GeneratedTopic.objects.get(pk=other_topics[0].pk))['title'],
+                         'Simplified: Topic 1')
+        self.assertIsNone(GeneratedTopic.objects.get(pk=self.topics[1].pk).alternative_content)
+
+    def test_regeneration_serves_the_stored_lesson_without_the_ai(self):
+        self.store(self.topics[0], json.dumps(lesson_data('Simplified: Topic 1')))
+
+        simplified = views.regenerate_simpler_topic(self.topics[0], self.student, 10, [])
+
+        self.generate.assert_not_called()
+        self.ledger.record.assert_called_once_with('gemini-2.5-flash', cache_hit=True)
+        self.assertEqual((simplified.original_topic, simplified.is_regenerated, simplified.order),
+                         (self.topics[0], True, 0))
+        self.assertEqual(simplified.chapter.title, 'Reinforcement: Main Lessons')
+        questions = simplified.quiz.questions.order_by('order')
+        self.assertEqual(questions.count(), 4)
+        self.assertEqual([q.answers.get(is_correct=True).option_key for q in questions], ['C'] * 4)
+
+    def test_failed_quiz_is_given_the_stored_lesson(self):
+        self.store(self.topics[0], json.dumps(lesson_data('Simplified: Topic 1')))
+        self.patch(views, 'get_cpp_remedial_resources', return_value=[])
+        self.patch(feedback_module, 'run_in_background')
+        questions = self.topics[0].quiz.questions.all()
+
+        response = self.client.post('/api/complete-generated-topic/', json.dumps({
+            'topic_id': self.topics[0].id, 'answers': {str(question.id): 'A' for question in questions},
+        }), content_type='application/json').json()
+
+        self.assertFalse(response['passed'])
+        simplified = GeneratedTopic.objects.get(pk=response['regenerated_topic_id'])
+        self.assertEqual((simplified.title, simplified.original_topic_id), ('Simplified: Topic 1', self.topics[0].id))
+        self.generate.assert_not_called()
+
+
+class NavigationTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course, self.topics = make_course(self.student, topics=3, questions=0)
+        self.first, self.second, self.third = (topic.id for topic in self.topics)
+
+    def sequence(self):
+        return list(NavigationEntry.objects.filter(sequence_key=generated_course_key(self.course.id)).values_list(
+            'item_id', 'prev_id', 'next_id'
+        ))
+
+    def test_first_lookup_builds_the_whole_sequence(self):
+        self.assertEqual(topic_neighbours(self.course.id, self.second), (self.first, self.third))
+
+        self.assertEqual(self.sequence(), [
+            (self.first, None, self.second), (self.second, self.first, self.third), (self.third, self.second, None)
+        ])
+        with self.assertNumQueries(1):
+            self.assertEqual(topic_neighbours(self.course.id, self.first), (None, self.second))
+
+    def test_adding_a_topic_invalidates_the_sequence(self):
+        topic_neighbours(self.course.id, self.first)
+
+        added = GeneratedTopic.objects.create(chapter=self.topics[0].chapter, title='Topic 4', content='Content', order=4)
+
+        self.assertEqual(self.sequence(), [])
+        self.assertEqual(topic_neighbours(self.course.id, self.third), (self.second, added.id))
+        self.assertEqual(topic_neighbours(self.course.id, added.id), (self.third, None))
+
+    def test_simplified_topics_come_first(self):
+        topic_neighbours(self.course.id, self.first)
+
+        simplified = views.materialize_simplified_topic(self.topics[1], validate_lesson(lesson_data('Simplified: Topic 2')))
+
+        self.assertEqual(simplified.order, 0)
+        self.assertEqual(topic_neighbours(self.course.id, simplified.id), (None, self.first))
+        self.assertEqual(topic_neighbours(self.course.id, self.first), (simplified.id, self.second))
+
+    def test_topics_outside_the_course_have_no_neighbours(self):
+        other, topics = make_course(self.student, title='Other', topics=1, questions=0)
+
+        self.assertEqual(topic_neighbours(self.course.id, topics[0].id), (None, None))
+
+
+def resource(title, description, difficulty=None):
+    return {'title': title, 'url': f'https://example.com/{title}', 'type': 'article',
+            'source': 'Example', 'description': description, 'difficulty': difficulty}
+
+
+class ResourceIndexTests(AppTestCase):
+    def test_search_ranks_by_relevance(self):
+        index = ResourceIndex([
+            resource('Smart pointers', 'unique_ptr and shared_ptr ownership'),
+            resource('Pointer arithmetic', 'Walking arrays with pointers and addresses'),
+            resource('Classes and objects', 'Constructors and member functions'),
+        ])
+
+        self.assertEqual([r['title'] for r in index.search('pointer arithmetic on arrays')],
+                         ['Pointer arithmetic', 'Smart pointers'])
+        self.assertEqual(index.search('templates'), [])
+
+    def test_duplicate_urls_are_indexed_once(self):
+        first = resource('Pointers', 'Addresses')
+        index = ResourceIndex([first, dict(first, title='Pointers again')])
+
+        self.assertEqual([r['title'] for r in index.search('pointers')], ['Pointers'])
+
+    def test_difficulty_breaks_ties(self):
+        index = ResourceIndex([
+            resource('Loops one', 'for and while loops', 'advanced'),
+            resource('Loops two', 'for and while loops', 'beginner'),
+        ])
+
+        self.assertEqual(index.search('loops', limit=1, difficulty='beginner')[0]['title'], 'Loops two')
+        self.assertEqual(index.search('loops', limit=1, difficulty='advanced')[0]['title'], 'Loops one')
+
+    def test_remedial_resources_come_from_the_catalog(self):
+        CppLearningResource.objects.create(
+            title='Recursion step by step', url='https://example.com/recursion', resource_type='article',
+            topic_category='advanced', difficulty='beginner', description='Base cases and the call stack',
+            source='Example',
+        )
+        generate = self.patch(views.gemini_client, 'generate')
+
+        resources = views.get_cpp_remedial_resources('Recursion', 20, [{'question': 'What is a base case?'}])
+
+        generate.assert_not_called()
+        self.assertEqual(resources[0]['url'], 'https://example.com/recursion')
+
+    def test_remedial_resources_fall_back_to_general_ones(self):
+        generate = self.patch(views.gemini_client, 'generate')
+
+        self.assertEqual(views.get_cpp_remedial_resources('Lambdas', 80), GENERAL_CPP_RESOURCES)
+        generate.assert_not_called()
+
+class ReinforcementJobTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course, topics = make_course(self.student, topics=1, questions=0)
+        self.chapter = topics[0].chapter
+        self.create = self.patch(views, 'create_reinforcement_topic', side_effect=self.reinforcement_topic)
+
+    def reinforcement_topic(self, course, student):
+        return GeneratedTopic.objects.create(chapter=self.chapter, title='Course Reinforcement', content='Review',
+                                             order=9, is_reinforcement=True)
+
+    def test_repeated_requests_start_one_build(self):
+        background = self.patch(tasks, 'run_in_background')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = tasks.request_reinforcement_topic(self.course, self.student)
+            second = tasks.request_reinforcement_topic(self.course, self.student)
+
+        background.assert_called_once_with(tasks.build_reinforcement_topic, first.pk)
+        self.assertEqual((first.pk, second.status), (second.pk, 'pending'))
+        tasks.build_reinforcement_topic(first.pk)
+        self.assertIsNone(tasks.build_reinforcement_topic(first.pk))
+        self.create.assert_called_once()
+
+    def test_failed_build_is_reclaimed(self):
+        self.create.side_effect = None
+        self.create.return_value = None
+        job = tasks.request_reinforcement_topic(self.course, self.student, background=False)
+        self.assertEqual(job.status, 'failed')
+
+        self.create.side_effect = self.reinforcement_topic
+        job = tasks.request_reinforcement_topic(self.course, self.student, background=False)
+        self.assertEqual((job.status, job.topic.title), ('ready', 'Course Reinforcement'))
+
+    def test_ready_job_whose_topic_was_deleted_is_rebuilt(self):
+        job = tasks.request_reinforcement_topic(self.course, self.student, background=False)
+        job.topic.delete()
+
+        job = tasks.request_reinforcement_topic(self.course, self.student, background=False)
+
+        self.assertEqual(job.status, 'ready')
+        self.assertIsNotNone(job.topic_id)
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_running_job_is_left_alone_until_stale(self):
+        job = ReinforcementJob.objects.create(course=self.course, student=self.student, status='running')
+
+        self.assertEqual(tasks.request_reinforcement_topic(self.course, self.student, background=False).status, 'running')
+        ReinforcementJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - tasks.STALE_JOB_TIMEOUT * 2)
+        self.assertEqual(tasks.request_reinforcement_topic(self.course, self.student, background=False).status, 'ready')
+
+class AILedgerTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ledger = AILedger(batch_size=3, flush_interval=60)
+
+    def test_calls_are_written_on_flush(self):
+        with ai_call_context('generate_course', None):
+            for _ in range(5):
+                self.ledger.record('gemini-2.5-flash', prompt_tokens=10, output_tokens=5)
+
+        self.assertEqual((AICallLog.objects.count(), self.ledger.pending()), (0, 5))
+        self.assertEqual(self.ledger.flush(), 5)
+        self.assertEqual(set(AICallLog.objects.values_list('endpoint', flat=True)), {'generate_course'})
+        self.assertEqual((self.ledger.flush(), self.ledger.pending()), (0, 0))
+
+    def test_flush_is_due_at_batch_size_or_interval(self):
+        self.ledger.record('gemini-2.5-flash')
+        self.ledger.record('gemini-2.5-flash')
+        self.ledger.flush_if_due()
+        self.assertEqual(AICallLog.objects.count(), 0)
+
+        self.ledger.record('gemini-2.5-flash')
+        self.ledger.flush_if_due()
+        self.assertEqual(AICallLog.objects.count(), 3)
+
+        self.ledger.record('gemini-2.5-flash')
+        self.ledger._last_flush -= 60
+        self.ledger.flush_if_due()
+        self.assertEqual(AICallLog.objects.count(), 4)
+
+    def test_full_buffer_is_flushed_by_the_recording_call(self):
+        ledger = AILedger(batch_size=3, flush_interval=60, max_buffer=4)
+
+        for _ in range(4):
+            ledger.record('gemini-2.5-flash')
+
+        self.assertEqual((AICallLog.objects.count(), ledger.pending()), (4, 0))
+
+    def test_failed_write_is_retried(self):
+        self.ledger.record('gemini-2.5-flash')
+        self.ledger.record('gemini-2.5-flash')
+
+        with mock.patch.object(AICallLog.objects, 'bulk_create', side_effect=DatabaseError('locked')):
+            self.assertEqual(self.ledger.flush(), 0)
+        self.ledger.record('gemini-2.5-flash')
+
+        self.assertEqual(self.ledger.pending(), 3)
+        self.assertEqual(self.ledger.flush(), 3)
+        self.assertEqual(AICallLog.objects.count(), 3)
+
+    def test_middleware_attributes_calls_and_flushes_due_ones(self):
+        self.patch(ai_ledger_module, 'ai_ledger', new=self.ledger)
+        request = RequestFactory().get('/api/check-course-name/')
+        request.user = make_student()
+        request.resolver_match = resolve('/api/check-course-name/')
+
+        def view(request):
+            middleware.process_view(request, views.check_course_name, (), {})
+            self.ledger.record('gemini-2.5-flash')
+            return HttpResponse()
+
+        middleware = AIUsageContextMiddleware(view)
+        self.ledger.record('gemini-2.5-flash')
+        middleware(request)
+        self.assertEqual(AICallLog.objects.count(), 0)
+
+        self.ledger.record('gemini-2.5-flash')
+        middleware(request)
+        self.assertEqual(AICallLog.objects.filter(endpoint='check_course_name', student=request.user).count(), 2)
+        self.assertEqual(AICallLog.objects.filter(endpoint='unknown', student=None).count(), 2)
+        self.assertEqual(current_call_context(), ('unknown', None))
+
+
+class AILedgerThreadTests(TransactionTestCase):
+    def test_threads_record_and_flush_every_call_once(self):
+        ledger = AILedger(batch_size=5, flush_interval=60)
+
+        def work(student_id):
+            with ai_call_context('background', None):
+                for _ in range(20):
+                    ledger.record('gemini-2.5-flash', output_tokens=student_id)
+                    ledger.flush_if_due()
+                ledger.flush()
+            connection.close()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ledger.flush()
+
+        self.assertEqual(AICallLog.objects.count(), 80)
+        self.assertEqual(sum(AICallLog.objects.values_list('output_tokens', flat=True)), 20 * (0 + 1 + 2 + 3))
+
+class LessonSchemaTests(TestCase):
+    def test_validate_lesson_repairs_answers(self):
+        lesson = validate_lesson(lesson_data())
+
+        question = lesson['quiz']['questions'][0]
+        self.assertEqual([answer['option_key'] for answer in question['answers']], ['A', 'B', 'C', 'D'])
+        self.assertEqual([answer['is_correct'] for answer in question['answers']], [False, False, True, False])
+        self.assertEqual(question['correct_answer_key'], 'C')
+
+    def test_validate_lesson_keeps_correct_answer_when_trimming(self):
+        data = lesson_data()
+        for question in data['quiz']['questions']:
+            for a, answer in enumerate(question['answers']):
+                answer['is_correct'] = a == 4
+
+        question = validate_lesson(data)['quiz']['questions'][0]
+
+        self.assertEqual(question['answers'][3], {'answer_text': 'Answer 5', 'option_key': 'D', 'is_correct': True})
+
+    def test_validate_lesson_drops_bad_questions(self):
+        data = lesson_data(questions=6)
+        data['quiz']['questions'][0]['answers'] = data['quiz']['questions'][0]['answers'][:2]
+
+        lesson = validate_lesson(data)
+
+        self.assertEqual([q['question_text'] for q in lesson['quiz']['questions']],
+                         ['Question 2', 'Question 3', 'Question 4', 'Question 5'])
+
+    def test_validate_lesson_rejects_short_quiz(self):
+        with self.assertRaises(LessonSchemaError):
+            validate_lesson(lesson_data(questions=3))
+
+    def test_extract_json_tolerates_fences_and_trailing_commas(self):
+        self.assertEqual(extract_json('```json\n{"a": 1}\n```'), {'a': 1})
+        self.assertEqual(extract_json('Here it is: {"a": [1, 2,],} Thanks'), {'a': [1, 2]})
+
+
+class CourseGenerationTests(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gemini = gemini_client_module.GeminiClient()
+        self.patch(course_generation, 'gemini_client', new=self.gemini)
+
+    def test_concurrency_defaults_to_bulk_slots(self):
+        self.assertEqual(course_generation.course_concurrency(6), self.gemini.scheduler.slot_limit(gemini_client_module.PRIORITY_BULK))
+        self.assertEqual(course_generation.course_concurrency(1), 1)
+        with self.settings(COURSE_GENERATION_CONCURRENCY=2):
+            self.assertEqual(course_generation.course_concurrency(6), 2)
+
+    def test_rate_limit_room_covers_whole_course(self):
+        with self.settings(GEMINI_RATE_LIMITS={course_generation.COURSE_MODEL: 10}):
+            self.assertTrue(course_generation.has_rate_limit_room(6))
+            bucket = self.gemini._get_bucket(course_generation.COURSE_MODEL)
+            for _ in range(4):
+                bucket.try_acquire()
+
+            self.assertFalse(course_generation.has_rate_limit_room(6))
+            self.assertTrue(course_generation.has_rate_limit_room(5))
+
+
+class GenerateCourseViewTests(StudentTestCase):
+    def generate(self, lessons=('Pointers', 'Classes')):
+        return self.client.post('/api/generate-course/', json.dumps({
+            'name': 'C++ Basics', 'level': 'beginner', 'lessons': list(lessons),
+        }), content_type='application/json')
+
+    def test_short_quota_is_refused_before_anything_is_saved(self):
+        self.patch(views.gemini_client.scheduler, 'remaining_quota', return_value=2)
+        generate = self.patch(views, 'generate_course_lessons')
+
+        response = self.generate()
+
+        self.assertEqual(response.status_code, 429)
+        generate.assert_not_called()
+        self.assertFalse(GeneratedCourse.objects.exists())
+
+    def test_failed_generation_saves_no_course(self):
+        self.patch(views, 'has_rate_limit_room', return_value=True)
+        self.patch(views, 'generate_course_lessons', side_effect=QuotaExceededError('quota used up'))
+
+        self.assertEqual(self.generate().status_code, 503)
+        self.assertFalse(GeneratedCourse.objects.exists())
+
+    def test_course_is_saved_in_lesson_order(self):
+        make_course(self.student)
+        self.patch(views, 'has_rate_limit_room', return_value=True)
+        generate = self.patch(views, 'generate_course_lessons', return_value=[
+            validate_lesson(lesson_data('Pointers')), validate_lesson(lesson_data('Classes'))
+        ])
+
+        response = self.generate()
+
+        course = GeneratedCourse.objects.get(id=response.json()['course_id'])
+        self.assertEqual(generate.call_args.args[0], course.title)
+        self.assertEqual(course.title, 'C++ Basics (1)')
+        topics = GeneratedTopic.objects.filter(chapter__course=course).order_by('order')
+        self.assertEqual([topic.title for topic in topics], ['Pointers', 'Classes'])
+        self.assertEqual(response.json()['first_topic_id'], topics[0].id)
+        questions = topics[1].quiz.questions.order_by('order')
+        self.assertEqual([question.question_text for question in questions], [f'Question {q + 1}' for q in range(4)])
+        self.assertEqual([answer.is_correct for answer in questions[0].answers.order_by('order')],
+                         [False, False, True, False])
+
+class ItemPoolVersionTests(StudentTestCase):
+    def test_question_change_bumps_only_its_skill(self):
+        course, topics = make_course(self.student, topics=2)
+        changed, unchanged, pools = (get_item_pool_version(topics[0].id), get_item_pool_version(topics[1].id),
+                                     get_item_pool_version())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GeneratedQuestion.objects.create(quiz=topics[0].quiz, question_text='New question', order=9)
+
+        self.assertNotEqual(get_item_pool_version(topics[0].id), changed)
+        self.assertEqual(get_item_pool_version(topics[1].id), unchanged)
+        self.assertEqual(get_item_pool_version(), pools)
+
+    def test_simplified_topic_shares_its_original_skill(self):
+        course, topics = make_course(self.student, topics=1)
+        simplified = GeneratedTopic.objects.create(
+            chapter=topics[0].chapter, title='Simplified: Topic 1', content='Content', order=2,
+            is_regenerated=True, original_topic=topics[0]
+        )
+        quiz = GeneratedQuiz.objects.create(topic=simplified)
+        version = get_item_pool_version(topics[0].id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GeneratedQuestion.objects.create(quiz=quiz, question_text='New question', order=1)
+
+        self.assertNotEqual(get_item_pool_version(topics[0].id), version)
+
+
+class AdaptiveQuizTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        # Five items from easy to hard; the pass mark sits at the middle one
+        self.pool = ItemPool([10, 11, 12, 13, 14], [1.5] * 5, [-2, -1, 0, 1, 2], width=8)
+
+    def test_next_question_matches_ability(self):
+        self.assertEqual(self.pool.next_question(0.0, set()), 12)
+        self.assertEqual(self.pool.next_question(1.1, set()), 13)
+        self.assertIn(self.pool.next_question(0.0, {12}), (11, 13))
+
+    def test_assess_continues_below_minimum(self):
+        theta, se, decision, next_question_id = assess(self.pool, [(12, True), (13, True)])
+
+        self.assertIsNone(decision)
+        self.assertIsNotNone(next_question_id)
+
+    def test_assess_stops_when_confident(self):
+        self.assertEqual(assess(self.pool, [(12, True), (13, True), (14, True)])[2:], ('pass', None))
+        self.assertEqual(assess(self.pool, [(12, False), (11, False), (10, False)])[2:], ('fail', None))
+
+    def test_assess_stops_when_pool_runs_out(self):
+        responses = [(12, True), (11, False), (13, True), (10, False), (14, False)]
+
+        theta, se, decision, next_question_id = assess(self.pool, responses)
+
+        self.assertIn(decision, ('pass', 'fail'))
+        self.assertIsNone(next_question_id)
+
+    def test_quiz_records_completion(self):
+        course, topics = make_course(self.student, topics=2)
+        response = self.client.post(f'/api/adaptive-quiz/{topics[0].id}/start/').json()
+        self.assertTrue(response['success'], response)
+
+        while True:
+            response = self.client.post('/api/adaptive-quiz/answer/', json.dumps({
+                'topic_id': topics[0].id, 'question_id': response['question']['id'], 'answer': 'B',
+            }), content_type='application/json').json()
+            self.assertTrue(response['success'], response)
+            if response['finished']:
+                break
+
+        self.assertTrue(response['passed'])
+        self.assertEqual(response['next_topic_id'], topics[1].id)
+        self.assertTrue(GeneratedTopicCompletion.objects.get(student=self.student, topic=topics[0]).passed)
+
+    def answer(self, topic, question_id, answer='B'):
+        return self.client.post('/api/adaptive-quiz/answer/', json.dumps({
+            'topic_id': topic.id, 'question_id': question_id, 'answer': answer,
+        }), content_type='application/json').json()
+
+    def test_quiz_without_a_pool_is_graded_on_its_answers(self):
+        course, topics = make_course(self.student, topics=1)
+        question = self.client.post(f'/api/adaptive-quiz/{topics[0].id}/start/').json()['question']
+        self.patch(views, 'get_item_pool', return_value=None)
+
+        response = self.answer(topics[0], question['id'])
+
+        self.assertTrue(response['finished'], response)
+        self.assertEqual((response['passed'], response['score'], response['questions_asked']), (True, 100, 1))
+
+    def test_question_budget_counts_dropped_questions(self):
+        self.override(ADAPTIVE_QUIZ_MAX_QUESTIONS=2)
+        course, topics = make_course(self.student, topics=1)
+        first = self.client.post(f'/api/adaptive-quiz/{topics[0].id}/start/').json()['question']
+        second = self.answer(topics[0], first['id'])['question']
+        with self.captureOnCommitCallbacks(execute=True):
+            GeneratedQuestion.objects.filter(id=first['id']).delete()
+
+        response = self.answer(topics[0], second['id'])
+
+        self.assertTrue(response['finished'], response)
+        self.assertEqual(response['questions_asked'], 2)
+
+    def test_other_students_topics_are_not_found(self):
+        other = make_student('87654321')
+        course, topics = make_course(other, topics=1)
+
+        response = self.client.post(f'/api/adaptive-quiz/{topics[0].id}/start/')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/adaptive-quiz/answer/', json.dumps({
+            'topic_id': topics[0].id, 'question_id': topics[0].quiz.questions.first().id, 'answer': 'B',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+class AnswerEncodingTests(SimpleTestCase):
+    def test_answers_round_trip(self):
+        answers = [(1, 'A', False), (2, 'B', True), (70_000, 'D', False), (4, None, False), (2 ** 32 - 1, 'Z', True)]
+
+        packed = encode_answers(answers)
+
+        self.assertEqual(len(packed), 5 * len(answers))
+        self.assertEqual(decode_answers(packed), answers)
+
+    def test_unusable_options_are_stored_as_no_answer(self):
+        packed = encode_answers([(1, 'b', True), (2, 'AB', False), (3, '', False), (4, 7, True)])
+
+        self.assertEqual(decode_answers(memoryview(packed)), [(1, 'B', True), (2, None, False), (3, None, False), (4, None, True)])
+        self.assertEqual(decode_answers(None), [])
+
+
+class QuizSubmissionTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course, self.topics = make_course(self.student, topics=1)
+
+    def test_duplicate_key_raises_without_writing(self):
+        record_attempt(self.student, self.topics[0], [], 50, True, [], idempotency_key='submission-1')
+
+        with self.assertRaises(DuplicateSubmission):
+            record_attempt(self.student, self.topics[0], [], 100, True, [], idempotency_key='submission-1')
+
+        completion = GeneratedTopicCompletion.objects.get(student=self.student, topic=self.topics[0])
+        self.assertEqual((completion.attempt_count, completion.score), (1, 50))
+        self.assertEqual(QuizAttempt.objects.filter(student=self.student).count(), 1)
+
+    def test_key_is_unique_per_student(self):
+        record_attempt(self.student, self.topics[0], [], 50, True, [], idempotency_key='submission-1')
+        # A concurrent submission that passed the existence check before the first was written
+        self.patch(QuerySet, 'exists', return_value=False)
+
+        with self.assertRaises(DuplicateSubmission):
+            record_attempt(self.student, self.topics[0], [], 100, True, [], idempotency_key='submission-1')
+
+        completion = GeneratedTopicCompletion.objects.get(student=self.student, topic=self.topics[0])
+        self.assertEqual((completion.attempt_count, completion.score), (1, 50))
+        record_attempt(make_student('87654321'), self.topics[0], [], 75, True, [], idempotency_key='submission-1')
+        record_attempt(self.student, self.topics[0], [], 75, True, [])
+        record_attempt(self.student, self.topics[0], [], 75, True, [])
+        self.assertEqual(QuizAttempt.objects.count(), 4)
+
+    def test_attempts_are_numbered(self):
+        for _ in range(3):
+            record_attempt(self.student, self.topics[0], [], 50, True, [])
+
+        self.assertEqual(list(QuizAttempt.objects.order_by('id').values_list('attempt_number', flat=True)), [1, 2, 3])
+        self.assertEqual(GeneratedTopicCompletion.objects.get(student=self.student, topic=self.topics[0]).attempt_count, 3)
+
+    def submit(self, submission_id):
+        questions = self.topics[0].quiz.questions.all()
+        return self.client.post('/api/complete-generated-topic/', json.dumps({
+            'topic_id': self.topics[0].id,
+            'answers': {str(question.id): 'A' for question in questions},
+            'submission_id': submission_id,
+        }), content_type='application/json')
+
+    def test_attempt_is_not_kept_without_its_mastery_update(self):
+        self.patch(gemini_client_module.GeminiClient, 'generate',
+                   side_effect=gemini_client_module.AIUnavailableError('disabled in tests'))
+        self.patch(views, 'get_cpp_remedial_resources', return_value=[])
+        self.patch(views, 'regenerate_simpler_topic', return_value=None)
+
+        with mock.patch.object(views, 'record_quiz', side_effect=RuntimeError('mastery failed')):
+            self.assertEqual(self.submit('submission-1').status_code, 500)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        response = self.submit('submission-1').json()
+        self.assertTrue(response['success'], response)
+        self.assertEqual(QuizAttempt.objects.count(), 1)
+        self.assertIsNotNone(response.get('mastery'))
+
+    @mock.patch('content.views.regenerate_simpler_topic', return_value=None)
+    @mock.patch('content.views.get_cpp_remedial_resources', return_value=[])
+    @mock.patch.object(gemini_client_module.GeminiClient, 'generate',
+                       side_effect=gemini_client_module.AIUnavailableError('disabled in tests'))
+    def test_resubmitted_quiz_is_processed_once(self, generate, remedial_resources, regenerate):
+        first = self.submit('submission-1').json()
+        # The stored response outlives this process's cache
+        cache.clear()
+        second = self.submit('submission-1').json()
+
+        self.assertTrue(first['success'], first)
+        self.assertEqual(second, first)
+        self.assertEqual(regenerate.call_count, 1)
+        self.assertEqual(QuizAttempt.objects.filter(student=self.student).count(), 1)
+
+
+    def test_retry_during_processing_is_told_to_poll(self):
+        attempt, completion = record_attempt(self.student, self.topics[0], [], 0, False, [], idempotency_key='submission-1')
+
+        response = self.submit('submission-1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'success': True, 'processing': True, 'attempt_id': attempt.pk})
+        status = self.client.get(f'/api/quiz-feedback/{attempt.pk}/').json()
+        self.assertEqual((status['result'], status['final']), (None, False))
+
+        store_submission_result(attempt, {'success': True, 'score': 0})
+        status = self.client.get(f'/api/quiz-feedback/{attempt.pk}/').json()
+        self.assertEqual((status['result'], status['final']), ({'success': True, 'score': 0}, True))
+        self.assertEqual(self.submit('submission-1').json(), {'success': True, 'score': 0})
+
+    def test_retry_of_an_abandoned_submission_gets_the_attempt(self):
+        attempt, completion = record_attempt(self.student, self.topics[0], [], 75, True, [], idempotency_key='submission-1')
+        QuizAttempt.objects.filter(pk=attempt.pk).update(
+            created_at=timezone.now() - timedelta(seconds=SUBMISSION_RESULT_GRACE)
+        )
+
+        response = self.submit('submission-1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({key: response.json()[key] for key in ('duplicate', 'passed', 'score', 'course_id')},
+                         {'duplicate': True, 'passed': True, 'score': 75, 'course_id': self.course.id})
+
+
+class QuizFeedbackTests(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course, self.topics = make_course(self.student, topics=1)
+        self.patch(views, 'get_cpp_remedial_resources', return_value=[])
+        self.patch(views, 'regenerate_simpler_topic', return_value=None)
+        # The AI call is left waiting until the test runs it, like a slow client still working
+        self.background = self.patch(feedback_module, 'run_in_background')
+        self.generate = self.patch(gemini_client_module.GeminiClient, 'generate', return_value='Personal feedback')
+
+    def submit(self):
+        questions = self.topics[0].quiz.questions.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/complete-generated-topic/', json.dumps({
+                'topic_id': self.topics[0].id, 'answers': {str(question.id): 'A' for question in questions},
+            }), content_type='application/json')
+        return response.json()
+
+    def poll(self, attempt_id):
+        return self.client.get(f'/api/quiz-feedback/{attempt_id}/').json()
+
+    def finish_ai_call(self):
+        func, *args = self.background.call_args.args
+        return func(*args)
+
+    def test_template_feedback_is_served_while_the_ai_is_slow(self):
+        started = time.monotonic()
+        submission = self.submit()
+
+        self.assertLess(time.monotonic() - started, latency_budget())
+        self.generate.assert_not_called()
+        self.assertEqual(self.background.call_args.args[:2], (build_quiz_feedback, submission['feedback_id']))
+        self.assertEqual(self.poll(submission['feedback_id'])['status'], 'pending')
+
+        QuizFeedback.objects.filter(pk=submission['feedback_id']).update(
+            created_at=timezone.now() - timedelta(seconds=latency_budget())
+        )
+        status = self.poll(submission['feedback_id'])
+        self.assertEqual((status['status'], status['final'], status['source']), ('timeout', True, 'template'))
+        self.assertIn('You scored 0%', status['feedback'])
+        self.assertEqual(status['result']['feedback_id'], submission['feedback_id'])
+
+    def test_ai_feedback_is_stored_for_polling(self):
+        submission = self.submit()
+
+        self.assertEqual(self.finish_ai_call(), 'Personal feedback')
+
+        status = self.poll(submission['feedback_id'])
+        self.assertEqual(
+            {key: status[key] for key in ('status', 'final', 'source', 'feedback')},
+            {'status': 'ready', 'final': True, 'source': 'ai', 'feedback': 'Personal feedback'}
+        )
+
+    def test_failed_ai_call_keeps_the_template(self):
+        submission = self.submit()
+        self.generate.side_effect = gemini_client_module.AIUnavailableError('disabled in tests')
+
+        self.assertIsNone(self.finish_ai_call())
+
+        status = self.poll(submission['feedback_id'])
+        self.assertEqual((status['status'], status['source']), ('failed', 'template'))
+        self.assertIn('You scored 0%', status['feedback'])
+
+    def test_pending_feedback_times_out_after_the_budget(self):
+        self.override(AI_FEEDBACK_LATENCY_BUDGET=2)
+        feedback = QuizFeedback(status='pending', text='Template', created_at=timezone.now())
+
+        self.assertEqual(feedback_payload(feedback, now=feedback.created_at + timedelta(seconds=1)),
+                         {'status': 'pending', 'final': False})
+        self.assertEqual(feedback_payload(feedback, now=feedback.created_at + timedelta(seconds=2)),
+                         {'status': 'timeout', 'final': True, 'source': 'template', 'feedback': 'Template'})
+
+
+class PromptTemplateTests(TestCase):
+    def setUp(self):
+        self.template = PromptTemplate(
+            'test',
+            """
+            Static instructions.
+            """,
+            sections=[('course', "COURSE"), ('notes', "NOTES"), ('outline', "OUTLINE")],
+            trim=['outline', 'notes'],
+        )
+
+    def test_renders_prefix_then_sections(self):
+        prompt = self.template.render(course='Pointers', outline=['1. Basics', '2. Arithmetic'])
+
+        self.assertEqual(prompt, "Static instructions.\n\nCOURSE:\nPointers\n\nOUTLINE:\n1. Basics\n2. Arithmetic")
+
+    def test_within_budget_is_untouched(self):
+        outline = [f'{i}. Lesson' for i in range(10)]
+
+        self.assertNotIn("omitted", self.template.render(budget=1000, course='Pointers', outline=outline))
+
+    def test_trims_list_sections_from_the_end(self):
+        outline = [f'{i}. Lesson {i}' for i in range(100)]
+        budget = 100
+
+        prompt = self.template.render(budget=budget, course='Pointers', outline=outline)
+
+        self.assertLessEqual(len(prompt), budget * CHARS_PER_TOKEN)
+        self.assertIn("0. Lesson 0\n", prompt)
+        self.assertNotIn("99. Lesson 99", prompt)
+        self.assertRegex(prompt, r"\(\d+ more omitted\)$")
+
+    def test_trims_sections_in_order(self):
+        notes = "n" * 400
+        outline = ["o" * 50] * 4
+
+        prompt = self.template.render(budget=60, course='Pointers', notes=notes, outline=outline)
+
+        self.assertIn("(4 more omitted)", prompt)
+        self.assertIn(TRUNCATED, prompt)
+        self.assertIn("COURSE:\nPointers", prompt)
+        self.assertLessEqual(len(prompt), 60 * CHARS_PER_TOKEN)
+
+    def test_truncated_string_fills_the_budget(self):
+        prompt = self.template.render(budget=30, course='Pointers', notes="n" * 400)
+
+        self.assertTrue(prompt.endswith("n" + TRUNCATED))
+        self.assertEqual(len(prompt), 30 * CHARS_PER_TOKEN)
+
+    def test_string_too_short_to_truncate_is_dropped(self):
+        prompt = self.template.render(budget=1, course='Pointers', notes='Short', outline=["o" * 50])
+
+        self.assertNotIn("NOTES", prompt)
+        self.assertNotIn(TRUNCATED, prompt)
+        self.assertTrue(prompt.endswith("OUTLINE:\n(1 more omitted)"))
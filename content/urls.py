@@ -4,6 +4,7 @@ from . import views
 
 urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),
+    path('api/dashboard/', views.dashboard_api, name='dashboard_api'),
     path('learning/<int:lesson_id>/', views.learning_view, name='learning'),
     path('learning/', views.learning_view, name='learning_default'),
     path('complete-lesson/<int:lesson_id>/', views.complete_lesson, name='complete_lesson'),
@@ -19,4 +20,8 @@ urlpatterns = [
     path('progress-analysis/', views.progress_analysis_view, name='progress_analysis'),
     path('api/regenerate-topic/', views.regenerate_topic, name='regenerate_topic'),
     path('api/check-course-name/', views.check_course_name, name='check_course_name'),
+    path('api/reinforcement-status/<int:course_id>/', views.reinforcement_status, name='reinforcement_status'),
+    path('api/quiz-feedback/<int:attempt_id>/', views.quiz_feedback_status, name='quiz_feedback_status'),
+    path('api/adaptive-quiz/<int:topic_id>/start/', views.start_adaptive_quiz, name='start_adaptive_quiz'),
+    path('api/adaptive-quiz/answer/', views.answer_adaptive_quiz, name='answer_adaptive_quiz'),
 ]
\ No newline at end of file
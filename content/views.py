@@ -8,14 +8,33 @@ from django.http import JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_POST
 from django.conf import settings
-from django.db.models import Q
-from django.db import transaction
-from .models import Course, Module, Lesson, GeneratedCourse, GeneratedChapter, GeneratedTopic, GeneratedQuiz, GeneratedQuestion, GeneratedAnswer, GeneratedCourseProgress, GeneratedTopicCompletion
+from django.db.models import Q, Count, Max, OuterRef, Subquery
+from django.db import transaction, IntegrityError
+from .models import Course, Module, Lesson, GeneratedCourse, GeneratedChapter, GeneratedTopic, GeneratedQuiz, GeneratedQuestion, GeneratedAnswer, GeneratedCourseProgress, GeneratedTopicCompletion, ReinforcementJob, QuizAttempt
 from progress.models import UserProgress, ModuleProgress
 from users.decorators import prevent_after_logout
+from .caching import fragment_version, FRAGMENT_CACHE_TIMEOUT
+from .gemini_client import gemini_client, AIUnavailableError, PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BULK
+from .resource_index import get_resource_index, CURATED_CPP_RESOURCES, GENERAL_CPP_RESOURCES
+from .pregeneration import load_pregenerated_simplified_topic, load_shared_simplified_topic
+from .lesson_schema import extract_json, validate_lesson, LessonSchemaError
+from .course_generation import generate_course_lessons, course_calls, has_rate_limit_room
+from .tasks import request_reinforcement_topic
+from .ai_ledger import ai_ledger
+from .navigation import topic_neighbours
+from .prompts import CPP_RESOURCES_PROMPT, REINFORCEMENT_PROMPT, SIMPLER_TOPIC_PROMPT, wrong_answer_lines
+from .question_bank import active_questions, parse_question_times, record_responses
+from .feedback import feedback_payload, request_quiz_feedback
+from .attempts import DuplicateSubmission, get_submission_result, record_attempt, store_submission_result, submission_result
+from .adaptive_quiz import assess, get_item_pool, max_questions as adaptive_max_questions, session_key as adaptive_session_key
+from engine.mastery import get_mastery, mastery_threshold, record_quiz, skill_for_topic
+from engine.similarity_index import refresh_topics_on_commit
+from engine.spaced_repetition import get_due_reviews, schedule_review
 import json
-import google.generativeai as genai
 import re
+import uuid
+import base64
+from datetime import datetime
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 import logging
 logger = logging.getLogger(__name__)
@@ -30,7 +49,7 @@ def get_topic_data_api(request, topic_id):
         quiz_data = None
         if hasattr(topic, 'quiz'):
             questions_list = []
-            for question in topic.quiz.questions.all():
+            for question in active_questions(topic.quiz):
                 answers_list = []
                 for answer in question.answers.all():
                     answers_list.append({
@@ -57,10 +76,6 @@ def get_topic_data_api(request, topic_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-# Configure Gemini AI
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-
 # The modified dashboard_view
 # content/views.py
 @prevent_after_logout
@@ -87,17 +102,19 @@ def dashboard_view(request):
         # If page is out of range, deliver last page of results.
         generated_courses = paginator.page(paginator.num_pages)
 
-    # Existing logic for regular course progress data
-    courses = Course.objects.all()
+    # Regular course progress data, counted in a single query
+    courses = Course.objects.annotate(
+        total_lessons=Count('modules__lessons', distinct=True),
+        completed_lessons=Count(
+            'modules__lessons__progress',
+            filter=Q(modules__lessons__progress__student=student, modules__lessons__progress__is_completed=True),
+            distinct=True
+        )
+    )
     progress_data = []
     for course in courses:
-        completed_lessons = UserProgress.objects.filter(
-            student=student,
-            lesson__module__course=course,
-            is_completed=True
-        ).count()
-        total_lessons = sum(module.lessons.count() for module in course.modules.all())
-        progress_percentage = int((completed_lessons / total_lessons) * 100) if total_lessons > 0 else 0
+        total_lessons = course.total_lessons
+        progress_percentage = int((course.completed_lessons / total_lessons) * 100) if total_lessons > 0 else 0
         progress_data.append({
             'course': course,
             'progress_percentage': progress_percentage
@@ -107,12 +124,102 @@ def dashboard_view(request):
         'student': student,
         'courses': progress_data,
         'generated_courses': generated_courses, # This is the paginated object
-        'last_accessed_progress': last_accessed_progress
+        'last_accessed_progress': last_accessed_progress,
+        'due_reviews': get_due_reviews(student.pk),
+        # Adding or deleting a course or a lesson changes the count or the newest id
+        'course_cards_version': fragment_version(paginator.count, *GeneratedTopic.objects.filter(
+            chapter__course__user=student
+        ).aggregate(topics=Count('id'), last=Max('id')).values()),
+        'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
 
     return render(request, 'dashboard.html', context)
 
 
+DASHBOARD_PAGE_SIZE = 5
+DASHBOARD_MAX_PAGE_SIZE = 50
+
+
+def _encode_dashboard_cursor(course):
+    """Opaque cursor pointing just past the given course in (created_at, id) order"""
+    raw = f"{course.created_at.isoformat()}|{course.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_dashboard_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, course_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(course_id)
+
+
+@login_required
+def dashboard_api(request):
+    """Keyset-paginated generated courses with progress for the student dashboard"""
+    student = request.user
+
+    try:
+        limit = int(request.GET.get('limit', DASHBOARD_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'limit must be an integer.'}, status=400)
+    limit = max(1, min(limit, DASHBOARD_MAX_PAGE_SIZE))
+
+    # First topic of the first chapter, used for the "View Lesson" link
+    first_topic = GeneratedTopic.objects.filter(
+        chapter__course=OuterRef('pk')
+    ).order_by('chapter__order', 'order', 'id').values('id')[:1]
+
+    courses = GeneratedCourse.objects.filter(user=student).annotate(
+        total_topics=Count('chapters__topics', distinct=True),
+        passed_topics=Count(
+            'chapters__topics__generatedtopiccompletion',
+            filter=Q(
+                chapters__topics__generatedtopiccompletion__student=student,
+                chapters__topics__generatedtopiccompletion__score__gte=50
+            ),
+            distinct=True
+        ),
+        first_topic_id=Subquery(first_topic)
+    ).order_by('-created_at', '-id')
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            created_at, course_id = _decode_dashboard_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({'success': False, 'error': 'Invalid cursor.'}, status=400)
+        courses = courses.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=course_id)
+        )
+
+    # Fetch one extra row to know whether another page exists, without a COUNT
+    page = list(courses[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    courses_data = []
+    for course in page:
+        total_topics = course.total_topics
+        progress_percentage = int((course.passed_topics / total_topics) * 100) if total_topics > 0 else 0
+        courses_data.append({
+            'id': course.id,
+            'title': course.title,
+            'description': course.description,
+            'level': course.level,
+            'created_at': course.created_at.isoformat(),
+            'total_topics': total_topics,
+            'passed_topics': course.passed_topics,
+            'progress_percentage': progress_percentage,
+            'first_topic_id': course.first_topic_id,
+        })
+
+    return JsonResponse({
+        'success': True,
+        'courses': courses_data,
+        'next_cursor': _encode_dashboard_cursor(page[-1]) if has_more else None,
+        'has_more': has_more,
+    })
+
+
 @login_required
 def learning_view(request):
     generated_course_id = request.GET.get('generated_course_id')
@@ -128,47 +235,37 @@ def learning_view(request):
             chapter = topic.chapter
             
             # Get all topics in the course (single chapter)
-            all_topics = GeneratedTopic.objects.filter(chapter__course=course).order_by('order')
-            
-            # Find current topic position
-            topic_index = None
-            for idx, t in enumerate(all_topics):
-                if t.id == topic.id:
-                    topic_index = idx
-                    break
-            
-            # Get previous and next topics
-            previous_topic = None
-            next_topic = None
+            all_topics = list(GeneratedTopic.objects.filter(chapter__course=course).order_by('order', 'id'))
+            # The student's completions for the whole course in one query, by topic
+            completions = {
+                c.topic_id: c for c in GeneratedTopicCompletion.objects.filter(student=request.user, topic__chapter__course=course)
+            }
+            passed_topic_ids = {topic_id for topic_id, c in completions.items() if (c.score or 0) >= 50}
             
-            if topic_index is not None:
-                if topic_index > 0:
-                    previous_topic = all_topics[topic_index - 1]
-                
-                if topic_index < len(all_topics) - 1:
-                    next_topic = all_topics[topic_index + 1]
+            # Previous and next topics from the navigation table
+            previous_topic_id, next_topic_id = topic_neighbours(course.id, topic.id)
+            neighbour_topics = GeneratedTopic.objects.in_bulk([i for i in (previous_topic_id, next_topic_id) if i])
+            previous_topic = neighbour_topics.get(previous_topic_id)
+            next_topic = neighbour_topics.get(next_topic_id)
             
             # Check if topic is completed
-            topic_completed = False
-            completion = None
-            try:
-                completion = GeneratedTopicCompletion.objects.get(student=request.user, topic=topic)
-                topic_completed = True
+            completion = completions.get(topic.id)
+            topic_completed = completion is not None
+            if topic_completed:
                 context['completion'] = completion
-            except GeneratedTopicCompletion.DoesNotExist:
-                pass
             
             # Get quiz questions if available
             quiz_questions = []
+            quiz_question_count = 0
             if hasattr(topic, 'quiz'):
-                questions_qs = topic.quiz.questions.all().prefetch_related('answers')
-                for question in questions_qs:
-                    try:
-                        correct_answer = question.answers.get(is_correct=True)
-                        question.correct_answer_key = correct_answer.option_key
-                    except GeneratedAnswer.DoesNotExist:
-                        question.correct_answer_key = ''
-                quiz_questions = list(questions_qs)
+                # Questions as generated; flagged ones are left out of what is served
+                quiz_question_count = topic.quiz.questions.count()
+                quiz_questions = active_questions(topic.quiz)
+                for question in quiz_questions:
+                    # Answers are prefetched, so filter in Python instead of querying per question
+                    question.correct_answer_key = next(
+                        (answer.option_key for answer in question.answers.all() if answer.is_correct), ''
+                    )
             
             # Update or create course progress
             progress, created = GeneratedCourseProgress.objects.get_or_create(
@@ -181,12 +278,9 @@ def learning_view(request):
                 progress.save()
             
             # Calculate progress percentage as a whole number
-            total_topics = GeneratedTopic.objects.filter(chapter__course=course).count()
-            completed_topics = GeneratedTopicCompletion.objects.filter(
-                student=request.user, 
-                topic__chapter__course=course,
-                score__gte=50  # Only count topics passed with 50% or higher
-            ).count()
+            total_topics = len(all_topics)
+            # Only count topics passed with 50% or higher
+            completed_topics = len(passed_topic_ids)
             
             # Calculate percentage and convert to integer (whole number)
             if total_topics > 0:
@@ -202,23 +296,12 @@ def learning_view(request):
             # Check if this topic needs a reinforcement lesson
             needs_reinforcement = False
             reinforcement_topic = None
+            reinforcement_pending = False
             
             # If this is the last topic in the course and student has completed all topics
-            if topic_index == len(all_topics) - 1 and topic_completed:
+            if next_topic_id is None and topic_completed:
                 # Check if student passed all topics in this course
-                all_passed = True
-                for course_topic in all_topics:
-                    try:
-                        topic_comp = GeneratedTopicCompletion.objects.get(
-                            student=request.user, 
-                            topic=course_topic
-                        )
-                        if topic_comp.score < 50:
-                            all_passed = False
-                            break
-                    except GeneratedTopicCompletion.DoesNotExist:
-                        all_passed = False
-                        break
+                all_passed = all(t.id in passed_topic_ids for t in all_topics)
                 
                 # If student didn't pass all topics, they need reinforcement
                 if not all_passed:
@@ -230,12 +313,14 @@ def learning_view(request):
                         is_reinforcement=True
                     ).first()
                     
-                    # If no reinforcement topic exists, create one
+                    # If no reinforcement topic exists, build one in the background and let the page poll
                     if not reinforcement_topic:
-                        reinforcement_topic = create_reinforcement_topic(course, request.user)
+                        job = request_reinforcement_topic(course, request.user)
+                        reinforcement_pending = job.status in ('pending', 'running')
             
             # Determine which topics are unlocked
             unlocked_topics = []
+            mastery = get_mastery(request.user.pk)
             for idx, t in enumerate(all_topics):
                 # First topic is always unlocked
                 if idx == 0:
@@ -244,37 +329,27 @@ def learning_view(request):
                 
                 # Check if previous topic is completed
                 prev_topic = all_topics[idx - 1]
-                try:
-                    comp = GeneratedTopicCompletion.objects.get(
-                        student=request.user, 
-                        topic=prev_topic
-                    )
-                    if comp.score >= 50:  # Passed
-                        unlocked_topics.append(t.id)
-                except GeneratedTopicCompletion.DoesNotExist:
-                    # Previous topic not completed
-                    pass
+                # Mastering the skill (e.g. through its simplified version) also unlocks the next topic
+                if mastery.get(skill_for_topic(prev_topic), 0) >= mastery_threshold():
+                    unlocked_topics.append(t.id)
+                    continue
+                if prev_topic.id in passed_topic_ids:
+                    unlocked_topics.append(t.id)
             
             # Check if user is trying to access a locked topic
             if topic.id not in unlocked_topics:
                 # Find the first incomplete topic
                 first_incomplete_topic = None
                 for t in all_topics:
-                    if t.id in unlocked_topics:
-                        try:
-                            completion = GeneratedTopicCompletion.objects.get(student=request.user, topic=t)
-                            if completion.score < 50:  # Not passed
-                                first_incomplete_topic = t
-                                break
-                        except GeneratedTopicCompletion.DoesNotExist:
-                            first_incomplete_topic = t
-                            break
+                    if t.id in unlocked_topics and t.id not in passed_topic_ids:
+                        first_incomplete_topic = t
+                        break
                 
                 if first_incomplete_topic:
                     return redirect(f'/learning/?generated_course_id={course.id}&topic_id={first_incomplete_topic.id}')
                 else:
                     # This shouldn't happen, but fallback to first topic
-                    first_topic = all_topics.first()
+                    first_topic = all_topics[0] if all_topics else None
                     if first_topic:
                         return redirect(f'/learning/?generated_course_id={course.id}&topic_id={first_topic.id}')
                 
@@ -290,12 +365,20 @@ def learning_view(request):
                 'next_lesson': next_topic,
                 'is_generated': True,
                 'quiz_questions': quiz_questions,
+                'quiz_question_count': quiz_question_count,
                 'topic_completed': topic_completed,
                 'is_regenerated': topic.is_regenerated if hasattr(topic, 'is_regenerated') else False,
                 'needs_reinforcement': needs_reinforcement,
                 'reinforcement_topic': reinforcement_topic,
+                'reinforcement_pending': reinforcement_pending,
                 'unlocked_topics': unlocked_topics,
                 'all_topics': all_topics,
+                'passed_topic_ids': passed_topic_ids,
+                # Everything the sidebar shows, so it is rebuilt when any of it changes
+                'sidebar_version': fragment_version(
+                    [(t.id, t.title) for t in all_topics], unlocked_topics, sorted(passed_topic_ids)
+                ),
+                'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT,
             })
             
             return render(request, 'learning.html', context)
@@ -322,25 +405,6 @@ def generate_course(request):
         if not original_title or not level:
             return JsonResponse({'success': False, 'error': 'Course name and level are required'}, status=400)
 
-        # Generate a unique course title
-        base_title = original_title
-        counter = 1
-        while True:
-            if not GeneratedCourse.objects.filter(user=request.user, title=base_title).exists():
-                break
-            base_title = f"{original_title} ({counter})"
-            counter += 1
-
-        # Create the course with the unique title
-        course = GeneratedCourse.objects.create(
-            user=request.user,
-            title=base_title,
-            description=f"AI-generated C++ course for {level} level",
-            level=level,
-            chapters_count=no_of_chapters,
-            category="C++ Programming"
-        )
-
         # Revised lessons with memory management moved to moderate level
         if not lessons:
             lessons_map = {
@@ -371,178 +435,72 @@ def generate_course(request):
             }
             lessons = lessons_map.get(level, lessons_map['beginner'])
 
-        # Enhanced AI Prompt for comprehensive content with strict quiz requirements
-        prompt = f"""
-        CRITICAL INSTRUCTION: You MUST create a comprehensive C++ course with detailed lessons. 
-        EVERY SINGLE LESSON MUST include a quiz with exactly 4 high-quality questions.
-        The quiz is ESSENTIAL for student progression in the learning system.
-        
-        CRITICAL: You MUST return valid JSON without any syntax errors, extra characters, or formatting issues.
-        Ensure that all strings are properly escaped and there are no trailing commas in objects or arrays.
-       
-                
-        COURSE TITLE: "{base_title}"
-        TARGET AUDIENCE: {level} level C++ students
-        LESSON COUNT: {len(lessons)}
-        
-        NON-NEGOTIABLE REQUIREMENTS:
-        1. Each lesson MUST have a quiz with exactly 4 questions
-        2. Each question MUST have exactly 4 answer options (A, B, C, D)
-        3. Only one correct answer per question
-        4. Questions must test actual understanding of the lesson content
-        5. Answer options must be plausible but only one is correct
-        6. Lesson content must be comprehensive (1000+ words) with code examples
-        
-        LESSONS TO CREATE (in exact order):
-        {json.dumps(lessons, indent=2)}
-        
-        FORMAT REQUIREMENTS:
-        You MUST return valid JSON with this exact structure:
-        {{
-            "lessons": [
-                {{
-                    "title": "Exact lesson title from the list above",
-                    "order": 1,
-                    "content": "Comprehensive lesson content (1000+ words) with:
-                    - Clear explanations of concepts
-                    - Practical code examples
-                    - Real-world applications
-                    - Best practices
-                    - Common pitfalls to avoid
-                    - Memory diagrams where appropriate",
-                    "quiz": {{
-                        "questions": [
-                            {{
-                                "question_text": "Challenging question that tests understanding",
-                                "answers": [
-                                    {{"answer_text": "Plausible but incorrect option", "option_key": "A", "is_correct": false}},
-                                    {{"answer_text": "Correct answer", "option_key": "B", "is_correct": true}},
-                                    {{"answer_text": "Plausible but incorrect option", "option_key": "C", "is_correct": false}},
-                                    {{"answer_text": "Clearly wrong option", "option_key": "D", "is_correct": false}}
-                                ]
-                            }},
-                            {{
-                                "question_text": "Question about practical application",
-                                "answers": [
-                                    {{"answer_text": "Partially correct but incomplete", "option_key": "A", "is_correct": false}},
-                                    {{"answer_text": "Correct application", "option_key": "B", "is_correct": true}},
-                                    {{"answer_text": "Completely wrong approach", "option_key": "C", "is_correct": false}},
-                                    {{"answer_text": "Opposite of correct approach", "option_key": "D", "is_correct": false}}
-                                ]
-                            }},
-                            {{
-                                "question_text": "Question about syntax or code structure",
-                                "answers": [
-                                    {{"answer_text": "Incorrect syntax", "option_key": "A", "is_correct": false}},
-                                    {{"answer_text": "Correct syntax", "option_key": "B", "is_correct": true}},
-                                    {{"answer_text": "Invalid approach", "option_key": "C", "is_correct": false}},
-                                    {{"answer_text": "Working but inefficient approach", "option_key": "D", "is_correct": false}}
-                                ]
-                            }},
-                            {{
-                                "question_text": "Conceptual question about underlying principles",
-                                "answers": [
-                                    {{"answer_text": "Misunderstanding of concept", "option_key": "A", "is_correct": false}},
-                                    {{"answer_text": "Accurate understanding", "option_key": "B", "is_correct": true}},
-                                    {{"answer_text": "Common misconception", "option_key": "C", "is_correct": false}},
-                                    {{"answer_text": "Irrelevant information", "option_key": "D", "is_correct": false}}
-                                ]
-                            }}
-                        ]
-                    }}
-                }}
-            ]
-        }}
-        
-        FAILURE TO INCLUDE A QUIZ FOR ANY LESSON WILL MAKE THE ENTIRE COURSE USELESS.
-        STUDENTS CANNOT PROGRESS WITHOUT COMPLETING QUIZZES.
-        THIS IS THE MOST IMPORTANT REQUIREMENT.
-        
-        TONE AND STYLE:
-        - Professional but accessible for {level} level students
-        - Practical with real code examples
-        - Focus on understanding rather than memorization
-        - Include both theoretical concepts and practical applications
-        
-        REMEMBER: QUIZZES ARE NOT OPTIONAL. THEY ARE REQUIRED FOR EVERY LESSON.
-        """
+        # A course costs one outline call plus one call per lesson; refuse up front rather than fail halfway
+        if gemini_client.scheduler.remaining_quota(request.user.pk) < course_calls(len(lessons)):
+            return JsonResponse({
+                'success': False,
+                'error': "You've reached your AI generation limit for now. Please try again in a few minutes."
+            }, status=429)
 
-        logger.info(f"Sending enhanced prompt to AI: {prompt[:300]}")
+        # The model's rate limit is shared by all students; refuse up front rather than hold this request while lessons wait on it
+        if not has_rate_limit_room(len(lessons)):
+            return JsonResponse({
+                'success': False,
+                'error': 'The AI service is busy right now. Please try again in a minute.'
+            }, status=503)
 
-        # AI Generation with strict validation
-        max_retries = 5  # Increased retries for better chance of success
-        retry_delay = 2
-        course_data = None
-        
-        for attempt in range(max_retries):
-            try:
-                model = genai.GenerativeModel('gemini-2.5-flash', generation_config={"response_mime_type": "application/json"})
-                response = model.generate_content(prompt)
-                logger.info(f"AI response received (first 500 chars): {response.text[:500]}")
-
-                # Try parsing JSON
-                try:
-                    course_data = json.loads(response.text)
-                except json.JSONDecodeError:
-                    cleaned = response.text.strip()
-                    cleaned = re.sub(r'^```json', '', cleaned)
-                    cleaned = re.sub(r'```$', '', cleaned)
-                    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-                    if match:
-                        course_data = json.loads(match.group())
-                    else:
-                        raise ValueError("Could not extract JSON from response")
-
-                if 'lessons' not in course_data:
-                    raise ValueError("AI response missing 'lessons' key")
-                
-                # Validate that each lesson has a quiz with exactly 4 questions
-                valid_lessons = True
-                missing_quizzes = []
-                
-                for i, lesson in enumerate(course_data.get('lessons', [])):
-                    lesson_title = lesson.get('title', f'Lesson {i+1}')
-                    
-                    if 'quiz' not in lesson:
-                        missing_quizzes.append(lesson_title)
-                        valid_lessons = False
-                        continue
-                    
-                    questions = lesson['quiz'].get('questions', [])
-                    if len(questions) < 4:
-                        missing_quizzes.append(f"{lesson_title} (only {len(questions)} questions)")
-                        valid_lessons = False
-                    elif len(questions) > 4:
-                        # If more than 4 questions, just take the first 4
-                        lesson['quiz']['questions'] = questions[:4]
-                
-                if valid_lessons:
-                    logger.info("All lessons have valid quizzes")
-                    break
-                else:
-                    error_msg = f"Missing or incomplete quizzes for: {', '.join(missing_quizzes)}"
-                    logger.warning(f"Attempt {attempt+1} failed: {error_msg}")
-                    
-                    if attempt < max_retries - 1:
-                        # Add specific feedback to the prompt for the next attempt
-                        prompt += f"\n\nPREVIOUS ATTEMPT FAILED: The following lessons were missing quizzes: {', '.join(missing_quizzes)}. PLEASE ENSURE every lesson has a complete quiz with exactly 4 questions."
-                        time.sleep(retry_delay)
-                    else:
-                        raise ValueError(error_msg)
-                    
-            except Exception as e:
-                logger.error(f"AI generation failed attempt {attempt+1}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    course.delete()
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'AI generation failed: {str(e)}'
-                    }, status=500)
+        # Lessons are written for the title the course will most likely get; nothing is saved until they all exist
+        base_title = GeneratedCourse.next_available_title(request.user, original_title)
 
-        # Create Chapter
+        # One outline call, then each lesson is generated and retried on its own in parallel
+        try:
+            generated_lessons = generate_course_lessons(base_title, level, list(lessons))
+        except AIUnavailableError as e:
+            # Gemini is failing or over quota: give up now instead of sleeping through retries
+            logger.warning(f"AI generation skipped: {e}")
+            return JsonResponse({
+                'success': False,
+                'error': 'The AI service is busy right now. Please try again in a minute.'
+            }, status=503)
+        except Exception as e:
+            logger.error(f"AI generation failed: {e}")
+            return JsonResponse({
+                'success': False,
+                'error': f'AI generation failed: {str(e)}'
+            }, status=500)
+
+        course, topics = save_generated_course(
+            request.user,
+            original_title,
+            generated_lessons,
+            description=f"AI-generated C++ course for {level} level",
+            level=level,
+            chapters_count=no_of_chapters,
+            category="C++ Programming"
+        )
+        first_topic_id = topics[0].id if topics else None
+
+        logger.info(f"Course generated successfully: {course.id}, first topic: {first_topic_id}")
+        return JsonResponse({
+            'success': True,
+            'course_id': course.id,
+            'first_topic_id': first_topic_id,
+            'message': 'Course generated successfully'
+        })
+
+    except Exception as e:
+        logger.error(f"Error in generate_course: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def save_generated_course(user, title, generated_lessons, **fields):
+    """
+    Save a generated course with one chapter of its lessons and their quizzes, all or nothing.
+    Returns (course, topics in lesson order).
+    """
+    with transaction.atomic():
+        # The DB constraint settles concurrent requests for the same title
+        course = create_course_with_unique_title(user, title, **fields)
         chapter = GeneratedChapter.objects.create(
             course=course,
             title="Main Lessons",
@@ -550,57 +508,70 @@ def generate_course(request):
             duration="N/A",
             image_prompt=""
         )
-
-        # Create Lessons & Quizzes
-        first_topic_id = None
-        for lesson_data in course_data.get('lessons', []):
-            topic = GeneratedTopic.objects.create(
+        topics = GeneratedTopic.objects.bulk_create([
+            GeneratedTopic(
                 chapter=chapter,
-                title=lesson_data.get('title', 'Untitled Lesson'),
-                content=lesson_data.get('content', ''),
-                order=lesson_data.get('order', 1),
+                title=lesson_data['title'],
+                content=lesson_data['content'],
+                order=lesson_order,
                 is_regenerated=False,
                 is_reinforcement=False
             )
+            for lesson_order, lesson_data in enumerate(generated_lessons, 1)
+        ])
+        # Validation already trimmed every quiz to 4 questions of 4 answers
+        quizzes = GeneratedQuiz.objects.bulk_create([GeneratedQuiz(topic=topic) for topic in topics])
+        question_data = [
+            (quiz, q_idx, question)
+            for quiz, lesson_data in zip(quizzes, generated_lessons)
+            for q_idx, question in enumerate(lesson_data['quiz']['questions'])
+        ]
+        questions = GeneratedQuestion.objects.bulk_create([
+            GeneratedQuestion(quiz=quiz, question_text=question.get('question_text', f'Question {q_idx+1}'), order=q_idx)
+            for quiz, q_idx, question in question_data
+        ])
+        GeneratedAnswer.objects.bulk_create([
+            GeneratedAnswer(
+                question=question,
+                answer_text=answer_data['answer_text'],
+                option_key=answer_data['option_key'],
+                is_correct=answer_data['is_correct'],
+                order=a_idx
+            )
+            for question, (quiz, q_idx, data) in zip(questions, question_data)
+            for a_idx, answer_data in enumerate(data['answers'])
+        ])
+        # bulk_create sends no post_save, so the new lessons are queued for the index here
+        refresh_topics_on_commit(chapter.id, [topic.id for topic in topics])
+    return course, topics
+
+
+def create_course_with_unique_title(user, title, max_attempts=5, **fields):
+    """Create a GeneratedCourse, retrying with the next free title if another request takes it first"""
+    for attempt in range(max_attempts):
+        unique_title = GeneratedCourse.next_available_title(user, title)
+        try:
+            with transaction.atomic():
+                return GeneratedCourse.objects.create(user=user, title=unique_title, **fields)
+        except IntegrityError:
+            logger.warning(f"Course title '{unique_title}' was taken concurrently (attempt {attempt+1})")
+    raise IntegrityError(f"Could not allocate a unique title for '{title}'")
 
-            if first_topic_id is None:
-                first_topic_id = topic.id
-
-            # Create quiz - ensure we have exactly 4 questions
-            quiz_data = lesson_data.get('quiz', {})
-            quiz = GeneratedQuiz.objects.create(topic=topic)
-            
-            # Create questions and answers
-            questions = quiz_data.get('questions', [])
-            for q_idx, question_data in enumerate(questions[:4]):  # Limit to 4 questions
-                question = GeneratedQuestion.objects.create(
-                    quiz=quiz,
-                    question_text=question_data.get('question_text', f'Question {q_idx+1}'),
-                    order=q_idx
-                )
-                
-                # Create answers
-                answers = question_data.get('answers', [])
-                for a_idx, answer_data in enumerate(answers[:4]):  # Limit to 4 answers
-                    GeneratedAnswer.objects.create(
-                        question=question,
-                        answer_text=answer_data.get('answer_text', f'Answer {a_idx+1}'),
-                        option_key=answer_data.get('option_key', chr(65 + a_idx)),
-                        is_correct=answer_data.get('is_correct', False),
-                        order=a_idx
-                    )
 
-        logger.info(f"Course generated successfully: {course.id}, first topic: {first_topic_id}")
-        return JsonResponse({
-            'success': True,
-            'course_id': course.id,
-            'first_topic_id': first_topic_id,
-            'message': 'Course generated successfully'
-        })
+@login_required
+def check_course_name(request):
+    """Tell the generate form whether a course name is taken and which title would be used"""
+    name = request.GET.get('name', '').strip()
+    if not name:
+        return JsonResponse({'success': False, 'error': 'Course name is required.'}, status=400)
+
+    suggested_name = GeneratedCourse.next_available_title(request.user, name)
+    return JsonResponse({
+        'success': True,
+        'exists': suggested_name != name,
+        'suggested_name': suggested_name,
+    })
 
-    except Exception as e:
-        logger.error(f"Error in generate_course: {str(e)}", exc_info=True)
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @login_required
 def learning_default(request):
@@ -780,30 +751,54 @@ def complete_topic(request):
 
         topic = get_object_or_404(GeneratedTopic, id=topic_id)
         student = request.user
+        submission_key = _submission_key(data)
+        previous_result = get_submission_result(student.pk, submission_key)
+        if previous_result is not None:
+            return JsonResponse(previous_result)
         
         # Calculate quiz score
         correct_answers_count = 0
-        total_questions = topic.quiz.questions.count() if hasattr(topic, 'quiz') else 0
+        questions = active_questions(topic.quiz) if hasattr(topic, 'quiz') else []
+        total_questions = len(questions)
         
-        if total_questions > 0:
-            for question in topic.quiz.questions.all():
-                try:
-                    correct_answer = question.answers.get(is_correct=True)
-                    user_selected_option = user_answers.get(str(question.id))
-                    
-                    if user_selected_option == correct_answer.option_key:
-                        correct_answers_count += 1
-                except GeneratedAnswer.DoesNotExist:
-                    continue
+        outcomes = []
+        responses = {}
+        answered = []
+        wrong_answers = []
+        for question in questions:
+            correct_answer = next((answer for answer in question.answers.all() if answer.is_correct), None)
+            if correct_answer is None:
+                continue
+            user_selected_option = user_answers.get(str(question.id))
+            
+            responses[question.id] = user_selected_option == correct_answer.option_key
+            outcomes.append(responses[question.id])
+            answered.append((question.id, user_selected_option, responses[question.id]))
+            if user_selected_option == correct_answer.option_key:
+                correct_answers_count += 1
+            else:
+                wrong_answers.append({
+                    'question_id': question.id,
+                    'question': question.question_text,
+                    'selected': user_selected_option,
+                    'correct': correct_answer.option_key
+                })
         
         score_percentage = int((correct_answers_count / total_questions) * 100) if total_questions > 0 else 100
         
-        # Update or create completion record with score
-        completion, created = GeneratedTopicCompletion.objects.update_or_create(
-            student=student,
-            topic=topic,
-            defaults={'score': score_percentage}
-        )
+        # Append the attempt and update the completion summary
+        try:
+            # Mastery and the review schedule commit with the attempt, so none is stored without the others
+            with transaction.atomic():
+                attempt, completion = record_attempt(
+                    student, topic, answered, score_percentage, score_percentage >= 50, wrong_answers,
+                    duration_ms=_duration_ms(data), idempotency_key=submission_key
+                )
+                mastery = record_quiz(student, topic, outcomes) if outcomes else None
+                schedule_review(student, topic, score_percentage)
+        except DuplicateSubmission:
+            return _duplicate_submission_response(student, submission_key)
+        record_responses(responses, parse_question_times(data.get('question_times')))
         
         # Update overall course progress
         course = topic.chapter.course
@@ -815,12 +810,15 @@ def complete_topic(request):
         
         course_progress = int((completed_topics / total_topics) * 100) if total_topics > 0 else 0
         
-        return JsonResponse({
+        response_data = {
             'success': True,
             'score': score_percentage,
             'course_progress': course_progress,
+            'mastery': round(mastery, 3) if mastery is not None else None,
             'message': 'Topic completed successfully!'
-        })
+        }
+        store_submission_result(attempt, response_data)
+        return JsonResponse(response_data)
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -833,7 +831,7 @@ def get_topic_data_api(request, topic_id):
         quiz_data = None
         if hasattr(topic, 'quiz'):
             questions_list = []
-            for question in topic.quiz.questions.all():
+            for question in active_questions(topic.quiz):
                 answers_list = []
                 for answer in question.answers.all():
                     answers_list.append({
@@ -862,7 +860,6 @@ def get_topic_data_api(request, topic_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
-import google.generativeai as genai
 import json
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
@@ -872,6 +869,35 @@ from .models import GeneratedTopic, GeneratedTopicCompletion, GeneratedQuestion,
 from django.db import models
 
 
+def _duration_ms(data):
+    """Time the student spent on the quiz, as reported by the page"""
+    duration = data.get('duration_ms')
+    return int(duration) if isinstance(duration, (int, float)) and 0 <= duration < 2 ** 31 else None
+
+
+def _submission_key(data):
+    """Idempotency key the quiz page sends with a submission; retries of it reuse the key"""
+    key = data.get('submission_id')
+    return key if isinstance(key, str) and 0 < len(key) <= 64 else None
+
+
+def _duplicate_submission_response(student, submission_key):
+    """
+    Answer a retry of a submission another request recorded: with its response when that is
+    stored, else 202 and the attempt id so the page polls quiz_feedback_status for it
+    """
+    attempt = QuizAttempt.objects.filter(student=student, idempotency_key=submission_key).select_related(
+        'topic__chapter'
+    ).first()
+    if attempt is None:
+        # The other request rolled back after all
+        return JsonResponse({'success': False, 'error': 'This submission could not be recorded, please try again.'}, status=409)
+    result = submission_result(attempt)
+    if result is not None:
+        return JsonResponse(result)
+    return JsonResponse({'success': True, 'processing': True, 'attempt_id': attempt.pk}, status=202)
+
+
 @require_POST
 @login_required
 @csrf_protect
@@ -888,50 +914,67 @@ def complete_generated_topic(request, topic_id=None):
         student = request.user
         course = topic.chapter.course
 
+        # --- Duplicate of a submission that was already answered ---
+        submission_key = _submission_key(data)
+        previous_result = get_submission_result(student.pk, submission_key)
+        if previous_result is not None:
+            return JsonResponse(previous_result)
+
         # --- Calculate quiz score ---
         correct_answers_count = 0
-        total_questions = topic.quiz.questions.count() if hasattr(topic, 'quiz') else 0
+        questions = active_questions(topic.quiz) if hasattr(topic, 'quiz') else []
+        total_questions = len(questions)
         wrong_answers = []
+        outcomes = []
+        responses = {}
+        answered = []
 
-        if total_questions > 0:
-            for question in topic.quiz.questions.all():
-                try:
-                    correct_answer = question.answers.get(is_correct=True)
-                    user_selected_option = user_answers.get(str(question.id))
-
-                    if user_selected_option == correct_answer.option_key:
-                        correct_answers_count += 1
-                    else:
-                        wrong_answers.append({
-                            'question_id': question.id,
-                            'selected': user_selected_option,
-                            'correct': correct_answer.option_key
-                        })
-                except GeneratedAnswer.DoesNotExist:
-                    continue
+        for question in questions:
+            correct_answer = next((answer for answer in question.answers.all() if answer.is_correct), None)
+            if correct_answer is None:
+                continue
+            user_selected_option = user_answers.get(str(question.id))
+
+            responses[question.id] = user_selected_option == correct_answer.option_key
+            outcomes.append(responses[question.id])
+            answered.append((question.id, user_selected_option, responses[question.id]))
+            if user_selected_option == correct_answer.option_key:
+                correct_answers_count += 1
+            else:
+                wrong_answers.append({
+                    'question_id': question.id,
+                    'question': question.question_text,
+                    'selected': user_selected_option,
+                    'correct': correct_answer.option_key,
+                    'correct_text': correct_answer.answer_text
+                })
 
         score_percentage = int((correct_answers_count / total_questions) * 100) if total_questions > 0 else 100
 
         # --- Check if student passed (50% or higher) ---
         passed = score_percentage >= 50
 
-        # --- Get or create completion record ---
+        # --- Append the attempt, then fold it into mastery and the review schedule ---
+        # One transaction, so a stored attempt always has its mastery update and review
         try:
-            completion = GeneratedTopicCompletion.objects.get(student=student, topic=topic)
-            completion.score = score_percentage
-            completion.passed = passed
-            completion.attempt_count += 1  # manual increment, safe here
-            completion.wrong_answers = wrong_answers
-            completion.save()
-        except GeneratedTopicCompletion.DoesNotExist:
-            completion = GeneratedTopicCompletion.objects.create(
-                student=student,
-                topic=topic,
-                score=score_percentage,
-                passed=passed,
-                attempt_count=1,
-                wrong_answers=wrong_answers
-            )
+            with transaction.atomic():
+                attempt, completion = record_attempt(
+                    student, topic, answered, score_percentage, passed, wrong_answers,
+                    duration_ms=_duration_ms(data), idempotency_key=submission_key
+                )
+
+                # Per-skill mastery (Bayesian Knowledge Tracing)
+                mastery = record_quiz(student, topic, outcomes) if outcomes else None
+
+                # Spaced-repetition schedule (SM-2)
+                schedule_review(student, topic, score_percentage)
+        except DuplicateSubmission:
+            # Another request is handling this submission; answer with its result
+            # rather than running feedback and regeneration a second time
+            return _duplicate_submission_response(student, submission_key)
+
+        # --- Item statistics for the question bank ---
+        record_responses(responses, parse_question_times(data.get('question_times')))
 
         # --- Update overall course progress (only passed topics) ---
         total_topics = GeneratedTopic.objects.filter(chapter__course=course).count()
@@ -942,9 +985,9 @@ def complete_generated_topic(request, topic_id=None):
         ).count()
         course_progress = int((completed_topics / total_topics) * 100) if total_topics > 0 else 0
 
-        # --- Get remedial resources & AI feedback ---
-        remedial_resources = get_cpp_remedial_resources(topic.title, score_percentage)
-        ai_feedback = generate_ai_feedback(topic, user_answers, score_percentage, passed, remedial_resources)
+        # --- Remedial resources now, AI feedback after commit (polled by the page) ---
+        remedial_resources = get_cpp_remedial_resources(topic.title, score_percentage, wrong_answers)
+        request_quiz_feedback(attempt, topic.title, wrong_answers, remedial_resources)
 
         # --- Adaptive progression ---
         next_topic = None
@@ -952,15 +995,9 @@ def complete_generated_topic(request, topic_id=None):
 
         if passed:
             # Next topic in sequence
-            all_topics = GeneratedTopic.objects.filter(chapter__course=course).order_by('order')
-            current_index = None
-            for idx, t in enumerate(all_topics):
-                if t.id == topic.id:
-                    current_index = idx
-                    break
-
-            if current_index is not None and current_index < len(all_topics) - 1:
-                next_topic = all_topics[current_index + 1]
+            _, next_topic_id = topic_neighbours(course.id, topic.id)
+            if next_topic_id:
+                next_topic = GeneratedTopic.objects.filter(id=next_topic_id).first()
         else:
             # Generate simplified lesson automatically
             regenerated_topic = regenerate_simpler_topic(topic, student, score_percentage, wrong_answers)
@@ -972,15 +1009,17 @@ def complete_generated_topic(request, topic_id=None):
             'success': True,
             'passed': passed,
             'score': score_percentage,
-            'ai_feedback': ai_feedback,
+            'feedback_id': attempt.pk,
             'course_progress': course_progress,
             'remedial_resources': remedial_resources,
             'course_id': course.id,
             'regenerated_topic_id': regenerated_topic_id,
+            'mastery': round(mastery, 3) if mastery is not None else None,
         }
         if next_topic:
             response_data['next_topic_id'] = next_topic.id
 
+        store_submission_result(attempt, response_data)
         return JsonResponse(response_data)
 
     except Exception as e:
@@ -988,6 +1027,147 @@ def complete_generated_topic(request, topic_id=None):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _adaptive_question_payload(question_id, number):
+    question = GeneratedQuestion.objects.prefetch_related('answers').get(id=question_id)
+    return {
+        'id': question.id,
+        'number': number,
+        'question_text': question.question_text,
+        'answers': [
+            {'option_key': answer.option_key, 'answer_text': answer.answer_text}
+            for answer in question.answers.all()
+        ],
+    }
+
+
+@require_POST
+@login_required
+@csrf_protect
+def start_adaptive_quiz(request, topic_id):
+    """Begin a computerized adaptive quiz over the questions of the topic's skill"""
+    try:
+        topic = get_object_or_404(GeneratedTopic, id=topic_id, chapter__course__user=request.user)
+        pool = get_item_pool(topic)
+        if pool is None:
+            return JsonResponse({'success': False, 'error': 'This topic has no quiz questions.'}, status=400)
+
+        _, _, _, question_id = assess(pool, [])
+        request.session[adaptive_session_key(topic.id)] = {
+            'quiz_id': uuid.uuid4().hex, 'responses': [], 'times': {}, 'pending': question_id
+        }
+        return JsonResponse({
+            'success': True,
+            'max_questions': min(adaptive_max_questions(), len(pool)),
+            'question': _adaptive_question_payload(question_id, 1),
+        })
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Topic not found.'}, status=404)
+    except Exception as e:
+        logger.error(f"Error in start_adaptive_quiz: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_POST
+@login_required
+@csrf_protect
+def answer_adaptive_quiz(request):
+    """Grade one adaptive quiz answer, then return the next question or the final result"""
+    try:
+        data = json.loads(request.body)
+        topic = get_object_or_404(GeneratedTopic, id=data.get('topic_id'), chapter__course__user=request.user)
+        state = request.session.get(adaptive_session_key(topic.id))
+        if not state or state['pending'] != data.get('question_id'):
+            return JsonResponse({'success': False, 'error': 'No adaptive quiz question is waiting for this answer.'}, status=400)
+
+        question = GeneratedQuestion.objects.prefetch_related('answers').get(id=state['pending'])
+        correct_answer = next((answer for answer in question.answers.all() if answer.is_correct), None)
+        selected = data.get('answer')
+        correct = correct_answer is not None and selected == correct_answer.option_key
+        state['responses'].append([question.id, selected, correct])
+        if not correct:
+            state.setdefault('wrong', []).append({
+                'question_id': question.id,
+                'question': question.question_text,
+                'selected': selected,
+                'correct': correct_answer.option_key if correct_answer else None,
+            })
+        if isinstance(data.get('time_ms'), (int, float)):
+            state['times'][str(question.id)] = data['time_ms']
+
+        pool = get_item_pool(topic)
+        if pool is None:
+            # Too few usable questions are left to go on adapting: grade the answers given so far
+            theta = se = None
+            correct_count = sum(1 for _, _, ok in state['responses'] if ok)
+            score_percentage = int(round(correct_count / len(state['responses']) * 100))
+            passed = score_percentage >= 50
+        else:
+            # Questions removed from the pool since the quiz started no longer count
+            responses = [(question_id, ok) for question_id, _, ok in state['responses'] if question_id in pool.position]
+            theta, se, decision, next_question_id = assess(pool, responses)
+            if decision is None and len(state['responses']) >= adaptive_max_questions():
+                # assess() only counts the answers still in the pool; the budget covers every question asked
+                decision = 'pass' if theta >= pool.cut_theta else 'fail'
+
+            if decision is None:
+                state['pending'] = next_question_id
+                request.session[adaptive_session_key(topic.id)] = state
+                return JsonResponse({
+                    'success': True,
+                    'finished': False,
+                    'question': _adaptive_question_payload(next_question_id, len(state['responses']) + 1),
+                })
+
+            passed = decision == 'pass'
+            # The fixed quiz's pass mark is 50%, which is where the pool's cut score sits
+            score_percentage = pool.expected_score(theta)
+            score_percentage = max(score_percentage, 50) if passed else min(score_percentage, 49)
+
+        del request.session[adaptive_session_key(topic.id)]
+        student = request.user
+        course = topic.chapter.course
+
+        times = parse_question_times(state['times'])
+        submission_key = f"adaptive-{state['quiz_id']}"
+        outcomes = [ok for _, _, ok in state['responses']]
+        try:
+            with transaction.atomic():
+                attempt, completion = record_attempt(
+                    student, topic, state['responses'], score_percentage, passed, state.get('wrong', []),
+                    duration_ms=int(sum(times.values())) if times else None, adaptive=True,
+                    idempotency_key=submission_key
+                )
+                mastery = record_quiz(student, topic, outcomes)
+                schedule_review(student, topic, score_percentage)
+        except DuplicateSubmission:
+            # The last answer was sent twice; both requests reached the end of the quiz
+            return _duplicate_submission_response(student, submission_key)
+        record_responses({question_id: ok for question_id, _, ok in state['responses']}, times)
+
+        response_data = {
+            'success': True,
+            'finished': True,
+            'passed': passed,
+            'score': score_percentage,
+            'questions_asked': len(state['responses']),
+            'ability': round(theta, 2) if theta is not None else None,
+            'ability_se': round(se, 2) if se is not None else None,
+            'mastery': round(mastery, 3),
+            'course_id': course.id,
+        }
+        if passed:
+            _, next_topic_id = topic_neighbours(course.id, topic.id)
+            if next_topic_id:
+                response_data['next_topic_id'] = next_topic_id
+        store_submission_result(attempt, response_data)
+        return JsonResponse(response_data)
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Topic not found.'}, status=404)
+    except Exception as e:
+        logger.error(f"Error in answer_adaptive_quiz: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
     
     
 def get_remedial_resources(topic_name, learning_style):
@@ -1114,13 +1294,12 @@ def get_ai_progress_recommendations(progress_data):
         """
         
         # Call Gemini AI
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
+        response_text = gemini_client.generate('gemini-2.5-flash', prompt, priority=PRIORITY_STANDARD)
         
         # Parse the AI response
-        if response.text:
+        if response_text:
             # Clean the response (remove markdown code blocks if present)
-            clean_response = response.text.strip()
+            clean_response = response_text.strip()
             if clean_response.startswith('```json'):
                 clean_response = clean_response.removeprefix('```json').removesuffix('```').strip()
             
@@ -1164,79 +1343,37 @@ def generate_simplified_content(original_content, score):
     """
     
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        return response.text
+        return gemini_client.generate('gemini-2.5-flash', prompt, priority=PRIORITY_STANDARD)
     except Exception as e:
         # Fallback: return the original content if AI generation fails
         return original_content
 
 def get_cpp_remedial_resources(topic_name, score_percentage, wrong_answers=None):
-    """Get AI-generated specific C++ learning resources with validated URLs"""
-    try:
-        # Build prompt with wrong answers context if available
-        wrong_answers_context = ""
-        if wrong_answers:
-            wrong_answers_context = "\n\nThe student specifically struggled with these questions:\n"
-            for i, wrong in enumerate(wrong_answers, 1):
-                question_text = wrong.get('question', wrong.get('question_text', 'Unknown question'))
-                user_answer = wrong.get('user_answer', 'No answer')
-                correct_answer = wrong.get('correct_answer', wrong.get('correct_answer_text', 'Unknown answer'))
-                
-                wrong_answers_context += f"{i}. Question: {question_text}\n"
-                wrong_answers_context += f"   Their answer: {user_answer}\n"
-                wrong_answers_context += f"   Correct answer: {correct_answer}\n"
-        
-        prompt = f"""
-        A student scored {score_percentage}% on a C++ quiz about "{topic_name}".{wrong_answers_context}
-
-        They need 4 high-quality learning resources to improve their understanding. 
-
-        CRITICAL REQUIREMENTS:
-        1. Each resource MUST be from a reputable, well-known platform
-        2. URLs MUST be valid, accessible, and directly link to the specific content
-        3. Resources must be specifically about C++ (not general programming)
-        4. Focus on resources that address the specific concepts they struggled with
-        5. Ensure URLs use https:// protocol and are fully qualified
-        6. Ensure there is strictly nothing like page not found
-
-        Please ensure that these resources exist
-        Trusted sources to recommend from:
-        - freeCodeCamp (https://www.freecodecamp.org/)
-        - W3Schools (https://www.w3schools.com/)
-        - GeeksforGeeks (https://www.geeksforgeeks.org/)
-        - Microsoft C++ Docs (https://docs.microsoft.com/en-us/cpp/)
-        - The Cherno YouTube channel (https://www.youtube.com/c/TheCherno)
-
-        For each resource, provide:
-        - title: Specific, descriptive title
-        - url: Full, valid URL to the exact resource
-        - type: video, article, tutorial, exercises, or documentation
-        - source: Name of the platform (e.g., "freeCodeCamp")
-        - description: Brief explanation of how this resource addresses their specific needs
-
-        Return the response as a JSON array of objects.
-
-        Example of valid response:
-        [
-            {{
-                "title": "C++ Pointers Explained",
-                "url": "https://www.youtube.com/watch?v=DTxHyVn0ODg",
-                "type": "video",
-                "source": "freeCodeCamp",
-                "description": "Comprehensive video explaining pointers with visual examples"
-            }}
-        ]
+    """Rank catalogued C++ resources for the topic and the questions the student missed"""
+    query = topic_name
+    for wrong in wrong_answers or []:
+        query += " " + wrong.get('question', wrong.get('question_text', ''))
 
-        DO NOT include resources from unknown or unreliable sources.
-        DO NOT include URLs that are not fully qualified with http:// or https://.
-        """
+    difficulty = 'beginner' if score_percentage < 35 else 'intermediate'
+    resources = get_resource_index().search(query, limit=4, difficulty=difficulty)
+    return resources or get_curated_cpp_resources(topic_name, score_percentage)
+
+
+def generate_ai_cpp_resources(topic_name, score_percentage, wrong_answers=None):
+    """Get AI-generated specific C++ learning resources with validated URLs.
+
+    Used offline by the enrich_cpp_resources command to grow the catalog.
+    """
+    try:
+        prompt = CPP_RESOURCES_PROMPT.render(
+            quiz=f'Topic: "{topic_name}"\nScore: {score_percentage}%',
+            wrong_answers=wrong_answer_lines(wrong_answers),
+        )
 
-        model = genai.GenerativeModel('gemini-2.5-pro', generation_config={"response_mime_type": "application/json"})
-        response = model.generate_content(prompt)
+        response_text = gemini_client.generate('gemini-2.5-pro', prompt, generation_config={"response_mime_type": "application/json"}, priority=PRIORITY_BULK)
         
         # Parse the AI response
-        ai_resources = json.loads(response.text)
+        ai_resources = json.loads(response_text)
         
         # Validate and format the resources
         formatted_resources = []
@@ -1271,7 +1408,7 @@ def get_cpp_remedial_resources(topic_name, score_percentage, wrong_answers=None)
             })
         
         return formatted_resources[:5]  # Return max 5 resources
-        
+
     except Exception as e:
         logger.error(f"AI resource generation failed: {str(e)}")
         # Return empty array instead of fallback to avoid poor recommendations
@@ -1279,177 +1416,19 @@ def get_cpp_remedial_resources(topic_name, score_percentage, wrong_answers=None)
 
 def get_curated_cpp_resources(topic_name, score_percentage):
     """Curated fallback resources when AI generation fails"""
-    # Map topics to specific resources
-    topic_resources = {
-        'pointer': [
-            {
-                'title': 'Pointers in C++',
-                'url': 'https://www.learncpp.com/cpp-tutorial/pointers/',
-                'type': 'tutorial',
-                'source': 'LearnCpp',
-                'description': 'Comprehensive tutorial on C++ pointers with examples'
-            },
-            {
-                'title': 'C++ Pointers Explained',
-                'url': 'https://www.youtube.com/watch?v=DTxHyVn0ODg',
-                'type': 'video',
-                'source': 'freeCodeCamp',
-                'description': 'Visual explanation of pointers in C++'
-            }
-        ],
-        'class': [
-            {
-                'title': 'C++ Classes and Objects',
-                'url': 'https://www.w3schools.com/cpp/cpp_classes.asp',
-                'type': 'tutorial',
-                'source': 'W3Schools',
-                'description': 'Interactive tutorial on classes and objects'
-            },
-            {
-                'title': 'C++ OOP Tutorial',
-                'url': 'https://www.youtube.com/watch?v=wN0x9eZLix4',
-                'type': 'video',
-                'source': 'freeCodeCamp',
-                'description': 'Complete OOP tutorial for beginners'
-            }
-        ],
-        'inheritance': [
-            {
-                'title': 'Inheritance in C++',
-                'url': 'https://www.learncpp.com/cpp-tutorial/basic-inheritance-in-c/',
-                'type': 'tutorial',
-                'source': 'LearnCpp',
-                'description': 'Detailed guide to inheritance concepts'
-            }
-        ],
-        'template': [
-            {
-                'title': 'C++ Templates',
-                'url': 'https://www.geeksforgeeks.org/templates-cpp/',
-                'type': 'tutorial',
-                'source': 'GeeksforGeeks',
-                'description': 'Comprehensive template tutorial with examples'
-            }
-        ],
-        'vector': [
-            {
-                'title': 'C++ Vector Tutorial',
-                'url': 'https://www.cplusplus.com/reference/vector/vector/',
-                'type': 'documentation',
-                'source': 'cplusplus.com',
-                'description': 'Official vector documentation with examples'
-            }
-        ]
-    }
-    
     # Find resources for the specific topic
     topic_lower = topic_name.lower()
     resources = []
     
-    for keyword, resource_list in topic_resources.items():
+    for keyword, resource_list in CURATED_CPP_RESOURCES.items():
         if keyword in topic_lower:
             resources.extend(resource_list)
     
     # If no specific topic resources found, provide general C++ resources
     if not resources:
-        resources = [
-            {
-                'title': 'C++ Tutorial for Beginners',
-                'url': 'https://www.learncpp.com/',
-                'type': 'tutorial',
-                'source': 'LearnCpp',
-                'description': 'Complete C++ tutorial from basics to advanced'
-            },
-            {
-                'title': 'C++ Programming Course',
-                'url': 'https://www.youtube.com/watch?v=vLnPwxZdW4Y',
-                'type': 'video',
-                'source': 'freeCodeCamp',
-                'description': 'Full C++ programming course for beginners'
-            },
-            {
-                'title': 'C++ Reference',
-                'url': 'https://en.cppreference.com/w/',
-                'type': 'documentation',
-                'source': 'cppreference',
-                'description': 'Comprehensive C++ language reference'
-            }
-        ]
+        resources = GENERAL_CPP_RESOURCES
     
     return resources[:3]  # Return max 3 curated resources
-def generate_ai_feedback(topic, user_answers, score, passed, remedial_resources):
-    """Generate personalized AI feedback based on performance"""
-    performance_data = []
-    total_questions = topic.quiz.questions.count() if hasattr(topic, 'quiz') else 0
-    
-    # Collect wrong answers for more specific feedback
-    wrong_answers = []
-    if total_questions > 0:
-        for question in topic.quiz.questions.all():
-            user_selected_option = user_answers.get(str(question.id))
-            correct_answer = question.answers.get(is_correct=True)
-            is_correct = user_selected_option == correct_answer.option_key
-            
-            performance_data.append({
-                'question_text': question.question_text,
-                'user_answer': user_selected_option,
-                'correct_answer_key': correct_answer.option_key,
-                'is_correct': is_correct
-            })
-            
-            if not is_correct:
-                wrong_answers.append({
-                    'question': question.question_text,
-                    'correct_answer': correct_answer.answer_text,
-                    'user_answer': user_selected_option
-                })
-    
-    # Only include resources in the prompt if the student failed
-    resource_context = ""
-    if not passed and remedial_resources:
-        resource_list = "\n".join([f"- {r['title']} ({r['source']}): {r['url']}" for r in remedial_resources])
-        #resource_context = f"\n\nRecommended resources:\n{resource_list}"
-    
-    # Include wrong answers in the prompt for more specific feedback
-    wrong_answers_context = ""
-    if wrong_answers:
-        wrong_answers_context = "\nAreas needing improvement:\n"
-        for i, wrong in enumerate(wrong_answers, 1):
-            wrong_answers_context += f"{i}. {wrong['question']}\n"
-            wrong_answers_context += f"   Your answer: {wrong['user_answer']}\n"
-            wrong_answers_context += f"   Correct answer: {wrong['correct_answer']}\n"
-    
-    prompt = f"""
-    Analyze the student's quiz performance on the topic "{topic.title}" and provide personalized feedback.
-    The student scored {score}% and {'passed' if passed else 'did not pass'}.{wrong_answers_context}
-    
-    Provide feedback that:
-    1. Tell the user whether they did well or need improvement
-    2. Highlights what they did well (if anything)
-    3. Explains key areas for improvement based on their wrong answers
-    4. Ends with motivational closing
-    
-    Keep the response under 200 words.
-   
-    """
-    
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        ai_response = model.generate_content(prompt)
-        return ai_response.text
-    except Exception as e:
-        logger.error(f"AI feedback generation failed: {str(e)}")
-        # Fallback feedback
-        if passed:
-            return f"Great job! You scored {score}% and passed this quiz on {topic.title}. You've demonstrated a good understanding of the material."
-        else:
-            if remedial_resources:
-                resource_list = ", ".join([r['title'] for r in remedial_resources])
-                return f"You scored {score}% on {topic.title}. Review the material and try again. Recommended resources: {resource_list}"
-            else:
-                return f"You scored {score}% on {topic.title}. Review the material and try again. Focus on understanding the concepts you missed."
-
-
 @require_POST
 @login_required
 @csrf_protect
@@ -1565,6 +1544,34 @@ def regenerate_topic(request):
         logger.exception("Exception in regenerate_topic")
         return JsonResponse({'success': False, 'error': 'Internal server error. Please contact support.'}, status=500)
     
+@login_required
+def reinforcement_status(request, course_id):
+    """Polled by the learning page while a reinforcement lesson is being prepared"""
+    course = get_object_or_404(GeneratedCourse, id=course_id, user=request.user)
+    job = ReinforcementJob.objects.filter(course=course, student=request.user).first()
+    if not job:
+        return JsonResponse({'success': False, 'error': 'No reinforcement lesson requested'}, status=404)
+
+    response = {'success': True, 'status': job.status}
+    if job.status == 'ready' and job.topic_id:
+        response['url'] = f'/learning/?generated_course_id={course.id}&topic_id={job.topic_id}'
+    return JsonResponse(response)
+
+@login_required
+def quiz_feedback_status(request, attempt_id):
+    """
+    Polled by the learning page after a quiz submission until the feedback is final,
+    and after a retried submission (202) until the submission's result is stored
+    """
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('topic__chapter', 'feedback'), pk=attempt_id, student=request.user
+    )
+    result = submission_result(attempt)
+    feedback = getattr(attempt, 'feedback', None)
+    if feedback is None:
+        return JsonResponse({'success': True, 'result': result, 'final': result is not None})
+    return JsonResponse({'success': True, 'result': result, **feedback_payload(feedback)})
+
 def create_reinforcement_topic(course, student):
     """
     Create a reinforcement topic that summarizes all lessons in a course
@@ -1588,57 +1595,22 @@ def create_reinforcement_topic(course, student):
             except GeneratedTopicCompletion.DoesNotExist:
                 pass
         
-        # Create prompt for AI to generate reinforcement content
-        prompt = f"""
-        Create a reinforcement lesson for a C++ programming course titled "{course.title}".
-        
-        The student struggled with the following areas:
-        {json.dumps([{'topic': area['topic'].title, 'score': area['score']} for area in weak_areas])}
-        
-        Please create a comprehensive summary that:
-        1. Reviews all key concepts from the course
-        2. Focuses especially on the areas where the student struggled
-        3. Provides additional examples and explanations for difficult concepts
-        4. Includes practice questions to reinforce learning
-        5. Uses simple language and clear explanations
-        
-        Format the response as JSON with this structure:
-        {{
-            "title": "Course Reinforcement: {course.title}",
-            "content": "Comprehensive review content...",
-            "quiz": {{
-                "questions": [
-                    {{
-                        "question_text": "...",
-                        "answers": [
-                            {{ "answer_text": "...", "option_key": "A" }},
-                            {{ "answer_text": "...", "option_key": "B" }},
-                            {{ "answer_text": "...", "option_key": "C" }},
-                            {{ "answer_text": "...", "option_key": "D" }}
-                        ],
-                        "correct_answer_key": "B"
-                    }}
-                ]
-            }}
-        }}
-        """
+        # Weakest areas first, so trimming to the prompt budget drops the mildest ones
+        weak_areas.sort(key=lambda area: area['score'])
+        prompt = REINFORCEMENT_PROMPT.render(
+            course=f'"{course.title}"',
+            weak_areas=[f'- "{area["topic"].title}": scored {area["score"]}%' for area in weak_areas],
+        )
         
         # Generate content using AI
-        model = genai.GenerativeModel('gemini-2.5-flash', generation_config={"response_mime_type": "application/json"})
-        response = model.generate_content(prompt)
+        response_text = gemini_client.generate('gemini-2.5-flash', prompt, generation_config={"response_mime_type": "application/json"}, priority=PRIORITY_STANDARD)
         
-        # Parse the response
+        # Parse and repair the response; a lesson without a usable quiz is rejected
         try:
-            topic_data = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If it's not valid JSON, try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                topic_data = json.loads(json_match.group())
-            else:
-                logger.error("Could not extract JSON from AI response")
-                return None
+            topic_data = validate_lesson(extract_json(response_text), default_title=f"Reinforcement: {course.title}")
+        except LessonSchemaError as e:
+            logger.error(f"Unusable reinforcement lesson from AI: {e}")
+            return None
         
         # Create a new chapter for reinforcement topics
         reinforcement_chapter = GeneratedChapter.objects.filter(
@@ -1693,6 +1665,14 @@ def regenerate_simpler_topic(original_topic, student, score_percentage, wrong_an
     Regenerate a simpler version of a topic based on the student's performance
     """
     try:
+        # Use the lesson pre-generated offline when there is one, without calling the AI
+        topic_data = load_pregenerated_simplified_topic(original_topic)
+        if topic_data:
+            ai_ledger.record('gemini-2.5-flash', cache_hit=True)
+            regenerated_topic = materialize_simplified_topic(original_topic, topic_data)
+            logger.info(f"Served pre-generated simplified topic for {original_topic.id} to student {student.pk}")
+            return regenerated_topic
+
         # Determine the complexity level based on the score
         if score_percentage < 20:
             complexity = "very basic"
@@ -1704,111 +1684,67 @@ def regenerate_simpler_topic(original_topic, student, score_percentage, wrong_an
             complexity = "simplified"
             examples_multiplier = 1.2
         
-        # Analyze wrong answers to understand specific difficulties
-        difficulty_analysis = ""
-        if wrong_answers:
-            difficulty_analysis = "The student specifically struggled with:\n"
-            for i, wrong in enumerate(wrong_answers, 1):
-                question_text = wrong.get('question', wrong.get('question_text', 'Unknown question'))
-                user_answer = wrong.get('user_answer', 'No answer')
-                correct_answer = wrong.get('correct_answer', wrong.get('correct_answer_text', 'Unknown answer'))
-                
-                difficulty_analysis += f"{i}. {question_text}\n"
-                difficulty_analysis += f"   Their answer: {user_answer}\n"
-                difficulty_analysis += f"   Correct answer: {correct_answer}\n"
-        
-        prompt = f"""
-        Create a simpler version of the C++ topic "{original_topic.title}" for a student who scored {score_percentage}%.
-        
-        {difficulty_analysis}
-        
-        NON-NEGOTIABLE REQUIREMENTS:
-        1. MUST include a quiz with exactly 4 questions
-        2. Each question MUST have exactly 4 answer options (A, B, C, D)
-        3. Only one correct answer per question
-        4. Questions must test understanding of the simplified content
-        
-        Please generate a new version that:
-        1. Is at a {complexity} level
-        2. Uses simpler language and more concrete examples
-        3. Focuses on the specific concepts the student struggled with
-        4. Includes {examples_multiplier}x more examples than the original
-        5. Breaks down complex concepts into smaller, more digestible parts
-        6. Uses analogies and real-world examples where appropriate
-        7. INCLUDES A QUIZ WITH EXACTLY 4 QUESTIONS - THIS IS REQUIRED
-        
-        Respond with JSON in this format:
-        {{
-            "title": "Simplified: [Original Title]",
-            "content": "Simplified content...",
-            "quiz": {{
-                "questions": [
-                    {{
-                        "question_text": "...",
-                        "answers": [
-                            {{ "answer_text": "...", "option_key": "A", "is_correct": false }},
-                            {{ "answer_text": "...", "option_key": "B", "is_correct": true }},
-                            {{ "answer_text": "...", "option_key": "C", "is_correct": false }},
-                            {{ "answer_text": "...", "option_key": "D", "is_correct": false }}
-                        ],
-                        "correct_answer_key": "B"
-                    }}
-                    // ... 3 more questions
-                ]
-            }}
-        }}
-        
-        FAILURE TO INCLUDE A PROPER QUIZ WILL MAKE THE LESSON USELESS.
-        """
-        
-        model = genai.GenerativeModel('gemini-2.5-flash', generation_config={"response_mime_type": "application/json"})
-        response = model.generate_content(prompt)
+        prompt = SIMPLER_TOPIC_PROMPT.render(
+            topic=f'"{original_topic.title}"',
+            student=(
+                f"Scored: {score_percentage}%\n"
+                f"Target level: {complexity}\n"
+                f"Examples: {examples_multiplier}x more than the original"
+            ),
+            wrong_answers=wrong_answer_lines(wrong_answers),
+        )
         
-        # Try to parse the response
         try:
-            topic_data = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If it's not valid JSON, try to extract JSON from the response
-            import re
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                try:
-                    topic_data = json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    logger.error(f"Could not parse extracted JSON: {json_match.group()}")
-                    return None
-            else:
-                logger.error(f"Could not extract JSON from AI response: {response.text}")
+            response_text = gemini_client.generate('gemini-2.5-flash', prompt, generation_config={"response_mime_type": "application/json"}, priority=PRIORITY_INTERACTIVE)
+        except AIUnavailableError as e:
+            # Over quota or no call slot: reuse a simplified lesson another student already received
+            topic_data = load_shared_simplified_topic(original_topic)
+            if not topic_data:
+                logger.warning(f"No simplified lesson available for topic {original_topic.id}: {e}")
                 return None
+            ai_ledger.record('gemini-2.5-flash', cache_hit=True)
+            logger.info(f"Served shared simplified topic for {original_topic.id} to student {student.pk}")
+            return materialize_simplified_topic(original_topic, topic_data)
         
-        # Validate that the topic has a quiz with at least 4 questions
-        if 'quiz' not in topic_data or 'questions' not in topic_data['quiz']:
-            logger.error("AI response missing quiz")
+        # Parse and repair the response; it must still have a 4-question quiz
+        try:
+            topic_data = validate_lesson(extract_json(response_text), default_title=f"Simplified: {original_topic.title}")
+        except LessonSchemaError as e:
+            logger.error(f"Unusable simplified lesson from AI: {e}")
             return None
         
-        questions = topic_data['quiz'].get('questions', [])
-        if len(questions) < 4:
-            logger.error(f"AI generated only {len(questions)} questions, need 4")
-            return None
+        regenerated_topic = materialize_simplified_topic(original_topic, topic_data)
+        
+        # Log the regeneration
+        logger.info(f"Regenerated topic {original_topic.id} for student {student.pk} with score {score_percentage}%")
+        
+        return regenerated_topic
         
+    except Exception as e:
+        logger.error(f"Error regenerating topic: {str(e)}")
+        return None
+
+
+def materialize_simplified_topic(original_topic, topic_data):
+    """Create the simplified topic, its quiz and answers from generated lesson data"""
+    with transaction.atomic():
         # Create a new chapter for the regenerated topic
         original_chapter = original_topic.chapter
         new_chapter_order = original_chapter.order + 0.1  # Place it right after the original
-        
+    
         # Check if a chapter for regenerated topics already exists
         regenerated_chapter = GeneratedChapter.objects.filter(
             course=original_chapter.course,
             title=f"Reinforcement: {original_chapter.title}"
         ).first()
-        
+    
         if not regenerated_chapter:
             regenerated_chapter = GeneratedChapter.objects.create(
                 course=original_chapter.course,
                 title=f"Reinforcement: {original_chapter.title}",
                 order=new_chapter_order
             )
-        
+    
         # Create the regenerated topic
         regenerated_topic = GeneratedTopic.objects.create(
             chapter=regenerated_chapter,
@@ -1818,10 +1754,10 @@ def regenerate_simpler_topic(original_topic, student, score_percentage, wrong_an
             is_regenerated=True,
             original_topic=original_topic
         )
-        
+    
         # Create quiz
         quiz = GeneratedQuiz.objects.create(topic=regenerated_topic)
-        
+    
         # Create questions and answers
         for q_idx, question_data in enumerate(topic_data['quiz']['questions']):
             question = GeneratedQuestion.objects.create(
@@ -1829,7 +1765,7 @@ def regenerate_simpler_topic(original_topic, student, score_percentage, wrong_an
                 question_text=question_data.get('question_text', f'Question {q_idx+1}'),
                 order=q_idx
             )
-            
+        
             # Create answers
             answers = question_data.get('answers', [])
             for a_idx, answer_data in enumerate(answers):
@@ -1841,12 +1777,5 @@ def regenerate_simpler_topic(original_topic, student, score_percentage, wrong_an
                     is_correct=is_correct,
                     order=a_idx
                 )
-        
-        # Log the regeneration
-        logger.info(f"Regenerated topic {original_topic.id} for student {student.pk} with score {score_percentage}%")
-        
-        return regenerated_topic
-        
-    except Exception as e:
-        logger.error(f"Error regenerating topic: {str(e)}")
-        return None
\ No newline at end of file
+
+    return regenerated_topic
@@ -3,11 +3,15 @@ from django.db import transaction
 from django.utils import timezone
 from collections import defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
 import json
 from datetime import timedelta
 
 from engine.models import StudentProfile, ContentRecommendation, LearningPath
+from engine.profile_cache import get_profile, get_profile_for_update, profile_scoped
+from engine.batch_recommendations import BatchRecommender, get_lesson_catalog
+from engine.clustering import get_student_cluster
+from engine.path_planner import path_diff, plan_hash, plan_path, record_adjustment
+from content.navigation import build_path_sequence, neighbours, path_key
 from users.models import Student
 from content.models import Lesson, Module, Course
 from progress.models import ModuleProgress, UserProgress
@@ -18,24 +22,31 @@ class AdaptiveLearningEngine:
         self.content_recommendations = {}
         self.learning_paths = {}
         
-    def get_or_create_profile(self, student):
-        """Get or create a student profile"""
-        profile, created = StudentProfile.objects.get_or_create(
-            student=student,
-            defaults={
-                'learning_style': student.learning_style,
-                'mastery_level': student.mastery_level,
-                'knowledge_gaps': [],
-                'strengths': [],
-                'learning_patterns': {}
-            }
-        )
-        return profile
+    def get_or_create_profile(self, student, for_update=False):
+        """
+        Get or create a student profile, fetched at most once per operation.
+        for_update locks and re-reads the row instead, for callers that save it.
+        """
+        defaults = {
+            'learning_style': student.learning_style,
+            'mastery_level': student.mastery_level,
+            'knowledge_gaps': [],
+            'strengths': [],
+            'learning_patterns': {}
+        }
+        if for_update:
+            return get_profile_for_update(student, defaults=defaults)
+        return get_profile(student, defaults=defaults)
     
+    @profile_scoped
     def analyze_assessment_results(self, student, assessment_data):
-        """Analyze assessment results to identify knowledge gaps"""
+        """
+        Analyze assessment results to identify knowledge gaps.
+        Only the entries of the assessed topics are replaced; per-skill entries written
+        by engine.mastery.sync_profile and other topics' entries are kept.
+        """
         with transaction.atomic():
-            profile = self.get_or_create_profile(student)
+            profile = self.get_or_create_profile(student, for_update=True)
             
             # Extract topics and scores from assessment data
             knowledge_gaps = []
@@ -47,8 +58,11 @@ class AdaptiveLearningEngine:
                 elif score > 0.85:  # If score above 85%
                     strengths.append({'topic': topic, 'score': score})
             
-            profile.knowledge_gaps = knowledge_gaps
-            profile.strengths = strengths
+            def kept(entries):
+                return [entry for entry in entries or [] if 'skill' in entry or entry.get('topic') not in assessment_data]
+            
+            profile.knowledge_gaps = kept(profile.knowledge_gaps) + knowledge_gaps
+            profile.strengths = kept(profile.strengths) + strengths
             profile.save()
             
             # Update recommendations based on new analysis
@@ -56,120 +70,54 @@ class AdaptiveLearningEngine:
             
             return knowledge_gaps, strengths
     
+    @profile_scoped
     def update_recommendations(self, student):
         """Update content recommendations based on student profile"""
         profile = self.get_or_create_profile(student)
         
-        # Clear existing recommendations
-        ContentRecommendation.objects.filter(student=student).delete()
-        
-        recommendations = []
-        
-        # Recommend content based on knowledge gaps
-        for gap in profile.knowledge_gaps:
-            content_items = self.find_content_for_topic(gap['topic'], profile.learning_style)
-            for content in content_items:
-                recommendation = ContentRecommendation(
-                    student=student,
-                    content=content,
-                    reason=f"Addressing knowledge gap in {gap['topic']} (score: {gap['score']*100:.1f}%)",
-                    priority=5  # High priority for knowledge gaps
-                )
-                recommendations.append(recommendation)
-        
-        # Recommend challenging content for strengths
-        for strength in profile.strengths:
-            content_items = self.find_advanced_content(strength['topic'], profile.learning_style)
-            for content in content_items:
-                recommendation = ContentRecommendation(
-                    student=student,
-                    content=content,
-                    reason=f"Building on strength in {strength['topic']} (score: {strength['score']*100:.1f}%)",
-                    priority=3  # Medium priority for strengths
-                )
-                recommendations.append(recommendation)
-        
-        # Bulk create recommendations
-        ContentRecommendation.objects.bulk_create(recommendations)
-        
-        return recommendations
-    
-    def find_content_for_topic(self, topic, learning_style):
-        """Find appropriate content for a specific topic and learning style"""
-        # Search for lessons with matching topics
-        lessons = Lesson.objects.filter(
-            topics__icontains=topic,
-            difficulty__in=['beginner', 'intermediate']
-        )
-        
-        # Filter by learning style preference
-        if learning_style == 'visual':
-            lessons = lessons.filter(content_type__in=['video', 'interactive'])
-        elif learning_style == 'auditory':
-            lessons = lessons.filter(content_type__in=['audio', 'interactive'])
-        elif learning_style == 'kinesthetic':
-            lessons = lessons.filter(content_type__in=['interactive', 'exercise'])
-        
-        return lessons[:3]  # Return top 3 matches
-    
-    def find_advanced_content(self, topic, learning_style):
-        """Find advanced content for a specific topic"""
-        # Search for advanced lessons with matching topics
-        lessons = Lesson.objects.filter(
-            topics__icontains=topic,
-            difficulty='advanced'
-        )
-        
-        # Filter by learning style preference
-        if learning_style == 'visual':
-            lessons = lessons.filter(content_type__in=['video', 'interactive'])
-        elif learning_style == 'auditory':
-            lessons = lessons.filter(content_type__in=['audio', 'interactive'])
-        elif learning_style == 'kinesthetic':
-            lessons = lessons.filter(content_type__in=['interactive', 'exercise'])
-        
-        return lessons[:2]  # Return top 2 matches
+        # Same matching as the batch command, for a cohort of one, against the shared catalog
+        return BatchRecommender(catalog=get_lesson_catalog()).run([profile])
     
+    @profile_scoped
     def generate_learning_path(self, student, course):
-        """Generate a personalized learning path for a student"""
+        """
+        Generate a personalized learning path for a student.
+        The stored path is reused until the student's gaps or the course's modules change.
+        """
         profile = self.get_or_create_profile(student)
         
-        # Get all modules in the course
-        modules = Module.objects.filter(course=course).order_by('order')
-        
-        # Create a custom path based on student's profile
-        path = []
-        for module in modules:
-            path.append(module.id)
-        
-        # Adjust path based on knowledge gaps - move relevant modules earlier
-        knowledge_gap_topics = [gap['topic'] for gap in profile.knowledge_gaps]
-        
-        for i, module_id in enumerate(path):
-            module = Module.objects.get(id=module_id)
-            module_topics = module.topics.split(',') if module.topics else []
-            
-            # Check if this module addresses any knowledge gaps
-            if any(topic in knowledge_gap_topics for topic in module_topics):
-                # Move this module earlier in the path
-                if i > 0:
-                    path.pop(i)
-                    path.insert(0, module_id)
-        
-        # Create or update learning path
-        learning_path, created = LearningPath.objects.get_or_create(
-            student=student,
-            course=course,
-            defaults={
-                'path': path,
-                'estimated_completion_time': self.estimate_completion_time(student, course, path)
-            }
-        )
+        knowledge_gaps = profile.knowledge_gaps
+        if not knowledge_gaps:
+            # No assessments yet: start from what the student's cohort struggles with
+            cluster = get_student_cluster(student.pk)
+            knowledge_gaps = cluster.knowledge_gaps if cluster else []
+        
+        # All modules in the course, loaded once
+        modules = list(Module.objects.filter(course=course).order_by('order', 'id'))
+        current_hash = plan_hash(knowledge_gaps, modules)
+        
+        # LearningPath is one row per student
+        learning_path = LearningPath.objects.filter(student=student).first()
+        if learning_path and learning_path.course_id == course.id and learning_path.plan_hash == current_hash:
+            return learning_path
+        
+        path = plan_path(modules, knowledge_gaps)
+        if learning_path is None:
+            learning_path = LearningPath(student=student, course=course)
+            reason = 'created'
+        elif learning_path.course_id != course.id:
+            reason = 'course_changed'
+            learning_path.course = course
+            learning_path.path = []
+            learning_path.current_position = 0
+        else:
+            reason = 'knowledge_gaps_changed'
         
-        if not created:
-            learning_path.path = path
-            learning_path.estimated_completion_time = self.estimate_completion_time(student, course, path)
-            learning_path.save()
+        record_adjustment(learning_path, reason, knowledge_gaps, path_diff(learning_path.path, path))
+        learning_path.path = path
+        learning_path.plan_hash = current_hash
+        learning_path.estimated_completion_time = self.estimate_completion_time(student, course, path)
+        learning_path.save()
         
         return learning_path
     
@@ -190,164 +138,34 @@ class AdaptiveLearningEngine:
 # Initialize the AI engine
 ai_engine = AdaptiveLearningEngine()
 
+def _lesson_neighbours(student, current_lesson):
+    """
+    Previous and next lesson ids from the navigation table, following the student's
+    learning path (generated on first use)
+    """
+    course_id = current_lesson.module.course_id
+    learning_path = LearningPath.objects.filter(student=student, course_id=course_id).only('path').first()
+    if not learning_path:
+        learning_path = ai_engine.generate_learning_path(student, current_lesson.module.course)
+    
+    return neighbours(
+        path_key(course_id, student.pk), 'lesson', current_lesson.id,
+        lambda: build_path_sequence(course_id, student.pk, learning_path.path)
+    )
+
 def get_next_lesson(student, current_lesson):
     """
     Get the next recommended lesson for a student based on their learning path
     """
-    try:
-        # Get the course from the current lesson's module
-        course = current_lesson.module.course
-        
-        # Get the student's learning path
-        learning_path = LearningPath.objects.filter(student=student, course=course).first()
-        
-        if not learning_path:
-            # Generate a learning path if none exists
-            learning_path = ai_engine.generate_learning_path(student, course)
-        
-        # First, try to find the next lesson in the same module
-        next_lesson_same_module = Lesson.objects.filter(
-            module=current_lesson.module,
-            order__gt=current_lesson.order
-        ).order_by('order').first()
-        
-        if next_lesson_same_module:
-            return next_lesson_same_module
-        
-        # If no more lessons in current module, find the next module that has lessons
-        current_module = current_lesson.module
-        
-        # Get all modules in the course, ordered properly
-        all_modules = list(course.modules.all().order_by('order'))
-        
-        try:
-            # Find the current module's position
-            current_index = all_modules.index(current_module)
-            
-            # Find the next module that has lessons
-            for i in range(current_index + 1, len(all_modules)):
-                next_module = all_modules[i]
-                first_lesson = next_module.lesson_set.order_by('order').first()
-                if first_lesson:
-                    return first_lesson
-                    
-        except ValueError:
-            # Current module not found in all_modules list
-            pass
-            
-        return None
-            
-    except Exception as e:
-        print(f"Error getting next lesson: {e}")
-        # Fallback to simple linear navigation
-        try:
-            # Check if there's a next lesson in the same module
-            next_lesson = Lesson.objects.filter(
-                module=current_lesson.module,
-                order__gt=current_lesson.order
-            ).order_by('order').first()
-            
-            if next_lesson:
-                return next_lesson
-            
-            # If no more lessons in current module, find the next module with lessons
-            all_modules = list(Module.objects.filter(
-                course=current_lesson.module.course
-            ).order_by('order'))
-            
-            try:
-                current_index = all_modules.index(current_lesson.module)
-                
-                # Find the next module that has lessons
-                for i in range(current_index + 1, len(all_modules)):
-                    next_module = all_modules[i]
-                    first_lesson = next_module.lesson_set.order_by('order').first()
-                    if first_lesson:
-                        return first_lesson
-            except ValueError:
-                pass
-                
-        except Exception as fallback_error:
-            print(f"Fallback navigation also failed: {fallback_error}")
-        
-        return None
+    _, next_id = _lesson_neighbours(student, current_lesson)
+    return Lesson.objects.filter(id=next_id).first() if next_id else None
 
 def get_previous_lesson(student, current_lesson):
     """
     Get the previous lesson for a student based on their learning path
     """
-    try:
-        # Get the course from the current lesson's module
-        course = current_lesson.module.course
-        
-        # First, try to find the previous lesson in the same module
-        previous_lesson_same_module = Lesson.objects.filter(
-            module=current_lesson.module,
-            order__lt=current_lesson.order
-        ).order_by('-order').first()
-        
-        if previous_lesson_same_module:
-            return previous_lesson_same_module
-        
-        # If no previous lesson in current module, find the previous module
-        # Get the student's learning path
-        learning_path = LearningPath.objects.filter(student=student, course=course).first()
-        
-        if not learning_path:
-            # Generate a learning path if none exists
-            learning_path = ai_engine.generate_learning_path(student, course)
-        
-        current_module = current_lesson.module
-        
-        if current_module.id not in learning_path.path:
-            # Current module not in path, use simple linear navigation
-            all_modules = list(course.modules.all().order_by('order'))
-            try:
-                current_index = all_modules.index(current_module)
-                if current_index > 0:
-                    prev_module = all_modules[current_index - 1]
-                    return prev_module.lesson_set.order_by('-order').first()
-            except ValueError:
-                pass
-            return None
-        
-        current_position = learning_path.path.index(current_module.id)
-        
-        if current_position > 0:
-            # Get the previous module in the path
-            prev_module_id = learning_path.path[current_position - 1]
-            prev_module = Module.objects.get(id=prev_module_id)
-            
-            # Return the last lesson in the previous module
-            return prev_module.lesson_set.order_by('-order').first()
-        else:
-            # Student is at the beginning of the path
-            return None
-            
-    except Exception as e:
-        print(f"Error getting previous lesson: {e}")
-        # Fallback to simple linear navigation
-        try:
-            previous_lesson = Lesson.objects.filter(
-                module=current_lesson.module,
-                order__lt=current_lesson.order
-            ).order_by('-order').first()
-            
-            if previous_lesson:
-                return previous_lesson
-            
-            # If no previous lessons in current module, get last lesson of previous module
-            prev_module = Module.objects.filter(
-                course=current_lesson.module.course,
-                order__lt=current_lesson.module.order
-            ).order_by('-order').first()
-            
-            if prev_module:
-                return prev_module.lesson_set.order_by('-order').first()
-        except Exception as fallback_error:
-            print(f"Fallback navigation also failed: {fallback_error}")
-        
-        return None 
+    prev_id, _ = _lesson_neighbours(student, current_lesson)
+    return Lesson.objects.filter(id=prev_id).first() if prev_id else None
     
 """def get_lesson_recommendations(student, lesson):
     #Get AI-powered recommendations for a specific lesson
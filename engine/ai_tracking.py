@@ -1,8 +1,9 @@
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from collections import defaultdict
 import numpy as np
-from engine.models import StudentProfile
+from engine.profile_cache import get_profile, get_profile_for_update, profile_scoped
 
 class AITrackingSystem:
     def __init__(self):
@@ -25,7 +26,6 @@ class AITrackingSystem:
     
     def update_learning_patterns(self, student):
         """Update learning patterns based on engagement data"""
-        profile = StudentProfile.objects.get(student=student)
         engagement = self.engagement_data[student.id]
         
         patterns = {
@@ -53,14 +53,17 @@ class AITrackingSystem:
             patterns['average_session_length'] = total_time / total_sessions
             patterns['engagement_rate'] = total_sessions / (timezone.now() - student.date_joined).days if (timezone.now() - student.date_joined).days > 0 else total_sessions
         
-        profile.learning_patterns = patterns
-        profile.save()
+        with transaction.atomic():
+            profile = get_profile_for_update(student)
+            profile.learning_patterns = patterns
+            profile.save()
         
         return patterns
     
+    @profile_scoped
     def predict_performance(self, student, upcoming_content):
         """Predict student performance on upcoming content"""
-        profile = StudentProfile.objects.get(student=student)
+        profile = get_profile(student)
         patterns = profile.learning_patterns or {}
         
         predictions = {}
@@ -91,7 +94,7 @@ class AITrackingSystem:
     
     def generate_prep_recommendations(self, student, content):
         """Generate preparation recommendations for specific content"""
-        profile = StudentProfile.objects.get(student=student)
+        profile = get_profile(student)
         
         recommendations = []
         
@@ -0,0 +1,183 @@
+import threading
+import time
+
+import numpy as np
+from django.db import transaction
+
+from engine.models import ContentRecommendation, StudentCluster
+from engine.similarity_index import get_similarity_index
+from content.models import Lesson
+
+# Same content-type preferences the per-lesson lookups in AdaptiveLearningEngine use
+LEARNING_STYLE_CONTENT_TYPES = {
+    'visual': ['video', 'interactive'],
+    'auditory': ['audio', 'interactive'],
+    'kinesthetic': ['interactive', 'exercise'],
+}
+GAP_DIFFICULTIES = ['beginner', 'intermediate']
+STRENGTH_DIFFICULTIES = ['advanced']
+GAP_LIMIT = 3
+STRENGTH_LIMIT = 2
+# Bounds how long another process's lesson changes go unseen by the shared catalog
+CATALOG_TTL = 300
+
+
+class LessonCatalog:
+    """All lessons loaded once, scored against the shared similarity index"""
+
+    def __init__(self, lessons=None, index=None):
+        if lessons is None:
+            lessons = Lesson.objects.order_by('module__order', 'order', 'id')
+        lessons = list(lessons)
+
+        self.lesson_ids = np.array([lesson.id for lesson in lessons], dtype=np.int64)
+        self.difficulties = np.array([lesson.difficulty for lesson in lessons], dtype=object)
+        self.content_types = np.array([lesson.content_type for lesson in lessons], dtype=object)
+        # Without an explicit index the current shared one is used, so rebuilds are picked up
+        self.index = index
+
+    def __len__(self):
+        return len(self.lesson_ids)
+
+    def similarity(self, topics):
+        """Topic x lesson cosine similarity as a dense array, columns in catalog order"""
+        result = np.zeros((len(topics), len(self.lesson_ids)))
+        if not topics or not len(self.lesson_ids):
+            return result
+        index = self.index if self.index is not None else get_similarity_index()
+        ids, _, scores = index.score_matrix(topics, kind='lesson')
+        # Index columns are in index order; place each under its catalog lesson
+        order = np.argsort(self.lesson_ids, kind='stable')
+        positions = np.searchsorted(self.lesson_ids, ids, sorter=order)
+        positions = np.minimum(positions, len(order) - 1)
+        found = self.lesson_ids[order[positions]] == ids
+        result[:, order[positions[found]]] = scores[:, found]
+        return result
+
+    def mask(self, difficulties, learning_style=None):
+        mask = np.isin(self.difficulties, difficulties)
+        if learning_style in LEARNING_STYLE_CONTENT_TYPES:
+            mask &= np.isin(self.content_types, LEARNING_STYLE_CONTENT_TYPES[learning_style])
+        return mask
+
+
+_catalog = None  # (built_at, LessonCatalog)
+_catalog_lock = threading.Lock()
+
+
+def get_lesson_catalog():
+    """The catalog shared by single-student updates, reloaded after lessons change"""
+    global _catalog
+    entry = _catalog
+    if entry is None or time.monotonic() - entry[0] > CATALOG_TTL:
+        with _catalog_lock:
+            entry = _catalog
+            if entry is None or time.monotonic() - entry[0] > CATALOG_TTL:
+                entry = _catalog = (time.monotonic(), LessonCatalog())
+    return entry[1]
+
+
+def invalidate_lesson_catalog():
+    global _catalog
+    _catalog = None
+
+
+class BatchRecommender:
+    """Computes ContentRecommendation rows for many students against one in-memory catalog"""
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog if catalog is not None else LessonCatalog()
+        self._masks = {}
+
+    def _mask(self, difficulties, learning_style):
+        key = (tuple(difficulties), learning_style)
+        if key not in self._masks:
+            self._masks[key] = self.catalog.mask(difficulties, learning_style)
+        return self._masks[key]
+
+    def _top_lessons(self, scores, mask, limit):
+        scores = np.where(mask, scores, 0.0)
+        # Stable sort keeps catalog order between equally good matches
+        best = np.argsort(-scores, kind='stable')[:limit]
+        return [self.catalog.lesson_ids[i] for i in best if scores[i] > 0]
+
+    def _cluster_recommendations(self, profiles, use_clusters):
+        """Copy precomputed cohort results for the profiles that should use them"""
+        if use_clusters is False:
+            return {}
+        candidates = [
+            profile.pk for profile in profiles
+            if profile.pk is not None and (use_clusters or not (profile.knowledge_gaps or profile.strengths))
+        ]
+        if not candidates:
+            return {}
+        assignments = StudentCluster.objects.filter(student_id__in=candidates).select_related('cluster')
+        # Lessons deleted since the clustering run are skipped
+        known_lessons = set(self.catalog.lesson_ids.tolist())
+        return {
+            assignment.student_id: [
+                ContentRecommendation(
+                    student_id=assignment.student_id,
+                    content_id=entry['lesson'],
+                    reason=entry['reason'],
+                    priority=entry['priority']
+                )
+                for entry in assignment.cluster.recommended_lessons
+                if entry['lesson'] in known_lessons
+            ]
+            for assignment in assignments
+        }
+
+    def recommend(self, profiles, use_clusters=None):
+        """
+        Build (unsaved) recommendations for every profile with one similarity computation.
+        use_clusters=True takes every clustered student's list from their cohort, None only
+        for students with no gaps or strengths yet, False never.
+        """
+        from_clusters = self._cluster_recommendations(profiles, use_clusters)
+        recommendations = [rec for recs in from_clusters.values() for rec in recs]
+        profiles = [profile for profile in profiles if profile.pk not in from_clusters]
+
+        topics = sorted({
+            str(entry['topic'])
+            for profile in profiles
+            for entry in list(profile.knowledge_gaps or []) + list(profile.strengths or [])
+            if isinstance(entry, dict) and 'topic' in entry
+        })
+        topic_index = {topic: i for i, topic in enumerate(topics)}
+        similarity = self.catalog.similarity(topics)
+
+        for profile in profiles:
+            for gap in profile.knowledge_gaps or []:
+                if not isinstance(gap, dict) or 'topic' not in gap:
+                    continue
+                scores = similarity[topic_index[str(gap['topic'])]]
+                for lesson_id in self._top_lessons(scores, self._mask(GAP_DIFFICULTIES, profile.learning_style), GAP_LIMIT):
+                    recommendations.append(ContentRecommendation(
+                        student_id=profile.pk,
+                        content_id=int(lesson_id),
+                        reason=f"Addressing knowledge gap in {gap['topic']} (score: {gap.get('score', 0)*100:.1f}%)",
+                        priority=5
+                    ))
+
+            for strength in profile.strengths or []:
+                if not isinstance(strength, dict) or 'topic' not in strength:
+                    continue
+                scores = similarity[topic_index[str(strength['topic'])]]
+                for lesson_id in self._top_lessons(scores, self._mask(STRENGTH_DIFFICULTIES, profile.learning_style), STRENGTH_LIMIT):
+                    recommendations.append(ContentRecommendation(
+                        student_id=profile.pk,
+                        content_id=int(lesson_id),
+                        reason=f"Building on strength in {strength['topic']} (score: {strength.get('score', 0)*100:.1f}%)",
+                        priority=3
+                    ))
+        return recommendations
+
+    def run(self, profiles, use_clusters=None):
+        """Replace the recommendations of these students with one delete and one bulk insert"""
+        profiles = list(profiles)
+        recommendations = self.recommend(profiles, use_clusters=use_clusters)
+        with transaction.atomic():
+            ContentRecommendation.objects.filter(student_id__in=[profile.pk for profile in profiles]).delete()
+            ContentRecommendation.objects.bulk_create(recommendations, batch_size=500)
+        return recommendations
@@ -0,0 +1,165 @@
+import logging
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from content.models import GeneratedTopicCompletion
+from engine.batch_recommendations import BatchRecommender
+from engine.models import ClusterProfile, StudentCluster, StudentProfile
+from progress.models import UserProgress
+from users.models import Student
+
+logger = logging.getLogger(__name__)
+
+LEARNING_STYLES = [style for style, _ in Student.LEARNING_STYLES]
+
+FEATURE_NAMES = [
+    'avg_score', 'min_score', 'pass_rate', 'avg_attempts', 'max_attempts',
+    'topics_completed', 'lessons_touched', 'hours_spent', 'days_inactive',
+] + [f'style_{style}' for style in LEARNING_STYLES]
+
+# A gap or strength belongs to the cluster when at least this share of its members have it
+SHARED_TOPIC_RATIO = 0.3
+
+
+def build_feature_matrix(students=None):
+    """
+    One row per student from quiz results, progress and learning style.
+    Returns (student_ids, matrix) with columns in FEATURE_NAMES order.
+    """
+    if students is None:
+        students = Student.objects.all()
+    students = list(students.order_by('pk').values('pk', 'learning_style', 'last_active'))
+    student_ids = [row['pk'] for row in students]
+
+    completions = {
+        row['student']: row
+        for row in GeneratedTopicCompletion.objects.filter(student__in=student_ids).values('student').annotate(
+            avg_score=Avg('score'), min_score=Min('score'),
+            passed=Count('id', filter=Q(passed=True)), total=Count('id'),
+            avg_attempts=Avg('attempt_count'), max_attempts=Max('attempt_count'),
+        )
+    }
+    engagement = {
+        row['student']: row
+        for row in UserProgress.objects.filter(student__in=student_ids).values('student').annotate(
+            touched=Count('id'), time_spent=Sum('time_spent'),
+        )
+    }
+
+    now = timezone.now()
+    matrix = np.zeros((len(students), len(FEATURE_NAMES)))
+    for i, row in enumerate(students):
+        quiz = completions.get(row['pk'], {})
+        progress = engagement.get(row['pk'], {})
+        total = quiz.get('total') or 0
+        time_spent = progress.get('time_spent')
+        matrix[i, :9] = [
+            (quiz.get('avg_score') or 0) / 100,
+            (quiz.get('min_score') or 0) / 100,
+            quiz.get('passed', 0) / total if total else 0,
+            quiz.get('avg_attempts') or 0,
+            quiz.get('max_attempts') or 0,
+            np.log1p(total),
+            np.log1p(progress.get('touched') or 0),
+            time_spent.total_seconds() / 3600 if time_spent else 0,
+            (now - row['last_active']).days if row['last_active'] else 0,
+        ]
+        if row['learning_style'] in LEARNING_STYLES:
+            matrix[i, 9 + LEARNING_STYLES.index(row['learning_style'])] = 1
+    return student_ids, matrix
+
+
+def _shared_topics(entries_by_member, size):
+    """Topics present in at least SHARED_TOPIC_RATIO of the members, with their mean score"""
+    scores = defaultdict(list)
+    for entries in entries_by_member:
+        seen = set()
+        for entry in entries or []:
+            if isinstance(entry, dict) and 'topic' in entry and entry['topic'] not in seen:
+                seen.add(entry['topic'])
+                scores[entry['topic']].append(entry.get('score', 0))
+    shared = [
+        {'topic': topic, 'score': sum(values) / len(values)}
+        for topic, values in scores.items()
+        if len(values) >= max(1, SHARED_TOPIC_RATIO * size)
+    ]
+    return sorted(shared, key=lambda entry: entry['score'])
+
+
+def cluster_students(n_clusters=None, batch_size=256, random_state=0, recommender=None):
+    """
+    Cluster every student, then store assignments and per-cluster results
+    (shared gaps and strengths, precomputed recommendations). Returns the ClusterProfiles.
+    """
+    if n_clusters is None:
+        n_clusters = getattr(settings, 'ENGINE_STUDENT_CLUSTERS', 6)
+    student_ids, matrix = build_feature_matrix()
+    if not student_ids:
+        with transaction.atomic():
+            ClusterProfile.objects.all().delete()
+        return []
+
+    n_clusters = min(n_clusters, len(student_ids))
+    scaled = StandardScaler().fit_transform(matrix)
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=random_state, n_init=3)
+    labels = model.fit_predict(scaled)
+    distances = np.linalg.norm(scaled - model.cluster_centers_[labels], axis=1)
+
+    profiles = StudentProfile.objects.in_bulk(student_ids)
+    recommender = recommender if recommender is not None else BatchRecommender()
+    styles = matrix[:, 9:]
+
+    clusters = []
+    for label in range(n_clusters):
+        members = np.flatnonzero(labels == label)
+        if not len(members):
+            continue
+        member_profiles = [profiles[student_ids[i]] for i in members if student_ids[i] in profiles]
+        style_counts = Counter(LEARNING_STYLES[int(np.argmax(styles[i]))] for i in members if styles[i].any())
+        cluster = ClusterProfile(
+            label=label,
+            size=len(members),
+            centroid={name: round(float(value), 4) for name, value in zip(FEATURE_NAMES, matrix[members].mean(axis=0))},
+            learning_style=style_counts.most_common(1)[0][0] if style_counts else '',
+            knowledge_gaps=_shared_topics([p.knowledge_gaps for p in member_profiles], len(members)),
+            strengths=_shared_topics([p.strengths for p in member_profiles], len(members)),
+        )
+        # Same matching as for one student, run once for the whole cohort
+        representative = StudentProfile(
+            learning_style=cluster.learning_style,
+            knowledge_gaps=cluster.knowledge_gaps,
+            strengths=cluster.strengths,
+        )
+        cluster.recommended_lessons = [
+            {'lesson': rec.content_id, 'reason': rec.reason, 'priority': rec.priority}
+            for rec in recommender.recommend([representative], use_clusters=False)
+        ]
+        clusters.append(cluster)
+
+    with transaction.atomic():
+        ClusterProfile.objects.all().delete()
+        ClusterProfile.objects.bulk_create(clusters)
+        by_label = {cluster.label: cluster for cluster in ClusterProfile.objects.all()}
+        StudentCluster.objects.bulk_create([
+            StudentCluster(
+                student_id=student_id,
+                cluster=by_label[int(labels[i])],
+                distance=float(distances[i]),
+                features={name: round(float(value), 4) for name, value in zip(FEATURE_NAMES, matrix[i])},
+            )
+            for i, student_id in enumerate(student_ids)
+        ], batch_size=500)
+    return list(by_label.values())
+
+
+def get_student_cluster(student_id):
+    """The student's cohort from the last run, or None if they have not been clustered"""
+    assignment = StudentCluster.objects.select_related('cluster').filter(student_id=student_id).first()
+    return assignment.cluster if assignment else None
@@ -0,0 +1,15 @@
+# engine/management/commands/build_similarity_index.py
+# Refits the TF-IDF similarity index over lessons and generated topics and saves it for memory-mapping
+
+from django.core.management.base import BaseCommand
+from engine.similarity_index import index_path, rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the persisted lesson/topic similarity index'
+
+    def handle(self, *args, **options):
+        index = rebuild_similarity_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} documents over {len(index.vocabulary)} terms in {index_path()}"
+        ))
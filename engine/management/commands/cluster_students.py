@@ -0,0 +1,31 @@
+# engine/management/commands/cluster_students.py
+# Groups students into cohorts by quiz results, engagement and learning style, and stores per-cohort results
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from engine.clustering import cluster_students
+
+
+class Command(BaseCommand):
+    help = 'Cluster students with MiniBatchKMeans and store cluster assignments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clusters', type=int, default=getattr(settings, 'ENGINE_STUDENT_CLUSTERS', 6),
+            help='Number of clusters'
+        )
+        parser.add_argument('--batch-size', type=int, default=256, help='MiniBatchKMeans batch size')
+        parser.add_argument('--seed', type=int, default=0, help='Random state for reproducible runs')
+
+    def handle(self, *args, **options):
+        clusters = cluster_students(
+            n_clusters=options['clusters'], batch_size=options['batch_size'], random_state=options['seed']
+        )
+        for cluster in clusters:
+            self.stdout.write(
+                f"  Cluster {cluster.label}: {cluster.size} students, {len(cluster.knowledge_gaps)} shared gaps, "
+                f"{len(cluster.recommended_lessons)} recommendations"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Assigned {sum(cluster.size for cluster in clusters)} students to {len(clusters)} clusters"
+        ))
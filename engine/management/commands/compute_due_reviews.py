@@ -0,0 +1,13 @@
+# engine/management/commands/compute_due_reviews.py
+# Nightly job: queues every student's spaced-repetition reviews due today for the dashboard
+
+from django.core.management.base import BaseCommand
+from engine.spaced_repetition import compute_due_reviews
+
+
+class Command(BaseCommand):
+    help = 'Compute the reviews due today for all students'
+
+    def handle(self, *args, **options):
+        students, items = compute_due_reviews()
+        self.stdout.write(self.style.SUCCESS(f"{items} reviews due today for {students} students"))
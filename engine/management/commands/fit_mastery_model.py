@@ -0,0 +1,22 @@
+# engine/management/commands/fit_mastery_model.py
+# Refits the Bayesian Knowledge Tracing parameters on all quiz history and recomputes mastery states
+
+from django.core.management.base import BaseCommand
+from engine.mastery import refit_mastery_model
+
+
+class Command(BaseCommand):
+    help = 'Fit BKT parameters on quiz attempt history and rebuild every student\'s mastery state'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-rebuild', action='store_true', help='Only refit the parameters')
+
+    def handle(self, *args, **options):
+        model, sequences = refit_mastery_model(rebuild_states=not options['no_rebuild'])
+        if model is None:
+            self.stdout.write('No quiz history to fit on')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Fitted on {sequences} student/skill sequences: init={model.p_init:.2f} learn={model.p_learn:.2f} "
+            f"guess={model.p_guess:.2f} slip={model.p_slip:.2f}"
+        ))
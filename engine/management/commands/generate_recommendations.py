@@ -0,0 +1,53 @@
+# engine/management/commands/generate_recommendations.py
+# Rebuilds ContentRecommendation rows for all students (or a cohort) in chunks
+
+from django.core.management.base import BaseCommand
+from engine.batch_recommendations import BatchRecommender, LessonCatalog
+from engine.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute content recommendations for every student profile, or a filtered cohort'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', action='append', dest='students', help='Student ID to include (repeatable)')
+        parser.add_argument('--mastery-level', help='Only students at this mastery level')
+        parser.add_argument('--learning-style', help='Only students with this learning style')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Profiles processed per transaction')
+        parser.add_argument(
+            '--from-clusters', action='store_true',
+            help='Copy each clustered student\'s list from their cohort (run cluster_students first)'
+        )
+
+    def handle(self, *args, **options):
+        profiles = StudentProfile.objects.all()
+        if options['students']:
+            profiles = profiles.filter(student_id__in=options['students'])
+        if options['mastery_level']:
+            profiles = profiles.filter(mastery_level=options['mastery_level'])
+        if options['learning_style']:
+            profiles = profiles.filter(learning_style=options['learning_style'])
+
+        total = profiles.count()
+        catalog = LessonCatalog()
+        recommender = BatchRecommender(catalog)
+        self.stdout.write(f"Matching {total} students against {len(catalog)} lessons")
+
+        processed = 0
+        created = 0
+        last_pk = None
+        while True:
+            # Keyset pagination so each chunk is an indexed range scan
+            chunk = profiles.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk[:options['chunk_size']])
+            if not chunk:
+                break
+
+            created += len(recommender.run(chunk, use_clusters=True if options['from_clusters'] else None))
+            processed += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"  {processed}/{total} students, {created} recommendations")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} recommendations for {processed} students"))
@@ -0,0 +1,253 @@
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from content.attempts import decode_answers
+from content.models import GeneratedTopic, QuizAttempt
+from engine.models import MasteryParameters, MasteryState
+from engine.profile_cache import get_profile_for_update
+
+# Used until fit_mastery_model has stored fitted values; guess assumes four answer options
+DEFAULT_PARAMETERS = {'p_init': 0.2, 'p_learn': 0.15, 'p_guess': 0.25, 'p_slip': 0.1}
+
+# Search space for the batch refit
+PARAMETER_GRID = {
+    'p_init': np.linspace(0.05, 0.65, 7),
+    'p_learn': np.linspace(0.05, 0.45, 5),
+    'p_guess': np.linspace(0.1, 0.35, 6),
+    'p_slip': np.linspace(0.02, 0.22, 6),
+}
+
+
+# Skills below this P(known) are listed as knowledge gaps on the student's profile
+GAP_THRESHOLD = 0.5
+
+
+def mastery_threshold():
+    return getattr(settings, 'ENGINE_MASTERY_THRESHOLD', 0.95)
+
+
+def skill_for_topic(topic):
+    """Simplified versions of a lesson practise the same skill as the original"""
+    return topic.original_topic_id or topic.id
+
+
+class BKTModel:
+    """Bayesian Knowledge Tracing; every method works on NumPy arrays so one call can cover many skills"""
+
+    def __init__(self, p_init, p_learn, p_guess, p_slip):
+        self.p_init = p_init
+        self.p_learn = p_learn
+        self.p_guess = p_guess
+        self.p_slip = p_slip
+
+    @classmethod
+    def current(cls):
+        params = MasteryParameters.objects.filter(name='default').values(*DEFAULT_PARAMETERS).first()
+        return cls(**(params or DEFAULT_PARAMETERS))
+
+    def p_correct(self, p_known):
+        return p_known * (1 - self.p_slip) + (1 - p_known) * self.p_guess
+
+    def update(self, p_known, correct):
+        """Posterior after one observation, then the learning transition"""
+        p_known = np.asarray(p_known, dtype=np.float64)
+        correct = np.asarray(correct, dtype=bool)
+        if_correct = p_known * (1 - self.p_slip) / self.p_correct(p_known)
+        if_wrong = p_known * self.p_slip / (p_known * self.p_slip + (1 - p_known) * (1 - self.p_guess))
+        posterior = np.where(correct, if_correct, if_wrong)
+        return posterior + (1 - posterior) * self.p_learn
+
+    def trace(self, outcomes, mask=None, p_known=None):
+        """
+        Run padded outcome sequences (rows x steps) forward. Parameters may be column
+        vectors, in which case every parameter set is traced over every row at once.
+        Returns (final P(known), log-likelihood), one per row (per parameter set and row).
+        """
+        outcomes = np.asarray(outcomes, dtype=bool)
+        if mask is None:
+            mask = np.ones_like(outcomes, dtype=bool)
+        if p_known is None:
+            p_known = self.p_init * np.ones(outcomes.shape[0])
+        log_likelihood = np.zeros(np.broadcast_shapes(np.shape(p_known), outcomes.shape[:1]))
+        for step in range(outcomes.shape[1]):
+            active = mask[:, step]
+            observed = outcomes[:, step]
+            p_correct = np.clip(self.p_correct(p_known), 1e-6, 1 - 1e-6)
+            log_likelihood += np.where(active, np.log(np.where(observed, p_correct, 1 - p_correct)), 0)
+            p_known = np.where(active, self.update(p_known, observed), p_known)
+        return p_known, log_likelihood
+
+
+def _unpack(state):
+    return (
+        np.frombuffer(bytes(state.skills), dtype=np.int64).copy(),
+        np.frombuffer(bytes(state.p_known), dtype=np.float32).copy(),
+        np.frombuffer(bytes(state.attempts), dtype=np.int32).copy(),
+    )
+
+
+def _pack(state, skills, p_known, attempts):
+    state.skills = skills.astype(np.int64).tobytes()
+    state.p_known = p_known.astype(np.float32).tobytes()
+    state.attempts = attempts.astype(np.int32).tobytes()
+
+
+def get_mastery(student_id, skills=None):
+    """{skill id: P(known)} for the given skills (all practised skills by default)"""
+    state = MasteryState.objects.filter(student_id=student_id).first()
+    if state is None:
+        return {}
+    known_skills, p_known, _ = _unpack(state)
+    if skills is None:
+        return dict(zip(known_skills.tolist(), p_known.tolist()))
+    positions = np.searchsorted(known_skills, skills)
+    return {
+        skill: float(p_known[pos])
+        for skill, pos in zip(skills, positions)
+        if pos < len(known_skills) and known_skills[pos] == skill
+    }
+
+
+def record_outcomes(student_id, outcomes_by_skill, model=None):
+    """
+    Fold one submission into the student's state. Only the touched skills are updated;
+    outcomes_by_skill maps skill id -> answers in order (True for correct).
+    Returns {skill id: new P(known)}.
+    """
+    model = model or BKTModel.current()
+    with transaction.atomic():
+        state, _ = MasteryState.objects.select_for_update().get_or_create(student_id=student_id)
+        skills, p_known, attempts = _unpack(state)
+
+        new_skills = np.array(sorted(set(outcomes_by_skill) - set(skills.tolist())), dtype=np.int64)
+        if len(new_skills):
+            merged = np.concatenate([skills, new_skills])
+            order = np.argsort(merged, kind='stable')
+            skills = merged[order]
+            p_known = np.concatenate([p_known, np.full(len(new_skills), model.p_init, dtype=np.float32)])[order]
+            attempts = np.concatenate([attempts, np.zeros(len(new_skills), dtype=np.int32)])[order]
+
+        touched = np.array(sorted(outcomes_by_skill), dtype=np.int64)
+        positions = np.searchsorted(skills, touched)
+        length = max(len(outcomes_by_skill[skill]) for skill in outcomes_by_skill) if len(touched) else 0
+        padded = np.zeros((len(touched), length), dtype=bool)
+        mask = np.zeros((len(touched), length), dtype=bool)
+        for row, skill in enumerate(touched.tolist()):
+            answers = outcomes_by_skill[skill]
+            padded[row, :len(answers)] = answers
+            mask[row, :len(answers)] = True
+
+        updated, _ = model.trace(padded, mask, p_known=p_known[positions].astype(np.float64))
+        p_known[positions] = updated
+        attempts[positions] += mask.sum(axis=1).astype(np.int32)
+
+        _pack(state, skills, p_known, attempts)
+        state.save()
+    return dict(zip(touched.tolist(), updated.tolist()))
+
+
+def sync_profile(student, mastery):
+    """Replace the profile's gap and strength entries for the given skills; other entries are kept"""
+    titles = dict(GeneratedTopic.objects.filter(id__in=list(mastery)).values_list('id', 'title'))
+    with transaction.atomic():
+        profile = get_profile_for_update(student, defaults={
+            'learning_style': student.learning_style,
+            'mastery_level': student.mastery_level,
+        })
+        gaps = [entry for entry in profile.knowledge_gaps or [] if entry.get('skill') not in mastery]
+        strengths = [entry for entry in profile.strengths or [] if entry.get('skill') not in mastery]
+        for skill, p_known in mastery.items():
+            if skill not in titles:
+                continue
+            entry = {'topic': titles[skill], 'score': round(p_known, 3), 'skill': skill}
+            if p_known < GAP_THRESHOLD:
+                gaps.append(entry)
+            elif p_known >= mastery_threshold():
+                strengths.append(entry)
+        if gaps != profile.knowledge_gaps or strengths != profile.strengths:
+            profile.knowledge_gaps = gaps
+            profile.strengths = strengths
+            profile.save(update_fields=['knowledge_gaps', 'strengths', 'last_updated'])
+    return profile
+
+
+def record_quiz(student, topic, outcomes):
+    """Update mastery from one quiz submission (answers in question order) and the profile built on it"""
+    skill = skill_for_topic(topic)
+    mastery = record_outcomes(student.pk, {skill: outcomes})
+    sync_profile(student, mastery)
+    return mastery[skill]
+
+
+def history_sequences():
+    """Padded outcome matrix over every (student, skill), from the stored quiz attempts in time order"""
+    sequences = {}
+    attempts = QuizAttempt.objects.order_by('created_at', 'id').values_list(
+        'student_id', 'topic_id', 'topic__original_topic_id', 'answers'
+    )
+    for student_id, topic_id, original_topic_id, answers in attempts.iterator():
+        key = (student_id, original_topic_id or topic_id)  # skill_for_topic without loading the topic
+        sequences.setdefault(key, []).extend(correct for _, _, correct in decode_answers(answers))
+
+    keys = [key for key, outcomes in sequences.items() if outcomes]
+    length = max((len(sequences[key]) for key in keys), default=0)
+    outcomes = np.zeros((len(keys), length), dtype=bool)
+    mask = np.zeros((len(keys), length), dtype=bool)
+    for row, key in enumerate(keys):
+        outcomes[row, :len(sequences[key])] = sequences[key]
+        mask[row, :len(sequences[key])] = True
+    return keys, outcomes, mask
+
+
+def fit_parameters(outcomes, mask, chunk_size=5000):
+    """
+    Grid search for the parameters with the highest total log-likelihood.
+    Every grid point is traced at once by broadcasting over a (points x sequences) array.
+    Returns (BKTModel, log-likelihood).
+    """
+    names = list(PARAMETER_GRID)
+    grid = np.array(list(itertools.product(*PARAMETER_GRID.values())))
+    # Guessing must stay below answering correctly when known
+    grid = grid[grid[:, names.index('p_guess')] < 1 - grid[:, names.index('p_slip')]]
+    model = BKTModel(*(grid[:, names.index(name)][:, None] for name in DEFAULT_PARAMETERS))
+
+    totals = np.zeros(len(grid))
+    for start in range(0, outcomes.shape[0], chunk_size):
+        _, log_likelihood = model.trace(outcomes[start:start + chunk_size], mask[start:start + chunk_size])
+        totals += log_likelihood.sum(axis=1)
+
+    best = int(np.argmax(totals))
+    params = {name: float(grid[best, names.index(name)]) for name in DEFAULT_PARAMETERS}
+    return BKTModel(**params), float(totals[best])
+
+
+def refit_mastery_model(rebuild_states=True):
+    """Refit the parameters on all history and, optionally, recompute every student's state with them"""
+    keys, outcomes, mask = history_sequences()
+    if not keys:
+        return None, 0
+    model, log_likelihood = fit_parameters(outcomes, mask)
+    MasteryParameters.objects.update_or_create(name='default', defaults={
+        'p_init': model.p_init, 'p_learn': model.p_learn, 'p_guess': model.p_guess, 'p_slip': model.p_slip,
+        'log_likelihood': log_likelihood, 'observations': int(mask.sum()),
+    })
+
+    if rebuild_states:
+        p_known, _ = model.trace(outcomes, mask)
+        attempts = mask.sum(axis=1)
+        by_student = {}
+        for row, (student_id, skill) in enumerate(keys):
+            by_student.setdefault(student_id, []).append((skill, p_known[row], attempts[row]))
+        states = []
+        for student_id, rows in by_student.items():
+            rows.sort()
+            state = MasteryState(student_id=student_id)
+            _pack(state, *(np.array(column) for column in zip(*rows)))
+            states.append(state)
+        with transaction.atomic():
+            MasteryState.objects.all().delete()
+            MasteryState.objects.bulk_create(states, batch_size=500)
+    return model, len(keys)
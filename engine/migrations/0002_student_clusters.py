@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0001_initial'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClusterProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.PositiveIntegerField(unique=True)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('centroid', models.JSONField(default=dict)),
+                ('learning_style', models.CharField(blank=True, choices=[('visual', 'Visual Learner'), ('auditory', 'Auditory Learner'), ('kinesthetic', 'Kinesthetic Learner')], max_length=20)),
+                ('knowledge_gaps', models.JSONField(default=list)),
+                ('strengths', models.JSONField(default=list)),
+                ('recommended_lessons', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['label'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentCluster',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('distance', models.FloatField(default=0.0)),
+                ('features', models.JSONField(default=dict)),
+                ('assigned_at', models.DateTimeField(auto_now=True)),
+                ('cluster', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='engine.clusterprofile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0002_student_clusters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learningpath',
+            name='plan_hash',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0003_learning_path_plan_hash'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasteryParameters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='default', max_length=50, unique=True)),
+                ('p_init', models.FloatField()),
+                ('p_learn', models.FloatField()),
+                ('p_guess', models.FloatField()),
+                ('p_slip', models.FloatField()),
+                ('log_likelihood', models.FloatField(blank=True, null=True)),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MasteryState',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('skills', models.BinaryField(default=bytes)),
+                ('p_known', models.BinaryField(default=bytes)),
+                ('attempts', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0025_navigation_entry'),
+        ('engine', '0004_mastery_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repetitions', models.PositiveIntegerField(default=0)),
+                ('interval_days', models.PositiveIntegerField(default=0)),
+                ('ease', models.FloatField(default=2.5)),
+                ('due_at', models.DateTimeField()),
+                ('last_reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to=settings.AUTH_USER_MODEL)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_items', to='content.generatedtopic')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'due_at'], name='engine_revi_student_da1bc4_idx'), models.Index(fields=['due_at'], name='engine_revi_due_at_259adc_idx')],
+                'unique_together': {('student', 'topic')},
+            },
+        ),
+    ]
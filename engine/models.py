@@ -1,6 +1,6 @@
 from django.db import models
 from users.models import Student
-from content.models import Course, Module, Lesson
+from content.models import Course, Module, Lesson, GeneratedTopic
 
 class StudentProfile(models.Model):
     student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True)
@@ -36,6 +36,96 @@ class LearningPath(models.Model):
     current_position = models.IntegerField(default=0)
     estimated_completion_time = models.DurationField(null=True, blank=True)
     adaptive_adjustments = models.JSONField(default=list)  # History of adjustments made
+    plan_hash = models.CharField(max_length=40, blank=True)  # Gaps and modules the path was last planned from
 
     def __str__(self):
-        return f"Learning Path for {self.student} in {self.course}"
\ No newline at end of file
+        return f"Learning Path for {self.student} in {self.course}"
+
+class ClusterProfile(models.Model):
+    """One cohort from the last clustering run, with results shared by all its members"""
+    label = models.PositiveIntegerField(unique=True)
+    size = models.PositiveIntegerField(default=0)
+    centroid = models.JSONField(default=dict)  # Feature name -> mean value of the members
+    learning_style = models.CharField(max_length=20, choices=Student.LEARNING_STYLES, blank=True)  # Most common style
+    knowledge_gaps = models.JSONField(default=list)  # Gaps shared by a large part of the cohort
+    strengths = models.JSONField(default=list)
+    recommended_lessons = models.JSONField(default=list)  # Precomputed [{'lesson', 'reason', 'priority'}]
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['label']
+
+    def __str__(self):
+        return f"Cluster {self.label} ({self.size} students)"
+
+class StudentCluster(models.Model):
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True)
+    cluster = models.ForeignKey(ClusterProfile, on_delete=models.CASCADE, related_name='members')
+    distance = models.FloatField(default=0.0)  # Distance to the centroid in scaled feature space
+    features = models.JSONField(default=dict)
+    assigned_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student} in cluster {self.cluster.label}"
+
+class MasteryParameters(models.Model):
+    """Fitted Bayesian Knowledge Tracing parameters, shared by all skills"""
+    name = models.CharField(max_length=50, unique=True, default='default')
+    p_init = models.FloatField()   # P(skill known before the first attempt)
+    p_learn = models.FloatField()  # P(unknown -> known after an attempt)
+    p_guess = models.FloatField()  # P(correct answer while not known)
+    p_slip = models.FloatField()   # P(wrong answer while known)
+    log_likelihood = models.FloatField(null=True, blank=True)
+    observations = models.PositiveIntegerField(default=0)
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"BKT {self.name} (init={self.p_init:.2f}, learn={self.p_learn:.2f})"
+
+class MasteryState(models.Model):
+    """
+    A student's mastery of every skill they practised, packed as parallel NumPy arrays:
+    sorted skill ids (int64), P(known) (float32) and answered question counts (int32).
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True)
+    skills = models.BinaryField(default=bytes)
+    p_known = models.BinaryField(default=bytes)
+    attempts = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Mastery state for {self.student}"
+
+class ReviewItem(models.Model):
+    """SM-2 review schedule of one topic for one student; (student, due_at) is the due queue"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='review_items')
+    topic = models.ForeignKey(GeneratedTopic, on_delete=models.CASCADE, related_name='review_items')
+    repetitions = models.PositiveIntegerField(default=0)  # Successful reviews in a row
+    interval_days = models.PositiveIntegerField(default=0)
+    ease = models.FloatField(default=2.5)
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+    last_score = models.PositiveIntegerField(null=True, blank=True)
+    queued_on = models.DateField(null=True, blank=True)  # Day the nightly job put it in the student's queue
+
+    class Meta:
+        unique_together = ('student', 'topic')
+        indexes = [
+            models.Index(fields=['student', 'due_at']),
+            models.Index(fields=['due_at']),
+            models.Index(fields=['student', 'queued_on']),
+        ]
+
+    def __str__(self):
+        return f"{self.student} reviews {self.topic.title} on {self.due_at:%Y-%m-%d}"
+
+
+class ReviewQueueRun(models.Model):
+    """One run of the nightly job; while today's exists, due lists are read from queued_on"""
+    day = models.DateField(unique=True)
+    students = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Review queue for {self.day}: {self.items} items, {self.students} students"
@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+from django.utils import timezone
+
+# Older adjustment entries are dropped so the JSON field stays small
+MAX_ADJUSTMENTS = 50
+
+
+def gap_topics(knowledge_gaps):
+    """Normalized gap topics, in the order the profile lists them"""
+    topics = []
+    for gap in knowledge_gaps or []:
+        if isinstance(gap, dict) and 'topic' in gap:
+            topic = str(gap['topic']).strip().lower()
+            if topic and topic not in topics:
+                topics.append(topic)
+    return topics
+
+
+def plan_hash(knowledge_gaps, modules):
+    """Fingerprint of everything a plan depends on: the gap topics and the course's modules in order"""
+    payload = {
+        'gaps': sorted(gap_topics(knowledge_gaps)),
+        'modules': [module.id for module in modules],
+    }
+    return hashlib.sha1(json.dumps(payload).encode()).hexdigest()
+
+
+def addresses_gap(module, topics):
+    """A module covers a gap when the gap names the module or appears in its title or description"""
+    text = f"{module.title} {module.description}".lower()
+    return any(topic == str(module.id) or topic in text for topic in topics)
+
+
+def plan_path(modules, knowledge_gaps):
+    """
+    Module ids with gap-covering modules first. The sort is stable, so course order
+    is kept within each group.
+    """
+    topics = gap_topics(knowledge_gaps)
+    ordered = sorted(enumerate(modules), key=lambda item: (not addresses_gap(item[1], topics), item[0]))
+    return [module.id for _, module in ordered]
+
+
+def path_diff(old_path, new_path):
+    """Position changes between two paths as [{'module', 'from', 'to'}]; None marks added or removed"""
+    old_positions = {module_id: i for i, module_id in enumerate(old_path or [])}
+    new_positions = {module_id: i for i, module_id in enumerate(new_path)}
+    changes = []
+    for module_id in list(new_path) + [m for m in old_path or [] if m not in new_positions]:
+        before, after = old_positions.get(module_id), new_positions.get(module_id)
+        if before != after:
+            changes.append({'module': module_id, 'from': before, 'to': after})
+    return changes
+
+
+def record_adjustment(learning_path, reason, knowledge_gaps, changes):
+    learning_path.adaptive_adjustments = (list(learning_path.adaptive_adjustments or []) + [{
+        'at': timezone.now().isoformat(),
+        'reason': reason,
+        'gaps': gap_topics(knowledge_gaps),
+        'changes': changes,
+    }])[-MAX_ADJUSTMENTS:]
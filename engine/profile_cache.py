@@ -0,0 +1,134 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+from engine.models import StudentProfile
+
+# student pk -> StudentProfile shared by everything in the current request/operation
+_identity_map = ContextVar('profile_identity_map', default=None)
+
+
+class ProfileCache:
+    """Bounded LRU of StudentProfile copies shared across requests, with a TTL for other processes' writes"""
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # student pk -> (stored_at, profile)
+        self._lock = threading.Lock()
+
+    def get(self, student_id):
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(student_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(student_id)
+            self.hits += 1
+            profile = entry[1]
+        # Callers may mutate what they get back
+        return copy.deepcopy(profile)
+
+    def put(self, profile):
+        stored = copy.deepcopy(profile)
+        with self._lock:
+            self._entries[profile.pk] = (time.monotonic(), stored)
+            self._entries.move_to_end(profile.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, student_id):
+        with self._lock:
+            self._entries.pop(student_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+profile_cache = ProfileCache(
+    max_size=getattr(settings, 'ENGINE_PROFILE_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'ENGINE_PROFILE_CACHE_TTL', 300),
+)
+
+
+@contextmanager
+def profile_scope():
+    """Share one StudentProfile instance per student inside the block; nested scopes reuse the outer one"""
+    if _identity_map.get() is not None:
+        yield
+        return
+    token = _identity_map.set({})
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+def profile_scoped(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_scope():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def get_profile(student, defaults=None):
+    """
+    Return the student's profile from the identity map, the LRU, or the database, in that order.
+    With defaults the profile is created when missing; without, StudentProfile.DoesNotExist is raised.
+    For reads only: writes go through get_profile_for_update.
+    """
+    identity = _identity_map.get()
+    if identity is not None and student.pk in identity:
+        return identity[student.pk]
+
+    profile = profile_cache.get(student.pk)
+    if profile is None:
+        if defaults is None:
+            profile = StudentProfile.objects.get(student=student)
+        else:
+            profile, _ = StudentProfile.objects.get_or_create(student=student, defaults=defaults)
+        profile_cache.put(profile)
+
+    if identity is not None:
+        identity[student.pk] = profile
+    return profile
+
+
+def get_profile_for_update(student, defaults=None):
+    """
+    Lock and read the student's profile row for a write; call inside transaction.atomic.
+    Cached copies may be stale by up to the TTL, so they are only for reads. The fresh
+    row replaces the identity map entry so the rest of the operation sees the write.
+    """
+    profiles = StudentProfile.objects.select_for_update()
+    if defaults is None:
+        profile = profiles.get(student=student)
+    else:
+        profile, _ = profiles.get_or_create(student=student, defaults=defaults)
+
+    identity = _identity_map.get()
+    if identity is not None:
+        identity[student.pk] = profile
+    return profile
+
+
+class ProfileScopeMiddleware:
+    """One profile identity map per request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with profile_scope():
+            return self.get_response(request)
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from progress.models import ModuleProgress, UserProgress
+from content.models import GeneratedTopic, Lesson
+from content.navigation import invalidate_student_paths
 from engine.adaptive_learning import ai_engine
+from engine.batch_recommendations import invalidate_lesson_catalog
+from engine.models import LearningPath, StudentProfile
+from engine.profile_cache import profile_cache
+from engine.similarity_index import forget_document, lesson_document, refresh_documents, refresh_topics_on_commit
 
 @receiver(post_save, sender=ModuleProgress)
 def update_ai_on_progress(sender, instance, **kwargs):
@@ -14,4 +20,37 @@ def update_ai_on_progress(sender, instance, **kwargs):
         }
         
         # Analyze the results
-        ai_engine.analyze_assessment_results(instance.student, assessment_data)
\ No newline at end of file
+        ai_engine.analyze_assessment_results(instance.student, assessment_data)
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Drop the cross-request copy so the next lookup reads the saved row"""
+    profile_cache.invalidate(instance.pk)
+
+@receiver(post_save, sender=Lesson)
+def reindex_lesson(sender, instance, **kwargs):
+    """Keep the similarity index current without a full rebuild"""
+    refresh_documents([lesson_document(instance)])
+
+@receiver(post_save, sender=GeneratedTopic)
+def reindex_generated_topic(sender, instance, **kwargs):
+    # Courses save their topics one by one; score them together once they are committed
+    refresh_topics_on_commit(instance.chapter_id, [instance.id])
+
+@receiver(post_delete, sender=Lesson)
+def unindex_lesson(sender, instance, **kwargs):
+    forget_document(('lesson', instance.id))
+
+@receiver(post_delete, sender=GeneratedTopic)
+def unindex_generated_topic(sender, instance, **kwargs):
+    forget_document(('topic', instance.id))
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_recommendation_catalog(sender, instance, **kwargs):
+    """Lessons, difficulties or content types changed; single-student recommendations reload them"""
+    invalidate_lesson_catalog()
+
+@receiver([post_save, post_delete], sender=LearningPath)
+def invalidate_path_navigation(sender, instance, **kwargs):
+    """The student's lesson order changed; rebuilt on the next navigation lookup"""
+    invalidate_student_paths(instance.student_id)
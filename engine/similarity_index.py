@@ -0,0 +1,404 @@
+import logging
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'similarity_index.npz'
+# Seconds before a file's build time from which saved content is re-scored when it is loaded
+CATCH_UP_OVERLAP = 60
+
+
+def _memmap_npz(path):
+    """
+    Memory-map every array in an uncompressed .npz instead of reading it into memory.
+    np.load can't mmap inside a zip, but stored members are plain .npy files at an offset.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as raw:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed and can't be memory-mapped")
+            # Local file header: 30 fixed bytes + file name + extra field
+            raw.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(raw.read(4), dtype='<u2')
+            raw.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if dtype.hasobject:
+                raise ValueError(f"{name} holds Python objects and can't be memory-mapped")
+            if not shape or 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode='r', offset=raw.tell(), shape=shape,
+                order='F' if fortran_order else 'C'
+            )
+    return arrays
+
+
+class SimilarityIndex:
+    """
+    TF-IDF index over lessons and generated topics. The fitted matrix lives on disk and is
+    memory-mapped; documents changed since the last full build are kept in a small
+    in-memory overlay scored with the same vocabulary.
+    """
+
+    def __init__(self, vocabulary, idf, kinds, ids, matrix):
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf)
+        self.kinds = np.asarray(kinds)
+        self.ids = np.asarray(ids)
+        self.matrix = matrix
+        self.removed = np.zeros(len(self.ids), dtype=bool)
+        self.positions = {(str(kind), int(doc_id)): row for row, (kind, doc_id) in enumerate(zip(self.kinds, self.ids))}
+        self.extra_keys = []
+        self.extra_rows = []
+        self.extra_matrix = None  # extra_rows stacked; rebuilt on the next query after a change
+        self.mtime = None  # Modification time of the file it was loaded from
+        self.built_at = None  # When the documents it was fitted on were read, as a Unix time
+        self._counter = CountVectorizer(vocabulary=vocabulary, stop_words='english') if vocabulary else None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, documents):
+        """Fit the vocabulary and IDF on [((kind, id), text)] and vectorize every document"""
+        built_at = time.time()
+        documents = list(documents)
+        kinds = np.array([key[0] for key, _ in documents], dtype='<U10')
+        ids = np.array([key[1] for key, _ in documents], dtype=np.int64)
+        vectorizer = TfidfVectorizer(stop_words='english', dtype=np.float32)
+        try:
+            matrix = vectorizer.fit_transform([text for _, text in documents]).tocsr()
+        except ValueError:
+            # No documents, or nothing but stop words
+            index = cls({}, np.zeros(0, dtype=np.float32), kinds, ids, sparse.csr_matrix((len(documents), 0), dtype=np.float32))
+        else:
+            index = cls(vectorizer.vocabulary_, vectorizer.idf_.astype(np.float32), kinds, ids, matrix)
+        index.built_at = built_at
+        return index
+
+    def save(self, path):
+        """Write the fitted matrix uncompressed so it can be memory-mapped; overlay rows are folded in first"""
+        self.compact()
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape, dtype=np.int64),
+            idf=self.idf, kinds=self.kinds, ids=self.ids,
+            terms=np.array(terms, dtype=f'<U{max((len(t) for t in terms), default=1)}'),
+            built_at=np.array([self.built_at if self.built_at is not None else time.time()], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.path.getmtime(path)
+        arrays = _memmap_npz(path)
+        matrix = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(int(n) for n in arrays['shape'])
+        )
+        vocabulary = {str(term): i for i, term in enumerate(arrays['terms'])}
+        index = cls(vocabulary, arrays['idf'], arrays['kinds'], arrays['ids'], matrix)
+        index.mtime = mtime
+        # Files written before built_at was stored fall back to their modification time
+        index.built_at = float(arrays['built_at'][0]) if 'built_at' in arrays else mtime
+        return index
+
+    def __len__(self):
+        return int((~self.removed).sum()) + len(self.extra_keys)
+
+    def vectorize(self, texts):
+        """TF-IDF rows for texts using the fitted vocabulary (same weighting as TfidfVectorizer)"""
+        if self._counter is None:
+            return sparse.csr_matrix((len(texts), 0), dtype=np.float32)
+        counts = self._counter.transform(texts).astype(np.float32)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def update_documents(self, documents):
+        """Re-score changed or new documents without refitting; the old rows are masked out"""
+        documents = list(documents)
+        if not documents:
+            return
+        rows = self.vectorize([text for _, text in documents])
+        with self._lock:
+            for i, (key, _) in enumerate(documents):
+                self._drop(key)
+                self.extra_keys.append(key)
+                self.extra_rows.append(rows[i])
+            self.extra_matrix = None
+
+    def remove_document(self, key):
+        with self._lock:
+            self._drop(key)
+            self.extra_matrix = None
+
+    def _drop(self, key):
+        row = self.positions.get(key)
+        if row is not None:
+            self.removed[row] = True
+        if key in self.extra_keys:
+            i = self.extra_keys.index(key)
+            del self.extra_keys[i]
+            del self.extra_rows[i]
+
+    def _extra_matrix(self):
+        """Overlay rows as one matrix, stacked once per batch of changes; caller holds the lock"""
+        if self.extra_matrix is None and self.extra_rows:
+            self.extra_matrix = sparse.vstack(self.extra_rows).tocsr()
+        return self.extra_matrix
+
+    def overlay_size(self):
+        return len(self.extra_keys) + int(self.removed.sum())
+
+    def compact(self):
+        """Fold overlay rows into the main matrix (in memory) so it can be saved"""
+        with self._lock:
+            keep = np.flatnonzero(~self.removed)
+            blocks = [self.matrix[keep]]
+            kinds = [self.kinds[keep]]
+            ids = [self.ids[keep]]
+            if self.extra_keys:
+                blocks.append(self._extra_matrix())
+                kinds.append(np.array([key[0] for key in self.extra_keys], dtype=self.kinds.dtype if len(self.kinds) else '<U10'))
+                ids.append(np.array([key[1] for key in self.extra_keys], dtype=np.int64))
+            self.matrix = sparse.vstack(blocks).tocsr() if len(blocks) > 1 else blocks[0].tocsr()
+            self.kinds = np.concatenate(kinds)
+            self.ids = np.concatenate(ids)
+            self.removed = np.zeros(len(self.ids), dtype=bool)
+            self.positions = {(str(kind), int(doc_id)): row for row, (kind, doc_id) in enumerate(zip(self.kinds, self.ids))}
+            self.extra_keys, self.extra_rows, self.extra_matrix = [], [], None
+
+    def score_matrix(self, texts, kind=None):
+        """
+        Cosine scores of each text against every live document.
+        Returns (ids, kinds, scores) where scores has one row per text.
+        """
+        queries = self.vectorize(list(texts))
+        with self._lock:
+            live = ~self.removed
+            if kind is not None:
+                live &= self.kinds == kind
+            rows = np.flatnonzero(live)
+            # Multiply against the mapped matrix as-is; slicing it first would copy every row
+            scores = (self.matrix @ queries.T).T.toarray()[:, rows]
+            ids, kinds = self.ids[rows], self.kinds[rows]
+
+            extra = [i for i, key in enumerate(self.extra_keys) if kind is None or key[0] == kind]
+            if extra:
+                extra_scores = (queries @ self._extra_matrix()[extra].T).toarray()
+                scores = np.hstack([scores, extra_scores])
+                ids = np.concatenate([ids, [self.extra_keys[i][1] for i in extra]])
+                kinds = np.concatenate([kinds, [self.extra_keys[i][0] for i in extra]])
+        return ids, kinds, scores
+
+    def search(self, text, k=5, kind=None):
+        """Top-k [(kind, id, score)] for one piece of text such as a knowledge-gap topic"""
+        ids, kinds, scores = self.score_matrix([text], kind=kind)
+        scores = scores[0]
+        if not len(scores):
+            return []
+        best = np.argsort(-scores, kind='stable')[:k]
+        return [(str(kinds[i]), int(ids[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+
+def lesson_document(lesson):
+    return ('lesson', lesson.id), f"{lesson.title} {lesson.title} {lesson.module.title} {lesson.content}"
+
+
+def topic_document(topic):
+    return ('topic', topic.id), f"{topic.title} {topic.title} {topic.description} {topic.content}"
+
+
+def iter_documents():
+    from content.models import GeneratedTopic, Lesson
+
+    for lesson in Lesson.objects.select_related('module').order_by('id').iterator():
+        yield lesson_document(lesson)
+    for topic in GeneratedTopic.objects.order_by('id').iterator():
+        yield topic_document(topic)
+
+
+def _catch_up(index):
+    """
+    Bring a loaded file up to date with content saved or deleted since it was built,
+    e.g. by another process: re-score what changed and drop what is gone
+    """
+    from content.models import GeneratedTopic, Lesson
+
+    # A little overlap covers clocks that differ between servers; re-scoring a document twice is harmless
+    since = datetime.fromtimestamp(index.built_at - CATCH_UP_OVERLAP, tz=dt_timezone.utc)
+    index.update_documents(
+        [lesson_document(lesson) for lesson in Lesson.objects.select_related('module').filter(updated_at__gte=since)]
+        + [topic_document(topic) for topic in GeneratedTopic.objects.filter(updated_at__gte=since)]
+    )
+    for kind, model in (('lesson', Lesson), ('topic', GeneratedTopic)):
+        live = index.ids[(index.kinds == kind) & ~index.removed]
+        for doc_id in np.setdiff1d(live, list(model.objects.values_list('id', flat=True))):
+            index.remove_document((kind, int(doc_id)))
+
+
+def index_path():
+    return os.path.join(getattr(settings, 'ENGINE_INDEX_DIR', os.path.join(settings.BASE_DIR, 'engine_index')), INDEX_FILENAME)
+
+
+def overlay_limit():
+    """Changed documents kept in memory before the index is refitted and saved again"""
+    return getattr(settings, 'ENGINE_INDEX_OVERLAY_LIMIT', 200)
+
+
+_index = None
+_index_lock = threading.Lock()
+# Changes seen while a background rebuild runs, replayed onto the rebuilt index: [(key, text or None)]
+_rebuild_changes = None
+
+
+def rebuild_similarity_index():
+    """Refit on every lesson and generated topic, save it, and swap it in"""
+    global _index
+    index = SimilarityIndex.build(iter_documents())
+    index.save(index_path())
+    # Reload so this process also serves from the memory-mapped file
+    index = SimilarityIndex.load(index_path())
+    with _index_lock:
+        _index = index
+    return index
+
+
+def _rebuild_in_background():
+    """Fold a full overlay into a fresh, saved index so it stops growing and survives restarts"""
+    global _rebuild_changes
+    from content.tasks import run_in_background
+
+    with _index_lock:
+        if _rebuild_changes is not None:
+            return
+        _rebuild_changes = []
+
+    def rebuild():
+        global _rebuild_changes
+        try:
+            index = rebuild_similarity_index()
+        except Exception:
+            with _index_lock:
+                _rebuild_changes = None
+            raise
+        with _index_lock:
+            changes, _rebuild_changes = _rebuild_changes, None
+        # Edits made while the rows were being read may be missing from the refit
+        index.update_documents([(key, text) for key, text in changes if text is not None])
+        for key, text in changes:
+            if text is None:
+                index.remove_document(key)
+
+    run_in_background(rebuild)
+
+
+def _load_index():
+    index = SimilarityIndex.load(index_path())
+    _catch_up(index)
+    return index
+
+
+def get_similarity_index():
+    """
+    Load the saved index on first use, building it if none exists. A newer file written
+    by another process (a rebuild or compaction) replaces the loaded one.
+    """
+    global _index
+    index = _index
+    if index is not None and index.mtime is not None:
+        try:
+            stale = os.path.getmtime(index_path()) > index.mtime
+        except OSError:
+            stale = False
+        if stale:
+            with _index_lock:
+                if _index is index:
+                    try:
+                        _index = _load_index()
+                    except (OSError, ValueError, KeyError):
+                        logger.exception("Could not reload similarity index")
+                index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = _load_index()
+                except (OSError, ValueError, KeyError) as e:
+                    logger.info(f"Building similarity index ({e})")
+                    _index = SimilarityIndex.build(iter_documents())
+                    try:
+                        _index.save(index_path())
+                        _index.mtime = os.path.getmtime(index_path())
+                    except OSError:
+                        logger.exception("Could not save similarity index")
+            index = _index
+    return index
+
+
+def _record_changes(changes):
+    if _rebuild_changes is not None:
+        with _index_lock:
+            if _rebuild_changes is not None:
+                _rebuild_changes.extend(changes)
+    if _index is not None and _index.overlay_size() >= overlay_limit():
+        _rebuild_in_background()
+
+
+def refresh_documents(documents):
+    """Signal hook: re-score changed content in the loaded index, if any"""
+    if _index is not None:
+        documents = list(documents)
+        _index.update_documents(documents)
+        _record_changes(documents)
+
+
+_pending_topics = threading.local()
+
+
+def _pending_topic_ids():
+    if not hasattr(_pending_topics, 'by_chapter'):
+        _pending_topics.by_chapter = {}
+    return _pending_topics.by_chapter
+
+
+def refresh_topics_on_commit(chapter_id, topic_ids):
+    """
+    Re-score generated topics once the transaction commits, in one refresh per chapter
+    (a generated course has one) however many of its topics were saved
+    """
+    _pending_topic_ids().setdefault(chapter_id, set()).update(topic_ids)
+    transaction.on_commit(lambda: _refresh_pending_topics(chapter_id))
+
+
+def _refresh_pending_topics(chapter_id):
+    from content.models import GeneratedTopic
+
+    # The first callback of a batch takes every id queued for the chapter; the rest find nothing
+    topic_ids = _pending_topic_ids().pop(chapter_id, None)
+    if topic_ids and _index is not None:
+        refresh_documents([topic_document(topic) for topic in GeneratedTopic.objects.filter(id__in=topic_ids)])
+
+
+def forget_document(key):
+    if _index is not None:
+        _index.remove_document(key)
+        _record_changes([(key, None)])
@@ -0,0 +1,99 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from engine.mastery import skill_for_topic
+from engine.models import ReviewItem, ReviewQueueRun
+
+MIN_EASE = 1.3
+
+
+def quality_from_score(score):
+    """Map a 0-100 quiz score to the 0-5 SM-2 answer quality"""
+    return max(0, min(5, int(round((score or 0) / 20))))
+
+
+def apply_sm2(item, quality, now):
+    """Advance an item's interval, ease and due date after a review of the given quality"""
+    if quality < 3:
+        # Lapse: start over, review again tomorrow
+        item.repetitions = 0
+        item.interval_days = 1
+    else:
+        item.repetitions += 1
+        if item.repetitions == 1:
+            item.interval_days = 1
+        elif item.repetitions == 2:
+            item.interval_days = 6
+        else:
+            item.interval_days = int(round(item.interval_days * item.ease))
+    item.ease = max(MIN_EASE, item.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    item.last_reviewed_at = now
+    item.due_at = now + timedelta(days=item.interval_days)
+    return item
+
+
+def end_of_today():
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.max))
+
+
+def _entries(items):
+    return [
+        {
+            'topic_id': item.topic_id,
+            'title': item.topic.title,
+            'course_id': item.topic.chapter.course_id,
+            'due_at': item.due_at,
+        }
+        for item in items
+    ]
+
+
+def _scan_due(student_id, until):
+    """Range scan on the (student, due_at) index"""
+    return ReviewItem.objects.filter(student_id=student_id, due_at__lte=until).select_related(
+        'topic__chapter'
+    ).order_by('due_at')
+
+
+def schedule_review(student, topic, score, now=None):
+    """Record a quiz result as a review of the topic's skill and schedule the next one"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        item, _ = ReviewItem.objects.select_for_update().get_or_create(
+            student=student, topic_id=skill_for_topic(topic), defaults={'due_at': now}
+        )
+        apply_sm2(item, quality_from_score(score), now)
+        item.last_score = score
+        # Reviewed: it leaves today's queue unless it lapsed to later today
+        item.queued_on = timezone.localdate() if item.due_at <= end_of_today() else None
+        item.save()
+    return item
+
+
+def get_due_reviews(student_id, limit=5):
+    """
+    What to review today: the queue the nightly job stored, or a range scan
+    on the due-date index before it has run today.
+    """
+    today = timezone.localdate()
+    if ReviewQueueRun.objects.filter(day=today).exists():
+        items = ReviewItem.objects.filter(student_id=student_id, queued_on=today).select_related(
+            'topic__chapter'
+        ).order_by('due_at')
+    else:
+        items = _scan_due(student_id, end_of_today())
+    return _entries(items[:limit])
+
+
+def compute_due_reviews(until=None):
+    """Queue today's due reviews of every student with one update over the due-date index"""
+    until = until or end_of_today()
+    today = timezone.localdate()
+    with transaction.atomic():
+        due = ReviewItem.objects.filter(due_at__lte=until)
+        items_due = due.update(queued_on=today)
+        students = due.values('student_id').distinct().count()
+        ReviewQueueRun.objects.update_or_create(day=today, defaults={'students': students, 'items': items_due})
+    return students, items_due
@@ -1,3 +1,327 @@
-from django.test import TestCase
+import os
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from content.models import Course, GeneratedTopic, GeneratedTopicCompletion, Module, Lesson, NavigationEntry
+from content.navigation import path_key
+from content.testing import StudentTestCase, make_course, make_student
+from . import batch_recommendations, clustering, similarity_index
+from .adaptive_learning import ai_engine, get_next_lesson, get_previous_lesson
+from .mastery import sync_profile
+from .models import ContentRecommendation, LearningPath, ReviewItem, ReviewQueueRun, StudentProfile
+from .path_planner import path_diff, plan_hash, plan_path
+from .profile_cache import get_profile
+from .spaced_repetition import apply_sm2, schedule_review, get_due_reviews, compute_due_reviews
+
+
+class EngineTestCase(StudentTestCase):
+    def setUp(self):
+        super().setUp()
+        course, self.topics = make_course(self.student, topics=2, questions=0)
+
+
+class ProfileCacheTests(EngineTestCase):
+    def test_writes_start_from_the_stored_row(self):
+        StudentProfile.objects.create(student=self.student, learning_style='visual', mastery_level='beginner')
+        self.assertEqual(get_profile(self.student).knowledge_gaps, [])
+        # Another process updates the row; this process still holds its cached copy
+        StudentProfile.objects.filter(pk=self.student.pk).update(knowledge_gaps=[{'topic': 'Elsewhere', 'skill': 0}])
+
+        sync_profile(self.student, {self.topics[0].id: 0.1})
+
+        gaps = StudentProfile.objects.get(pk=self.student.pk).knowledge_gaps
+        self.assertEqual([gap['skill'] for gap in gaps], [0, self.topics[0].id])
+        self.assertEqual(get_profile(self.student).knowledge_gaps, gaps)
+
+
+class ProfileWritersTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_index()
+
+    def test_assessments_keep_mastery_entries(self):
+        sync_profile(self.student, {self.topics[0].id: 0.1, self.topics[1].id: 0.99})
+        ai_engine.analyze_assessment_results(self.student, {'Loops': 0.5, 'Classes': 0.9})
+        ai_engine.analyze_assessment_results(self.student, {'Loops': 0.9})
+
+        profile = StudentProfile.objects.get(pk=self.student.pk)
+        self.assertEqual([(gap.get('skill'), gap['topic']) for gap in profile.knowledge_gaps],
+                         [(self.topics[0].id, 'Topic 1')])
+        self.assertEqual([(strength.get('skill'), strength['topic']) for strength in profile.strengths],
+                         [(self.topics[1].id, 'Topic 2'), (None, 'Classes'), (None, 'Loops')])
+
+    def test_mastery_sync_keeps_assessment_entries(self):
+        ai_engine.analyze_assessment_results(self.student, {'Loops': 0.5})
+        sync_profile(self.student, {self.topics[0].id: 0.1})
+
+        gaps = StudentProfile.objects.get(pk=self.student.pk).knowledge_gaps
+        self.assertEqual([gap['topic'] for gap in gaps], ['Loops', 'Topic 1'])
+
+class ClusteringTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        # Strong students pass first time; struggling ones fail after several attempts and share a gap
+        self.strong = [self.student] + [make_student(f'1000000{i}', learning_style='visual') for i in range(3)]
+        self.struggling = [make_student(f'2000000{i}', learning_style='auditory') for i in range(4)]
+        completions = []
+        for students, score, attempts in ((self.strong, 100, 1), (self.struggling, 10, 4)):
+            for student in students:
+                completions += [
+                    GeneratedTopicCompletion(student=student, topic=topic, score=score, passed=score >= 50,
+                                             attempt_count=attempts)
+                    for topic in self.topics
+                ]
+        GeneratedTopicCompletion.objects.bulk_create(completions)
+        for student in self.struggling[1:]:
+            StudentProfile.objects.create(student=student, learning_style='auditory', mastery_level='beginner',
+                                          knowledge_gaps=[{'topic': 'Pointers', 'score': 0.2}])
+        self.recommender = mock.Mock(**{'recommend.return_value': []})
+
+    def test_separated_cohorts_get_their_own_clusters(self):
+        clusters = clustering.cluster_students(n_clusters=2, recommender=self.recommender)
+
+        self.assertEqual(sorted(cluster.size for cluster in clusters), [4, 4])
+        for students in (self.strong, self.struggling):
+            labels = {clustering.get_student_cluster(student.pk).label for student in students}
+            self.assertEqual(len(labels), 1)
+        struggling = clustering.get_student_cluster(self.struggling[0].pk)
+        self.assertNotEqual(struggling, clustering.get_student_cluster(self.student.pk))
+        self.assertEqual((struggling.learning_style, [gap['topic'] for gap in struggling.knowledge_gaps]),
+                         ('auditory', ['Pointers']))
+        self.assertEqual(struggling.centroid['avg_attempts'], 4)
+
+    def test_students_without_gaps_are_planned_from_their_cohort(self):
+        clustering.cluster_students(n_clusters=2, recommender=self.recommender)
+        course = Course.objects.create(title='C++', description='Course')
+        loops = Module.objects.create(course=course, title='Loops', order=1)
+        pointers = Module.objects.create(course=course, title='Pointers and memory', order=2)
+
+        newcomer = ai_engine.generate_learning_path(self.struggling[0], course)
+        strong = ai_engine.generate_learning_path(self.strong[1], course)
+
+        self.assertEqual(newcomer.path, [pointers.id, loops.id])
+        self.assertEqual(strong.path, [loops.id, pointers.id])
+
+
+class PathPlannerTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(title='C++', description='Course')
+        self.modules = [
+            Module.objects.create(course=self.course, title=title, description=description, order=order)
+            for order, (title, description) in enumerate(
+                [('Basics', 'Variables and loops'), ('Pointers', 'Addresses'), ('Classes', 'Objects and pointers')], 1
+            )
+        ]
+        self.basics, self.pointers, self.classes = (module.id for module in self.modules)
+        self.profile = StudentProfile.objects.create(student=self.student, learning_style='visual',
+                                                     mastery_level='beginner')
+
+    def set_gaps(self, *topics):
+        self.profile.knowledge_gaps = [{'topic': topic, 'score': 0.2} for topic in topics]
+        self.profile.save()
+
+    def test_gap_modules_come_first_in_course_order(self):
+        self.assertEqual(plan_path(self.modules, [{'topic': ' POINTERS '}]), [self.pointers, self.classes, self.basics])
+        self.assertEqual(plan_path(self.modules, [{'topic': str(self.classes)}, 'not a gap']),
+                         [self.classes, self.basics, self.pointers])
+        self.assertEqual(plan_path(self.modules, []), [self.basics, self.pointers, self.classes])
+
+    def test_path_diff_lists_moved_added_and_removed_modules(self):
+        self.assertEqual(path_diff([1, 2, 3], [2, 1, 4]), [
+            {'module': 2, 'from': 1, 'to': 0},
+            {'module': 1, 'from': 0, 'to': 1},
+            {'module': 4, 'from': None, 'to': 2},
+            {'module': 3, 'from': 2, 'to': None},
+        ])
+        self.assertEqual(path_diff([1, 2], [1, 2]), [])
+
+    def test_plan_hash_ignores_gap_order_and_case(self):
+        self.assertEqual(plan_hash([{'topic': 'Loops'}, {'topic': 'pointers'}], self.modules),
+                         plan_hash([{'topic': 'Pointers'}, {'topic': 'loops'}], self.modules))
+        self.assertNotEqual(plan_hash([{'topic': 'loops'}], self.modules), plan_hash([{'topic': 'loops'}], self.modules[:2]))
+
+    def test_unchanged_gaps_do_not_rewrite_the_path(self):
+        self.set_gaps('loops')
+        ai_engine.generate_learning_path(self.student, self.course)
+
+        with CaptureQueriesContext(connection) as queries:
+            path = ai_engine.generate_learning_path(self.student, self.course)
+
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))])
+        self.assertEqual([entry['reason'] for entry in path.adaptive_adjustments], ['created'])
+
+    def test_changed_gaps_record_the_diff(self):
+        self.set_gaps('loops')
+        ai_engine.generate_learning_path(self.student, self.course)
+        self.set_gaps('pointers')
+
+        path = ai_engine.generate_learning_path(self.student, self.course)
+
+        self.assertEqual(LearningPath.objects.get(pk=self.student.pk).path, [self.pointers, self.classes, self.basics])
+        adjustment = path.adaptive_adjustments[-1]
+        self.assertEqual((adjustment['reason'], adjustment['gaps']), ('knowledge_gaps_changed', ['pointers']))
+        self.assertEqual(adjustment['changes'], [
+            {'module': self.pointers, 'from': 1, 'to': 0},
+            {'module': self.classes, 'from': 2, 'to': 1},
+            {'module': self.basics, 'from': 0, 'to': 2},
+        ])
+
+
+class LessonNavigationTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(title='C++', description='Course')
+        self.basics = Module.objects.create(course=self.course, title='Basics', description='Loops', order=1)
+        self.pointers = Module.objects.create(course=self.course, title='Pointers', description='Addresses', order=2)
+        self.loops = Lesson.objects.create(module=self.basics, title='Loops', content='Loops', order=1)
+        self.addresses = Lesson.objects.create(module=self.pointers, title='Addresses', content='Addresses', order=1)
+        StudentProfile.objects.create(student=self.student, learning_style='visual', mastery_level='beginner',
+                                      knowledge_gaps=[{'topic': 'pointers', 'score': 0.2}])
+
+    def test_lessons_follow_the_students_path(self):
+        self.assertEqual(get_next_lesson(self.student, self.addresses), self.loops)
+        self.assertIsNone(get_previous_lesson(self.student, self.addresses))
+        self.assertIsNone(get_next_lesson(self.student, self.loops))
+
+    def test_adding_a_lesson_rebuilds_the_path_sequence(self):
+        get_next_lesson(self.student, self.addresses)
+
+        references = Lesson.objects.create(module=self.pointers, title='References', content='References', order=2)
+
+        self.assertFalse(NavigationEntry.objects.filter(sequence_key=path_key(self.course.id, self.student.pk)).exists())
+        self.assertEqual(get_next_lesson(self.student, self.addresses), references)
+        self.assertEqual(get_next_lesson(self.student, references), self.loops)
+
+
+class IndexTestCase(EngineTestCase):
+    """A module to add lessons to, indexed in a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_index()
+        self.module = Module.objects.create(course=Course.objects.create(title='C++', description='Course'), title='Memory')
+
+
+class RecommendationTests(IndexTestCase):
+    def test_single_student_updates_share_the_catalog(self):
+        Lesson.objects.create(module=self.module, title='Pointers basics', content='pointer address',
+                              difficulty='beginner', content_type='video')
+        StudentProfile.objects.create(student=self.student, learning_style='visual', mastery_level='beginner',
+                                      knowledge_gaps=[{'topic': 'pointers', 'score': 0.4}])
+
+        with mock.patch.object(batch_recommendations, 'LessonCatalog',
+                               wraps=batch_recommendations.LessonCatalog) as catalog:
+            ai_engine.update_recommendations(self.student)
+            ai_engine.update_recommendations(self.student)
+            self.assertEqual(catalog.call_count, 1)
+
+            Lesson.objects.create(module=self.module, title='Pointers arithmetic', content='pointers math',
+                                  difficulty='beginner', content_type='video')
+            ai_engine.update_recommendations(self.student)
+            self.assertEqual(catalog.call_count, 2)
+
+        self.assertEqual(ContentRecommendation.objects.filter(student=self.student).count(), 2)
+
+
+class SimilarityIndexTests(IndexTestCase):
+    def test_full_overlay_is_compacted_into_a_saved_index(self):
+        loaded = similarity_index.get_similarity_index()
+
+        with self.settings(ENGINE_INDEX_OVERLAY_LIMIT=3), \
+                mock.patch('content.tasks.run_in_background', side_effect=lambda func, *args: func(*args)) as background:
+            for i in range(3):
+                Lesson.objects.create(module=self.module, title=f'Recursion part {i + 1}', content='recursion')
+
+        self.assertEqual(background.call_count, 1)
+        index = similarity_index.get_similarity_index()
+        self.assertIsNot(index, loaded)
+        self.assertEqual(index.overlay_size(), 0)
+        self.assertEqual(len(index.search('recursion', k=10, kind='lesson')), 3)
+
+    def test_newer_file_replaces_loaded_index(self):
+        loaded = similarity_index.get_similarity_index()
+        similarity_index.SimilarityIndex.build([(('lesson', 1), 'graphs')]).save(similarity_index.index_path())
+        os.utime(similarity_index.index_path(), (loaded.mtime + 5, loaded.mtime + 5))
+
+        self.assertIsNot(similarity_index.get_similarity_index(), loaded)
+
+    def test_topics_saved_together_are_scored_once(self):
+        Lesson.objects.create(module=self.module, title='Recursion', content='recursion')
+        similarity_index.get_similarity_index()
+
+        with mock.patch.object(similarity_index, 'refresh_documents', wraps=similarity_index.refresh_documents) as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                GeneratedTopic.objects.create(chapter=self.topics[0].chapter, title=f'Recursion {i}', content='recursion')
+
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(len(similarity_index.get_similarity_index().search('recursion', k=10, kind='topic')), 3)
+
+    def test_loading_catches_up_on_edits_and_deletes_made_elsewhere(self):
+        kept, edited, deleted = (
+            Lesson.objects.create(module=self.module, title=title, content=content)
+            for title, content in (('Loops', 'loops'), ('Arrays', 'arrays'), ('Graphs', 'graphs pointers'))
+        )
+        similarity_index.get_similarity_index()
+        # Another process changes the lessons while this one has no index loaded
+        similarity_index._index = None
+        Lesson.objects.filter(pk=kept.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        edited.content = 'pointers'
+        edited.save()
+        deleted.delete()
+
+        with mock.patch.object(similarity_index, 'CATCH_UP_OVERLAP', 0):
+            index = similarity_index.get_similarity_index()
+
+        self.assertEqual(index.overlay_size(), 3)
+        self.assertEqual([doc_id for _, doc_id, _ in index.search('pointers', kind='lesson')], [edited.id])
+        self.assertEqual(index.search('graphs', kind='lesson'), [])
+        self.assertEqual(len(index.search('loops', kind='lesson')), 1)
+
+
+class SpacedRepetitionTests(EngineTestCase):
+    def test_apply_sm2_intervals(self):
+        now = timezone.now()
+        item = ReviewItem(due_at=now)
+
+        intervals = [apply_sm2(item, 5, now).interval_days for _ in range(3)]
+
+        self.assertEqual(intervals, [1, 6, 16])
+        self.assertAlmostEqual(item.ease, 2.8)
+        self.assertEqual(item.due_at, now + timedelta(days=16))
+
+    def test_apply_sm2_lapse_restarts(self):
+        now = timezone.now()
+        item = ReviewItem(due_at=now, repetitions=3, interval_days=16, ease=2.5)
+
+        apply_sm2(item, 2, now)
+
+        self.assertEqual((item.repetitions, item.interval_days), (0, 1))
+        self.assertAlmostEqual(item.ease, 2.18)
+
+    def test_ease_has_a_floor(self):
+        now = timezone.now()
+        item = ReviewItem(due_at=now, ease=1.4)
+
+        apply_sm2(item, 0, now)
+
+        self.assertEqual(item.ease, 1.3)
+
+    def test_due_queue_before_and_after_nightly_run(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        schedule_review(self.student, self.topics[0], 100, now=long_ago)
+        schedule_review(self.student, self.topics[1], 20, now=long_ago - timedelta(days=1))
+
+        due = [entry['topic_id'] for entry in get_due_reviews(self.student.pk)]
+        self.assertEqual(due, [self.topics[1].id, self.topics[0].id])
+
+        self.assertEqual(compute_due_reviews(), (1, 2))
+        self.assertTrue(ReviewQueueRun.objects.filter(day=timezone.localdate()).exists())
+
+        schedule_review(self.student, self.topics[0], 100)
+        self.assertEqual([entry['topic_id'] for entry in get_due_reviews(self.student.pk)], [self.topics[1].id])
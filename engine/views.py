@@ -8,6 +8,7 @@ from engine.adaptive_learning import ai_engine
 from engine.content_integration import content_integrator
 from engine.ai_tracking import ai_tracker
 from engine.models import ContentRecommendation, LearningPath, StudentProfile
+from engine.profile_cache import get_profile
 from users.models import Student
 from content.models import Course, Lesson
 from progress.models import ModuleProgress
@@ -25,10 +26,8 @@ def adaptive_dashboard(request):
         completed=False
     ).order_by('-priority')[:5]
     
-    # Get learning path
-    learning_path = LearningPath.objects.filter(student=student, course=course).first()
-    if not learning_path:
-        learning_path = ai_engine.generate_learning_path(student, course)
+    # Get learning path (only replanned when the student's gaps changed)
+    learning_path = ai_engine.generate_learning_path(student, course)
     
     # Get current progress
     progress = ModuleProgress.objects.filter(student=student).aggregate(
@@ -85,7 +84,7 @@ def record_engagement(request):
 def learning_insights(request):
     """View AI-generated learning insights"""
     student = request.user
-    profile = StudentProfile.objects.get(student=student)
+    profile = get_profile(student)
     
     # Get predicted performance for upcoming content
     course = Course.objects.first()
@@ -34,6 +34,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'final.security_middleware.LoginAttemptMiddleware',
     'final.security_middleware.NoCacheMiddleware',
+    'content.ai_ledger.AIUsageContextMiddleware',
+    'engine.profile_cache.ProfileScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'final.urls'
@@ -105,6 +107,14 @@ SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 CSRF_COOKIE_SECURE = False  # Set to True in production with HTTPS
 
+# Cache backend (template fragments, login attempts)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'adaptive-elearning',
+    }
+}
+
 # Cache control headers
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -114,4 +124,65 @@ from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Gemini resilience: requests per minute per model, and circuit breaker tuning
+GEMINI_RATE_LIMITS = {
+    'gemini-2.5-flash': 10,
+    'gemini-2.5-pro': 5,
+}
+GEMINI_BREAKER_FAILURE_THRESHOLD = 3   # consecutive failures before the circuit opens
+GEMINI_BREAKER_RESET_TIMEOUT = 60      # seconds before a probe call is allowed
+
+# In-process LRU of StudentProfile rows used by the adaptive engine (entries, seconds)
+ENGINE_PROFILE_CACHE_SIZE = 1000
+ENGINE_PROFILE_CACHE_TTL = 300
+
+# Persisted TF-IDF similarity index over lessons and generated topics
+ENGINE_INDEX_DIR = os.path.join(BASE_DIR, 'engine_index')
+# Changed documents scored in memory before the index is refitted and saved in the background
+ENGINE_INDEX_OVERLAY_LIMIT = 200
+
+# Number of cohorts the cluster_students job groups students into
+ENGINE_STUDENT_CLUSTERS = 6
+
+# P(known) at which Bayesian Knowledge Tracing treats a skill as mastered
+ENGINE_MASTERY_THRESHOLD = 0.95
+
+# Adaptive quizzes: fewest and most questions asked, and how many standard errors the
+# ability estimate must clear the pass mark by to stop early
+ADAPTIVE_QUIZ_MIN_QUESTIONS = 3
+ADAPTIVE_QUIZ_MAX_QUESTIONS = 8
+ADAPTIVE_QUIZ_CONFIDENCE = 1.645
+
+# Fair-share scheduling of AI calls: global concurrency cap, slots kept free for
+# interactive calls (quiz feedback, simplified lessons) and a per-student budget
+AI_MAX_CONCURRENT_CALLS = 4
+AI_INTERACTIVE_RESERVED_SLOTS = 1
+AI_STUDENT_REQUESTS_PER_MINUTE = 20
+
+# Seconds the quiz page waits for AI feedback before showing template feedback instead
+AI_FEEDBACK_LATENCY_BUDGET = 10
+
+# Estimated tokens a prompt may use; past it the variable sections (outlines, wrong answers) are trimmed
+AI_PROMPT_TOKEN_BUDGET = 6000
+
+# AI ledger: rows buffered before one bulk insert, and max seconds a row waits
+AI_LEDGER_BATCH_SIZE = 20
+AI_LEDGER_FLUSH_INTERVAL = 10
+
+# USD per million (input, output) tokens, used by the AI usage report
+GEMINI_PRICING = {
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-pro': (1.25, 10.00),
+}
+
+# Lessons generated in parallel per course (None: the AI call slots left for bulk work, so
+# AI_MAX_CONCURRENT_CALLS - AI_INTERACTIVE_RESERVED_SLOTS), and seconds a course's lessons may
+# wait in total on the shared rate limit. A course is only started when GEMINI_RATE_LIMITS has
+# room for all of its calls, so this wait only covers other courses started at the same moment.
+COURSE_GENERATION_CONCURRENCY = None
+COURSE_GENERATION_RATE_LIMIT_WAIT = 10
+
+# Local hours (start, end) when the pregenerate_lessons worker may call the AI
+PREGENERATION_OFF_PEAK_HOURS = (1, 6)
@@ -2,10 +2,10 @@ from django.contrib import admin
 from django.urls import path
 from users.views import login_view, register_view, logout_view, index_view
 from adminPanel.views import admin_login_view
-from content.views import dashboard_view, learning_view, complete_lesson, update_lesson_time, course_detail,generate_course, complete_generated_topic, get_topic_data_api, complete_topic, learning_default, progress_analysis_view, regenerate_topic
+from content.views import dashboard_view, dashboard_api, learning_view, complete_lesson, update_lesson_time, course_detail,generate_course, complete_generated_topic, get_topic_data_api, complete_topic, learning_default, progress_analysis_view, regenerate_topic, check_course_name, reinforcement_status, quiz_feedback_status, start_adaptive_quiz, answer_adaptive_quiz
 from adminPanel.views import admin_dashboard
 from django.urls import include
-from adminPanel.views import student_details, performance_distribution, learning_style_distribution, completion_over_time, quiz_performance, top_performers, student_quizzes, student_progress_details
+from adminPanel.views import student_details, performance_distribution, learning_style_distribution, completion_over_time, quiz_performance, top_performers, student_quizzes, quiz_activity_over_time, student_progress_details, ai_metrics, ai_usage_report
 
 from users.views import test_gemini_api
 
@@ -18,6 +18,7 @@ urlpatterns = [
     path('register/', register_view, name='register'),
     path('logout/', logout_view, name='logout'),
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('api/dashboard/', dashboard_api, name='dashboard_api'),
     path('Admindashboard/', admin_dashboard, name='admin_dashboard'),
     path('learn/', learning_view, name='learning_default'),
     path('learn/<int:lesson_id>/', learning_view, name='learning'),
@@ -47,8 +48,16 @@ urlpatterns = [
     path('admin/quiz-performance/', quiz_performance, name='quiz_performance'),
     path('admin/top-performers/', top_performers, name='top_performers'),
     path('admin/student-quizzes/<int:student_id>/', student_quizzes, name='student_quizzes'),
+    path('admin/quiz-activity/', quiz_activity_over_time, name='quiz_activity_over_time'),
     path('admin/student-progress/<int:student_id>/', student_progress_details, name='student_progress_details'),
+    path('admin/ai-metrics/', ai_metrics, name='ai_metrics'),
+    path('admin/ai-usage/', ai_usage_report, name='ai_usage_report'),
     path('test-api/', test_gemini_api, name='test_api'),
     path('api/regenerate-topic/', regenerate_topic, name='regenerate_topic'),
+    path('api/check-course-name/', check_course_name, name='check_course_name'),
+    path('api/reinforcement-status/<int:course_id>/', reinforcement_status, name='reinforcement_status'),
+    path('api/quiz-feedback/<int:attempt_id>/', quiz_feedback_status, name='quiz_feedback_status'),
+    path('api/adaptive-quiz/<int:topic_id>/start/', start_adaptive_quiz, name='start_adaptive_quiz'),
+    path('api/adaptive-quiz/answer/', answer_adaptive_quiz, name='answer_adaptive_quiz'),
     #path('admin-dashboard/', include('adminPanel.urls')),
 ]
\ No newline at end of file
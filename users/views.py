@@ -220,18 +220,16 @@ def temp_dashboard(request):
 
 
 from django.http import JsonResponse
-import google.generativeai as genai
+from content.gemini_client import gemini_client
 @login_required
 def test_gemini_api(request):
     """Test view to check if Gemini API is working"""
     try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content("Hello, are you working?")
+        response_text = gemini_client.generate('gemini-pro', "Hello, are you working?")
         
         return JsonResponse({
             'success': True,
-            'response': response.text
+            'response': response_text
         })
     except Exception as e:
         return JsonResponse({